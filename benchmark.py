@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки хранилища бота-тотализатора
+
+Примеры:
+    python benchmark.py codecs --bets 1000000
+    python benchmark.py memory --bets 1000000
+    python benchmark.py placement --bets 20000 --count 100
+    python benchmark.py betting --bets 20000 --count 200
+    python benchmark.py stress --processes 4 --ops 200
+    python benchmark.py sharding --users 20000 --bets 100000 --count 200
+    python benchmark.py startup --users 100000 --bets 500000
+    python benchmark.py state --users 10000 --updates 100000
+    python benchmark.py throttle --users 100000 --updates 1000000
+    python benchmark.py navigation --navigations 10000
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bet_store import BetStore
+from data_manager import DataManager
+from state_store import StateStore
+from storage import CODECS, detect_codec
+from throttle import Throttle
+
+
+def make_bets(count: int, users: int = 10000, events: int = 500) -> dict:
+    """Сгенерировать ставки в формате bets.json"""
+    rnd = random.Random(42)
+    start = datetime(2024, 1, 1)
+    bets = {}
+    for bet_id in range(1, count + 1):
+        telegram_id = 100000000 + rnd.randrange(users)
+        bets[str(bet_id)] = {
+            'id': bet_id,
+            'user_id': telegram_id - 100000000 + 1,
+            'telegram_id': telegram_id,
+            'event_id': rnd.randrange(1, events + 1),
+            'amount': float(rnd.randrange(10, 1000)),
+            'option': rnd.choice((1, 2)),
+            'odds': rnd.choice((1.5, 1.8, 2.0, 2.1, 3.0)),
+            'created_at': (start + timedelta(seconds=bet_id * 7, microseconds=rnd.randrange(1000000))).isoformat(),
+            'is_won': rnd.choice((None, True, False)),
+        }
+    return bets
+
+
+def timed(func):
+    """Время выполнения функции в секундах и её результат (без сборщика мусора)"""
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = func()
+        return time.perf_counter() - started, result
+    finally:
+        gc.enable()
+
+
+def bench_codecs(args):
+    """Сравнение кодеков: время записи/чтения и размер файла"""
+    print(f"📦 Генерация {args.bets} ставок...")
+    bets = make_bets(args.bets)
+    work_dir = tempfile.mkdtemp(prefix='totalizer_bench_')
+
+    try:
+        print(f"{'Формат':<10}{'Запись, с':>12}{'Чтение, с':>12}{'Размер, МБ':>14}")
+        for name, codec in CODECS.items():
+            path = os.path.join(work_dir, f"bets.{name}")
+
+            def save():
+                with open(path, 'wb') as f:
+                    f.write(codec.dumps(bets))
+
+            def load():
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                return detect_codec(raw).loads(raw)
+
+            save_time, _ = timed(save)
+            load_time, loaded = timed(load)
+            if loaded != bets:
+                raise AssertionError(f"Формат {name}: данные после чтения не совпадают")
+            del loaded
+
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            print(f"{name:<10}{save_time:>12.2f}{load_time:>12.2f}{size_mb:>14.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def measure_memory(build):
+    """Объем памяти (байт), занятый результатом build(), и сам результат"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def bench_memory(args):
+    """Память на ставку: словари из bets.json против компактного BetStore"""
+    print(f"📦 Генерация {args.bets} ставок...")
+    raw = json.dumps(make_bets(args.bets))
+    gc.collect()
+
+    dict_size, bets = measure_memory(lambda: json.loads(raw))
+    store_size, store = measure_memory(lambda: BetStore.from_dict(bets))
+    if store.to_dict() != bets:
+        raise AssertionError("BetStore: данные не совпадают с исходными")
+
+    print(f"{'Представление':<16}{'Всего, МБ':>12}{'Байт на ставку':>18}")
+    for name, size in (('dict', dict_size), ('BetStore', store_size)):
+        print(f"{name:<16}{size / 1024 / 1024:>12.1f}{size / args.bets:>18.1f}")
+
+
+def prepare_data_dir(bets_count: int) -> str:
+    """Временная папка данных: пользователь с большим балансом, активное событие и bets_count ставок"""
+    work_dir = tempfile.mkdtemp(prefix='totalizer_bench_')
+    manager = DataManager(work_dir)
+    manager.create_user(100000000, 'bench', 'Bench')
+    manager.add_balance(100000000, 10 ** 12)
+    manager.create_event('Бенчмарк', 'Да', 'Нет')
+    manager._save_json(manager.bets_file, make_bets(bets_count, users=1, events=1))
+    manager.close()
+    return work_dir
+
+
+def bench_placement(args):
+    """Скорость приема ставок: синхронная запись против отложенной"""
+    print(f"{'Режим':<10}{'Ставок/с':>12}{'Закрытие, с':>14}")
+    for mode in ('sync', 'behind'):
+        work_dir = prepare_data_dir(args.bets)
+        try:
+            manager = DataManager(work_dir, write_mode=mode, flush_interval_ms=args.interval)
+            manager.get_event_bets(1)  # прогрев: ставки загружены в память
+
+            def place():
+                for _ in range(args.count):
+                    manager.create_bet(100000000, 1, 10.0, 1, 2.0)
+
+            place_time, _ = timed(place)
+            close_time, _ = timed(manager.close)
+
+            check = DataManager(work_dir)
+            if len(check.get_event_bets(1)) != args.bets + args.count:
+                raise AssertionError(f"Режим {mode}: после закрытия на диске не все ставки")
+
+            print(f"{mode:<10}{args.count / place_time:>12.1f}{close_time:>14.2f}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def place_bet_by_steps(manager: DataManager, telegram_id: int, event_id: int, option: int, amount: float):
+    """Прием ставки прежним обработчиком: проверки, create_bet и повторное чтение баланса отдельными вызовами"""
+    user = manager.get_user(telegram_id)
+    if user['balance'] < amount:
+        raise ValueError("Недостаточно средств")
+    event = manager.get_event(event_id)
+    if not event['is_active']:
+        raise ValueError("Событие больше не активно")
+    odds = event['odds1'] if option == 1 else event['odds2']
+    manager.create_bet(telegram_id, event_id, amount, option, odds)
+    return manager.get_user(telegram_id)['balance']
+
+
+def bench_betting(args):
+    """Прием ставки обработчиком: отдельные вызовы хранилища против одной транзакции place_bet"""
+    paths = {
+        'по шагам': lambda manager: place_bet_by_steps(manager, 100000000, 1, 1, 10.0),
+        'place_bet': lambda manager: manager.place_bet(100000000, 1, 1, 10.0)['balance'],
+    }
+    print(f"{'Режим':<22}{'Путь':<12}{'Ставок/с':>12}")
+    for mode, process_lock in (('sync', False), ('sync', True), ('behind', False)):
+        for name, place_one in paths.items():
+            work_dir = prepare_data_dir(args.bets)
+            try:
+                manager = DataManager(work_dir, write_mode=mode, process_lock=process_lock)
+                manager.get_event_bets(1)  # прогрев: ставки загружены в память
+
+                def place():
+                    for _ in range(args.count):
+                        place_one(manager)
+
+                place_time, _ = timed(place)
+                manager.close()
+
+                label = f"{mode}{' + блокировка' if process_lock else ''}"
+                print(f"{label:<22}{name:<12}{args.count / place_time:>12.1f}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def stress_worker(work_dir: str, worker: int, ops: int, process_lock: bool):
+    """Процесс нагрузочного теста: ставки своего пользователя и пополнения общего"""
+    manager = DataManager(work_dir, process_lock=process_lock)
+    telegram_id = 100000001 + worker
+    for _ in range(ops):
+        manager.create_bet(telegram_id, 1, 1.0, 1, 2.0)
+        manager.add_balance(100000000, 1.0)
+        manager.get_user_bets(telegram_id)  # согласованное чтение ставок и архива
+    manager.close()
+
+
+def bench_stress(args):
+    """Несколько процессов изменяют одну папку данных: проверка, что изменения не теряются"""
+    work_dir = prepare_data_dir(0)
+    try:
+        process_lock = not args.no_lock
+        manager = DataManager(work_dir, process_lock=process_lock)
+        start_balance = manager.get_user(100000000)['balance']
+        for worker in range(args.processes):
+            manager.create_user(100000001 + worker, f'worker{worker}', 'Worker')
+        manager.close()
+
+        workers = [
+            multiprocessing.Process(target=stress_worker, args=(work_dir, worker, args.ops, process_lock))
+            for worker in range(args.processes)
+        ]
+        started = time.perf_counter()
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        check = DataManager(work_dir)
+        expected = args.processes * args.ops
+        bets = len(check.get_event_bets(1))
+        top_ups = check.get_user(100000000)['balance'] - start_balance
+        # Каждый процесс списывает ставки только со своего пользователя
+        balances_ok = all(
+            check.get_user(100000001 + worker)['balance'] == 1000.0 - args.ops
+            for worker in range(args.processes)
+        )
+        failed = [process.exitcode for process in workers if process.exitcode != 0]
+
+        print(f"🔒 Блокировка между процессами: {'выключена' if args.no_lock else 'включена'}")
+        print(f"Процессов: {args.processes}, операций: {expected * 2}, {expected * 2 / elapsed:.1f} оп/с")
+        print(f"Ставок: {bets} из {expected}, пополнений: {top_ups:.0f} из {expected}, "
+              f"балансы игроков {'верны' if balances_ok else 'НЕ верны'}")
+        if failed or bets != expected or top_ups != expected or not balances_ok:
+            raise SystemExit("❌ Изменения потеряны")
+        print("✅ Изменения не потеряны")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def make_users(count: int) -> dict:
+    """Сгенерировать пользователей в формате users.json (telegram_id 100000000 + i)"""
+    created_at = datetime(2024, 1, 1).isoformat()
+    return {
+        str(user_id): {
+            'id': user_id,
+            'telegram_id': 100000000 + user_id - 1,
+            'username': f'user{user_id}',
+            'first_name': 'User',
+            'balance': 10.0 ** 12,
+            'created_at': created_at,
+        }
+        for user_id in range(1, count + 1)
+    }
+
+
+def bench_sharding(args):
+    """Скорость приема ставок в зависимости от количества шардов пользователей и ставок"""
+    users = make_users(args.users)
+    bets = make_bets(args.bets, users=args.users, events=1)
+    rnd = random.Random(7)
+    players = [100000000 + rnd.randrange(args.users) for _ in range(args.count)]
+
+    print(f"{'Шардов':<10}{'Ставок/с':>12}{'Перераскладка, с':>20}")
+    for shards in args.shards:
+        work_dir = tempfile.mkdtemp(prefix='totalizer_bench_')
+        try:
+            manager = DataManager(work_dir)
+            manager.create_event('Бенчмарк', 'Да', 'Нет')
+            manager._save_json(manager.users_file, users)
+            manager._save_json(manager.bets_file, bets)
+            manager.close()
+
+            reshard_time, manager = timed(lambda: DataManager(work_dir, shards=shards))
+            manager.get_event_bets(1)  # прогрев: ставки всех шардов загружены в память
+
+            def place():
+                for telegram_id in players:
+                    manager.create_bet(telegram_id, 1, 10.0, 1, 2.0)
+
+            place_time, _ = timed(place)
+            manager.close()
+
+            check = DataManager(work_dir, shards=shards)
+            if len(check.get_event_bets(1)) != args.bets + args.count:
+                raise AssertionError(f"Шардов {shards}: после записи на диске не все ставки")
+
+            print(f"{shards:<10}{args.count / place_time:>12.1f}{reshard_time:>20.2f}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_startup(args):
+    """Время импорта модулей хранилища и запуска DataManager на большой папке данных"""
+    work_dir = tempfile.mkdtemp(prefix='totalizer_bench_')
+    try:
+        manager = DataManager(work_dir)
+        manager.create_event('Бенчмарк', 'Да', 'Нет')
+        manager._save_json(manager.users_file, make_users(args.users))
+        manager._save_json(manager.bets_file, make_bets(args.bets, users=args.users))
+        manager._save_json(manager.proposals_file, {
+            str(proposal_id): {'id': proposal_id, 'telegram_id': 100000000, 'title': 'Бенчмарк', 'status': 'pending'}
+            for proposal_id in range(1, args.users // 10 + 1)
+        })
+        manager.close()
+        # Первый запуск создает журнал балансов - замеряем последующие
+        DataManager(work_dir).close()
+
+        # Импорт - в отдельном процессе, чтобы модули не были уже загружены
+        code = "import time; t = time.perf_counter(); import data_manager, export, importer; print(time.perf_counter() - t)"
+        import_time = float(subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__))))
+
+        start_time, manager = timed(lambda: DataManager(work_dir))
+        leaderboard_time, _ = timed(lambda: manager.get_leaderboard())
+        manager.close()
+
+        print(f"Пользователей: {args.users}, ставок: {args.bets}")
+        print(f"{'Импорт модулей, мс':<28}{import_time * 1000:>10.1f}")
+        print(f"{'Запуск DataManager, мс':<28}{start_time * 1000:>10.1f}")
+        for phase, elapsed in manager.startup_profile.items():
+            print(f"{'  ' + phase:<28}{elapsed * 1000:>10.1f}")
+        print(f"{'Первый рейтинг, мс':<28}{leaderboard_time * 1000:>10.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_state(args):
+    """
+    Накладные расходы сохранения состояния диалогов: учет изменения на каждое сообщение
+    и запись файла раз в интервал (все изменения пачки - одной записью)
+    """
+    rnd = random.Random(11)
+    steps = [
+        {},
+        {'betting_event_id': 1, 'betting_option': 1, 'betting_step': 'waiting_amount'},
+        {'creating_proposal': True, 'proposal_step': 'waiting_title'},
+        {'creating_proposal': True, 'proposal_step': 'waiting_option1', 'proposal_title': 'Матч'},
+    ]
+    # Живые user_data пользователей, которые меняют обработчики
+    user_data = {100000000 + user: {} for user in range(args.users)}
+    updates = []
+    for _ in range(args.updates):
+        telegram_id = 100000000 + rnd.randrange(args.users)
+        updates.append((telegram_id, rnd.choice(steps)))
+
+    work_dir = tempfile.mkdtemp(prefix='totalizer_bench_')
+    try:
+        print(f"{'Формат':<10}{'Сообщение, мкс':>16}{'Запись пачки, мс':>18}{'Файл, КБ':>10}")
+        for name in CODECS:
+            store = StateStore(os.path.join(work_dir, f"state.{name}"), CODECS[name])
+            batch_times = []
+
+            def run():
+                for number, (telegram_id, step) in enumerate(updates, start=1):
+                    data = user_data[telegram_id]
+                    data.clear()
+                    data.update(step)
+                    store.set_user(telegram_id, data)
+                    if number % args.batch == 0:
+                        started = time.perf_counter()
+                        store.flush()
+                        batch_times.append(time.perf_counter() - started)
+
+            total_time, _ = timed(run)
+            update_time = (total_time - sum(batch_times)) / len(updates)
+            size = os.path.getsize(store.path) / 1024
+            print(f"{name:<10}{update_time * 1e6:>16.2f}{sum(batch_times) / len(batch_times) * 1000:>18.2f}{size:>10.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_throttle(args):
+    """
+    Антифлуд: стоимость проверки запроса и число ведер в памяти. Поток обновлений за
+    --seconds секунд модельного времени: обычные пользователи и несколько флудеров
+    """
+    rnd = random.Random(5)
+    floods = [rnd.randrange(args.users) for _ in range(args.flooders)]
+    updates = []
+    for number in range(args.updates):
+        now = args.seconds * number / args.updates
+        # Каждое десятое обновление - от флудера
+        telegram_id = rnd.choice(floods) if number % 10 == 0 else rnd.randrange(args.users)
+        updates.append((100000000 + telegram_id, now))
+
+    throttle = Throttle(args.rate, args.burst, args.idle)
+
+    def run():
+        for telegram_id, now in updates:
+            throttle.allow(telegram_id, now)
+
+    total_time, _ = timed(run)
+    stats = throttle.stats()
+    print(f"{'Проверка запроса, мкс':<28}{total_time / len(updates) * 1e6:>12.2f}")
+    for key in ('passed', 'throttled', 'evicted', 'buckets'):
+        print(f"{key:<28}{stats[key]:>12}")
+
+
+def source(photo: str) -> str:
+    """Картинка, по которой выдан file_id модели (повторная отправка по file_id - та же картинка)"""
+    return photo[3:] if photo.startswith("id:") else photo
+
+
+class NavigationApi:
+    """Модель сообщений Telegram для бенчмарка навигации: считает запросы к API"""
+
+    def __init__(self):
+        self.calls = 0
+        self.next_id = 1
+        self.clock = 0
+
+    def message(self, text=None, photo=None, reply_markup=None):
+        message = NavigationMessage(self, self.next_id)
+        self.next_id += 1
+        message.set(text, photo, reply_markup)
+        return message
+
+
+class NavigationMessage:
+    def __init__(self, api: NavigationApi, message_id: int):
+        self.api = api
+        self.chat_id = 1
+        self.message_id = message_id
+        self.edit_date = None
+
+    def set(self, text, photo, reply_markup):
+        # Загрузка по URL дает file_id - дальше Telegram возвращает его
+        self.photo = [argparse.Namespace(file_id=f"id:{photo}")] if photo else []
+        self.text = None if photo else text
+        self.caption = text if photo else None
+        self.reply_markup = reply_markup
+
+    def edited(self, text, photo, reply_markup):
+        self.api.calls += 1
+        self.api.clock += 1
+        self.edit_date = self.api.clock
+        self.set(text, photo, reply_markup)
+        return self
+
+    async def reply_text(self, text, parse_mode=None, reply_markup=None):
+        self.api.calls += 1
+        return self.api.message(text, None, reply_markup)
+
+    async def reply_photo(self, photo, caption=None, parse_mode=None, reply_markup=None):
+        self.api.calls += 1
+        return self.api.message(caption, source(photo), reply_markup)
+
+
+class NavigationQuery:
+    def __init__(self, message: NavigationMessage):
+        self.message = message
+
+    async def edit_message_text(self, text, parse_mode=None, reply_markup=None):
+        return self.message.edited(text, None, reply_markup)
+
+    async def edit_message_caption(self, caption=None, parse_mode=None, reply_markup=None):
+        return self.message.edited(caption, source(self.message.photo[-1].file_id), reply_markup)
+
+    async def edit_message_media(self, media, reply_markup=None):
+        return self.message.edited(media.caption, source(media.media), reply_markup)
+
+    async def delete_message(self):
+        self.message.api.calls += 1
+
+
+async def legacy_show(query, text, reply_markup=None, photo=None):
+    """Прежний показ экрана: картинка или уход с картинки - удаление и новое сообщение"""
+    if photo is not None:
+        message = await query.message.reply_photo(photo=photo, caption=text, reply_markup=reply_markup)
+        await query.delete_message()
+        return message
+    if query.message.photo:
+        await query.delete_message()
+        return await query.message.reply_text(text, reply_markup=reply_markup)
+    return await query.edit_message_text(text, reply_markup=reply_markup)
+
+
+def bench_navigation(args):
+    """
+    Запросы к Telegram API на один переход между экранами: список событий, карточки событий
+    (с картинкой и без), экран ставки. Прежний показ против навигатора
+    """
+    from navigator import Navigator
+
+    rnd = random.Random(3)
+    events = [(f"Событие {number}", f"https://example.com/{number}.jpg" if number < args.photo_events else None)
+              for number in range(args.events)]
+    screens = []
+    screen = ('Активные события', None)
+    for _ in range(args.navigations):
+        if screen[0] == 'Активные события':
+            screen = rnd.choice(events)
+        elif screen[0].startswith('Событие') and rnd.random() < 0.4:
+            screen = (f"Ставка: {screen[0]}", None)
+        elif screen[0].startswith('Событие') and rnd.random() < 0.2:
+            # Повторное нажатие на то же событие
+            pass
+        else:
+            screen = ('Активные события', None)
+        screens.append(screen)
+
+    async def run(show):
+        api = NavigationApi()
+        message = api.message('Активные события')
+        for text, photo in screens:
+            message = await show(NavigationQuery(message), text, photo)
+        return api.calls
+
+    navigator = Navigator()
+    legacy_calls = asyncio.run(run(lambda query, text, photo: legacy_show(query, text, photo=photo)))
+    calls = asyncio.run(run(lambda query, text, photo: navigator.show(query, text, photo=photo)))
+
+    print(f"{'Показ':<12}{'Запросов':>10}{'На переход':>12}")
+    print(f"{'прежний':<12}{legacy_calls:>10}{legacy_calls / len(screens):>12.2f}")
+    print(f"{'навигатор':<12}{calls:>10}{calls / len(screens):>12.2f}")
+    print(', '.join(f"{operation}: {count}" for operation, count in sorted(navigator.calls.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки хранилища бота-тотализатора")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    codecs_parser = subparsers.add_parser('codecs', help="форматы хранения файлов")
+    codecs_parser.add_argument('--bets', type=int, default=1000000, help="количество ставок")
+    codecs_parser.set_defaults(func=bench_codecs)
+
+    memory_parser = subparsers.add_parser('memory', help="память на хранение ставок")
+    memory_parser.add_argument('--bets', type=int, default=1000000, help="количество ставок")
+    memory_parser.set_defaults(func=bench_memory)
+
+    placement_parser = subparsers.add_parser('placement', help="скорость приема ставок по режимам записи")
+    placement_parser.add_argument('--bets', type=int, default=20000, help="ставок в файле до начала замера")
+    placement_parser.add_argument('--count', type=int, default=100, help="сколько ставок принять")
+    placement_parser.add_argument('--interval', type=float, default=1000, help="интервал сброса (мс) для behind")
+    placement_parser.set_defaults(func=bench_placement)
+
+    betting_parser = subparsers.add_parser('betting', help="прием ставки: по шагам против place_bet")
+    betting_parser.add_argument('--bets', type=int, default=20000, help="ставок в файле до начала замера")
+    betting_parser.add_argument('--count', type=int, default=200, help="сколько ставок принять")
+    betting_parser.set_defaults(func=bench_betting)
+
+    stress_parser = subparsers.add_parser('stress', help="несколько процессов на одной папке данных")
+    stress_parser.add_argument('--processes', type=int, default=4, help="количество процессов")
+    stress_parser.add_argument('--ops', type=int, default=200, help="ставок (и пополнений) на процесс")
+    stress_parser.add_argument('--no-lock', action='store_true', help="без блокировки между процессами")
+    stress_parser.set_defaults(func=bench_stress)
+
+    sharding_parser = subparsers.add_parser('sharding', help="скорость приема ставок по количеству шардов")
+    sharding_parser.add_argument('--users', type=int, default=20000, help="пользователей")
+    sharding_parser.add_argument('--bets', type=int, default=100000, help="ставок в файлах до начала замера")
+    sharding_parser.add_argument('--count', type=int, default=200, help="сколько ставок принять")
+    sharding_parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8, 16], help="количества шардов")
+    sharding_parser.set_defaults(func=bench_sharding)
+
+    startup_parser = subparsers.add_parser('startup', help="время запуска на большой папке данных")
+    startup_parser.add_argument('--users', type=int, default=100000, help="пользователей")
+    startup_parser.add_argument('--bets', type=int, default=500000, help="ставок")
+    startup_parser.set_defaults(func=bench_startup)
+
+    state_parser = subparsers.add_parser('state', help="сохранение состояния диалогов")
+    state_parser.add_argument('--users', type=int, default=10000, help="пользователей")
+    state_parser.add_argument('--updates', type=int, default=100000, help="сообщений")
+    state_parser.add_argument('--batch', type=int, default=1000, help="сообщений между записями файла")
+    state_parser.set_defaults(func=bench_state)
+
+    throttle_parser = subparsers.add_parser('throttle', help="антифлуд: проверка запроса и память")
+    throttle_parser.add_argument('--users', type=int, default=100000, help="пользователей")
+    throttle_parser.add_argument('--updates', type=int, default=1000000, help="обновлений")
+    throttle_parser.add_argument('--seconds', type=float, default=3600, help="за сколько секунд приходят обновления")
+    throttle_parser.add_argument('--flooders', type=int, default=10, help="флудеров")
+    throttle_parser.add_argument('--rate', type=float, default=1, help="запросов в секунду")
+    throttle_parser.add_argument('--burst', type=int, default=5, help="запросов подряд")
+    throttle_parser.add_argument('--idle', type=float, default=600, help="секунд до удаления ведра")
+    throttle_parser.set_defaults(func=bench_throttle)
+
+    navigation_parser = subparsers.add_parser('navigation', help="запросы к Telegram API на переход между экранами")
+    navigation_parser.add_argument('--navigations', type=int, default=10000, help="переходов")
+    navigation_parser.add_argument('--events', type=int, default=8, help="событий")
+    navigation_parser.add_argument('--photo-events', type=int, default=5, help="из них с картинкой")
+    navigation_parser.set_defaults(func=bench_navigation)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
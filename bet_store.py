@@ -0,0 +1,309 @@
+"""
+Компактное хранение ставок в памяти по столбцам и журнал новых ставок на диске
+"""
+
+import json
+import logging
+import os
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from storage import StorageError
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Кодирование is_won в столбце int8
+WON_NONE, WON_FALSE, WON_TRUE = -1, 0, 1
+
+
+class BetStore:
+    """
+    Ставки в виде массивов (int id, float сумма/коэффициент, int8 исход,
+    время в микросекундах) вместо словаря со строковыми ключами на каждую ставку.
+
+    Наружу ставки отдаются обычными словарями того же вида, что и в bets.json.
+    Поля, которые не укладываются в столбцы, хранятся в словаре дополнительных полей.
+    """
+
+    FIELDS = ('id', 'user_id', 'telegram_id', 'event_id', 'amount', 'option', 'odds', 'created_at', 'is_won')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.user_ids = array('q')
+        self.telegram_ids = array('q')
+        self.event_ids = array('q')
+        self.amounts = array('d')
+        self.options = array('b')
+        self.odds = array('d')
+        self.created_at = array('q')
+        self.is_won = array('b')
+
+        # Нестандартные поля и значения: номер строки -> {поле: значение}
+        self._extra: Dict[int, dict] = {}
+
+        # Индексы: ID ставки -> строка, событие/пользователь -> строки
+        self._by_id: Dict[int, int] = {}
+        self._by_event: Dict[int, array] = {}
+        self._by_user: Dict[int, array] = {}
+
+        # Максимальный ID ставки (для выдачи следующего без полного прохода)
+        self.max_id = 0
+
+    @classmethod
+    def from_dict(cls, bets: dict) -> 'BetStore':
+        """Построить хранилище из данных bets.json"""
+        store = cls()
+        for bet in bets.values():
+            store.add(bet)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, bet_id: int) -> bool:
+        return bet_id in self._by_id
+
+    # ---------- запись ----------
+
+    def add(self, bet: dict):
+        """Добавить ставку"""
+        row = len(self.ids)
+        extra = {key: value for key, value in bet.items() if key not in self.FIELDS}
+
+        def column_value(field, convert, default):
+            value = bet.get(field)
+            try:
+                return convert(value)
+            except (TypeError, ValueError, OverflowError):
+                # Значение не помещается в столбец - сохраняем как есть
+                extra[field] = value
+                return default
+
+        bet_id = column_value('id', self._to_int, 0)
+        telegram_id = column_value('telegram_id', self._to_int, 0)
+        event_id = column_value('event_id', self._to_int, 0)
+
+        self.ids.append(bet_id)
+        self.user_ids.append(column_value('user_id', self._to_int, 0))
+        self.telegram_ids.append(telegram_id)
+        self.event_ids.append(event_id)
+        self.amounts.append(column_value('amount', self._to_float, 0.0))
+        self.options.append(column_value('option', self._to_option, 0))
+        self.odds.append(column_value('odds', self._to_float, 0.0))
+        self.created_at.append(column_value('created_at', self._to_timestamp, 0))
+        self.is_won.append(column_value('is_won', self._to_won, WON_NONE))
+
+        if extra:
+            self._extra[row] = extra
+
+        self._by_id[bet_id] = row
+        self.max_id = max(self.max_id, bet_id)
+        self._by_event.setdefault(event_id, array('I')).append(row)
+        self._by_user.setdefault(telegram_id, array('I')).append(row)
+
+    def set_won(self, bet_id: int, is_won: Optional[bool]):
+        """Отметить результат ставки"""
+        row = self._by_id[bet_id]
+        self.is_won[row] = self._to_won(is_won)
+        extra = self._extra.get(row)
+        if extra:
+            extra.pop('is_won', None)
+
+    def set_won_rows(self, rows: array, won: array):
+        """Отметить результаты сразу для набора строк (won - значения WON_* по строкам)"""
+        is_won = self.is_won
+        for row, value in zip(rows, won):
+            is_won[row] = value
+        if self._extra:
+            for row in rows:
+                extra = self._extra.get(row)
+                if extra:
+                    extra.pop('is_won', None)
+
+    # ---------- чтение ----------
+
+    def get(self, bet_id: int) -> Optional[dict]:
+        """Получить ставку по ID"""
+        row = self._by_id.get(bet_id)
+        return None if row is None else self._row_to_dict(row)
+
+    def event_bets(self, event_id: int) -> List[dict]:
+        """Все ставки на событие"""
+        return [self._row_to_dict(row) for row in self._by_event.get(event_id, ())]
+
+    def event_rows(self, event_id: int) -> array:
+        """Номера строк ставок на событие (для расчетов по столбцам)"""
+        return self._by_event.get(event_id, array('I'))
+
+    def rows_of(self, bet_ids: Iterable[int]) -> array:
+        """Номера строк ставок по их ID (отсутствующие ставки пропускаются)"""
+        by_id = self._by_id
+        return array('I', (by_id[bet_id] for bet_id in bet_ids if bet_id in by_id))
+
+    def user_bets(self, telegram_id: int) -> List[dict]:
+        """Все ставки пользователя"""
+        return [self._row_to_dict(row) for row in self._by_user.get(telegram_id, ())]
+
+    def user_event_ids(self, telegram_id: int) -> Iterable[int]:
+        """ID событий по всем ставкам пользователя (без сборки словарей)"""
+        event_ids = self.event_ids
+        return (event_ids[row] for row in self._by_user.get(telegram_id, ()))
+
+    def iter_bets(self, rows: Optional[Iterable[int]] = None) -> Iterator[dict]:
+        """Ставки по одной (все или по номерам строк) - без сборки общего словаря"""
+        if rows is None:
+            rows = range(len(self.ids))
+        for row in rows:
+            yield self._row_to_dict(row)
+
+    def to_dict(self) -> dict:
+        """Выгрузить в формат bets.json"""
+        return {str(self.ids[row]): self._row_to_dict(row) for row in range(len(self.ids))}
+
+    def _row_to_dict(self, row: int) -> dict:
+        is_won = self.is_won[row]
+        bet = {
+            'id': self.ids[row],
+            'user_id': self.user_ids[row],
+            'telegram_id': self.telegram_ids[row],
+            'event_id': self.event_ids[row],
+            'amount': self.amounts[row],
+            'option': self.options[row],
+            'odds': self.odds[row],
+            'created_at': (EPOCH + self.created_at[row] * MICROSECOND).isoformat(),
+            'is_won': None if is_won == WON_NONE else is_won == WON_TRUE,
+        }
+        extra = self._extra.get(row)
+        if extra:
+            bet.update(extra)
+        return bet
+
+    # ---------- преобразования ----------
+
+    @staticmethod
+    def _to_int(value) -> int:
+        if type(value) is not int or not -2 ** 63 <= value < 2 ** 63:
+            raise TypeError(value)
+        return value
+
+    @staticmethod
+    def _to_float(value) -> float:
+        if type(value) not in (int, float):
+            raise TypeError(value)
+        return float(value)
+
+    @staticmethod
+    def _to_option(value) -> int:
+        if type(value) is not int or not -128 <= value <= 127:
+            raise TypeError(value)
+        return value
+
+    @staticmethod
+    def _to_timestamp(value) -> int:
+        timestamp = datetime.fromisoformat(value)
+        if timestamp.tzinfo is not None or timestamp.isoformat() != value:
+            raise ValueError(value)
+        return (timestamp - EPOCH) // MICROSECOND
+
+    @staticmethod
+    def _to_won(value) -> int:
+        if value is None:
+            return WON_NONE
+        if type(value) is not bool:
+            raise TypeError(value)
+        return WON_TRUE if value else WON_FALSE
+
+
+class BetTail:
+    """
+    Журнал новых ставок шарда (JSON Lines рядом с файлом ставок).
+
+    Принятая ставка дописывается одной строкой вместо перезаписи всего файла ставок;
+    файл ставок переписывается целиком только при уплотнении, после чего журнал очищается.
+    Строки, уже попавшие в файл ставок, при чтении отбрасывает вызывающий (по ID).
+    fsync выполняет sync() - один раз на транзакцию.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0      # полных строк в журнале
+        self._end = 0       # смещение конца последней полной строки
+        self._fd: Optional[int] = None
+        self._unsynced = False
+
+    def read(self) -> List[dict]:
+        """Ставки из журнала; недописанная последняя строка (сбой при дозаписи) пропускается"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b''
+
+        end = raw.rfind(b'\n') + 1
+        bets = []
+        for line in raw[:end].splitlines():
+            try:
+                bets.append(json.loads(line))
+            except ValueError as e:
+                logger.error(f"Журнал ставок поврежден: {self.path}: {e}")
+                raise StorageError(f"Журнал ставок поврежден: {self.path}") from e
+        self._end = end
+        self.count = len(bets)
+        return bets
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        return self._fd
+
+    def append(self, bet: dict):
+        """Дописать ставку (журнал должен быть прочитан этим процессом до записи)"""
+        fd = self._open()
+        if os.fstat(fd).st_size > self._end:
+            # Недописанная строка после сбоя - отрезаем, иначе новая строка склеится с ней
+            os.ftruncate(fd, self._end)
+
+        raw = (json.dumps(bet, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        if os.write(fd, raw) != len(raw):
+            raise StorageError(f"Журнал ставок записан не полностью: {self.path}")
+        self._end += len(raw)
+        self.count += 1
+        self._unsynced = True
+
+    def sync(self):
+        """Сбросить дописанные ставки на диск"""
+        if self._unsynced:
+            self._unsynced = False
+            os.fsync(self._fd)
+
+    def clear(self):
+        """Очистить журнал после того, как файл ставок надежно записан целиком"""
+        if self._fd is None and not os.path.exists(self.path):
+            return
+        fd = self._open()
+        os.ftruncate(fd, 0)
+        os.fsync(fd)
+        self._end = 0
+        self.count = 0
+        self._unsynced = False
+
+    def close(self):
+        """Закрыть файл журнала"""
+        if self._fd is not None:
+            self.sync()
+            os.close(self._fd)
+            self._fd = None
+
+    def remove(self):
+        """Удалить журнал вместе с файлом ставок (перераскладка шардов)"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._end = 0
+        self.count = 0
@@ -0,0 +1,60 @@
+"""
+Настройки HTTP-соединений с Telegram Bot API: размер пула, таймауты, keep-alive и HTTP/2
+"""
+
+import importlib.util
+import logging
+import socket
+from typing import List, Tuple
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+
+def http2_available() -> bool:
+    """HTTP/2 в httpx работает только с пакетом h2 (pip install "httpx[http2]")"""
+    return importlib.util.find_spec('h2') is not None
+
+
+def resolve_http_version(setting: str) -> str:
+    """auto - HTTP/2, если установлен h2; true - HTTP/2 (без h2 - предупреждение и HTTP/1.1); false - HTTP/1.1"""
+    setting = setting.lower()
+    if setting in ('auto', '1', 'true', 'yes'):
+        if http2_available():
+            return '2'
+        if setting != 'auto':
+            logger.warning("HTTP/2 для Telegram недоступен: не установлен пакет h2, используется HTTP/1.1")
+    return '1.1'
+
+
+def keepalive_options(idle: int) -> List[Tuple[int, int, int]]:
+    """
+    TCP keep-alive для соединений пула: простаивающее соединение проверяется через idle секунд,
+    и оборванное сетью соединение не всплывает ошибкой на первом запросе после простоя
+    """
+    if idle <= 0:
+        return []
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Тонкие настройки есть не на всех платформах
+    for name, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', max(1, idle // 3)), ('TCP_KEEPCNT', 3)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+def make_request(pool_size: int, http_version: str, keepalive_idle: int, connect_timeout: float,
+                 read_timeout: float, write_timeout: float, pool_timeout: float) -> HTTPXRequest:
+    """
+    Пул соединений для запросов к Bot API. Соединения пула переиспользуются между запросами
+    (HTTP keep-alive), pool_timeout - сколько запрос ждет свободного соединения
+    """
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+        socket_options=keepalive_options(keepalive_idle),
+    )
@@ -0,0 +1,132 @@
+"""
+Фоновые отправки (рассылки, уведомления о результатах): с ограничением скорости,
+параллельно в пределах фонового пула соединений; у рассылок - с записью продвижения
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Не чаще rate запросов в секунду, равномерно. Один ограничитель на все фоновые отправки:
+    лимит Telegram (около 30 сообщений в секунду) - общий для бота
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_at = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        at = max(self._next_at, now)
+        self._next_at = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+    def pause(self, seconds: float):
+        """Telegram попросил подождать (RetryAfter) - следующие отправки не раньше чем через seconds"""
+        self._next_at = max(self._next_at, asyncio.get_running_loop().time() + seconds)
+
+
+async def deliver(limiter: RateLimiter, concurrency: int, recipients: List[int],
+                  send: Callable[[int], Awaitable], results: List[Optional[str]]):
+    """
+    Отправить сообщения получателям: до concurrency запросов одновременно (соединения
+    фонового пула), не чаще ограничителя. results[i] - итог для recipients[i]: sent,
+    blocked (бот заблокирован, чата нет) или failed; None - отправка не завершилась
+    (остановка посреди пачки)
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def deliver_one(number: int, telegram_id: int):
+        async with semaphore:
+            while True:
+                await limiter.wait()
+                try:
+                    await send(telegram_id)
+                    results[number] = 'sent'
+                    return
+                except RetryAfter as e:
+                    # Превышен лимит Telegram - пауза для всех отправок, затем повтор этому же получателю
+                    logger.warning(f"Лимит Telegram, пауза {e.retry_after} с")
+                    limiter.pause(e.retry_after)
+                except Forbidden:
+                    results[number] = 'blocked'
+                    return
+                except BadRequest as e:
+                    if 'chat not found' in str(e).lower():
+                        results[number] = 'blocked'
+                    else:
+                        logger.error(f"Ошибка отправки пользователю {telegram_id}: {e}")
+                        results[number] = 'failed'
+                    return
+                except Exception as e:
+                    logger.error(f"Ошибка отправки пользователю {telegram_id}: {e}")
+                    results[number] = 'failed'
+                    return
+
+    tasks = [asyncio.ensure_future(deliver_one(number, telegram_id)) for number, telegram_id in enumerate(recipients)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class Broadcaster:
+    """
+    Получатели читаются из хранилища пачками (DataManager.iter_recipients) по возрастанию ID
+    и получают сообщение через deliver: параллельно и не быстрее общего ограничителя.
+    После каждой пачки курсор и счетчики записываются в broadcasts.json, а заблокировавшие
+    бота помечаются неактивными - следующие рассылки их пропускают. Прерванная рассылка
+    (остановка бота, сбой) продолжается с курсора.
+    """
+
+    def __init__(self, data_manager, limiter: RateLimiter, chunk_size: int, concurrency: int):
+        self.data_manager = data_manager
+        self.limiter = limiter
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = concurrency
+
+    async def run(self, broadcast_id: int, send: Callable[[int], Awaitable],
+                  progress: Optional[Callable[[dict], Awaitable]] = None) -> dict:
+        """
+        Провести рассылку с записанного курсора до конца: send(telegram_id) отправляет сообщение
+        одному получателю, progress(рассылка) вызывается после каждой пачки. Возвращает
+        завершенную рассылку; ошибки хранилища передаются вызывающему (продвижение записано)
+        """
+        broadcast = self.data_manager.get_broadcast(broadcast_id)
+        if broadcast is None:
+            raise ValueError("Рассылка не найдена")
+        cursor = broadcast['cursor']
+
+        for chunk in self.data_manager.iter_recipients(cursor, self.chunk_size):
+            results: List[Optional[str]] = [None] * len(chunk)
+            try:
+                await deliver(self.limiter, self.concurrency, [telegram_id for _, telegram_id in chunk], send, results)
+            finally:
+                # И при остановке посреди пачки: курсор - до первого незавершенного получателя,
+                # после запуска повторно получат только те, кому сообщение не отправлено
+                done = results.index(None) if None in results else len(results)
+                if done:
+                    cursor = chunk[done - 1][0]
+                broadcast = self.data_manager.save_broadcast_progress(
+                    broadcast_id, cursor,
+                    sent=results[:done].count('sent'),
+                    failed=results[:done].count('failed'),
+                    blocked=[telegram_id for (_, telegram_id), result in zip(chunk[:done], results) if result == 'blocked']
+                )
+            if progress is not None:
+                await progress(broadcast)
+
+        broadcast = self.data_manager.save_broadcast_progress(broadcast_id, cursor, 0, 0, [], status='done')
+        logger.info(f"Рассылка {broadcast_id} завершена: отправлено {broadcast['sent']}, "
+                    f"заблокировали бота {broadcast['blocked']}, ошибок {broadcast['failed']}")
+        return broadcast
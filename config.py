@@ -9,6 +9,87 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
 DATA_DIR = os.getenv("DATA_DIR", "data")
 
+# Формат файлов данных: json (читаемый), compact (JSON без отступов) или binary
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "json")
+
+# Окно групповой фиксации записей в миллисекундах (0 - каждая запись фиксируется сразу)
+GROUP_COMMIT_MS = float(os.getenv("GROUP_COMMIT_MS", "0"))
+
+# Режим записи: sync (каждое изменение сразу на диск) или behind (отложенная фоновая запись)
+WRITE_MODE = os.getenv("WRITE_MODE", "sync")
+
+# Для отложенной записи: интервал сброса на диск (окно возможной потери данных при сбое)
+# и количество изменений, после которого сброс выполняется досрочно
+FLUSH_INTERVAL_MS = float(os.getenv("FLUSH_INTERVAL_MS", "1000"))
+FLUSH_MAX_DIRTY = int(os.getenv("FLUSH_MAX_DIRTY", "100"))
+
+# Блокировка между процессами: включать, если с одной папкой данных работают
+# несколько процессов (например, бот и скрипт обслуживания). Несовместима с WRITE_MODE=behind
+PROCESS_LOCK = os.getenv("PROCESS_LOCK", "false").lower() in ("1", "true", "yes")
+
+# Количество шардов (файлов) для пользователей и ставок; при изменении данные перераскладываются при запуске
+STORAGE_SHARDS = int(os.getenv("STORAGE_SHARDS", "1"))
+
+# Снимок балансов из журнала - раз в столько движений (балансы в users.json обновляются при снимке)
+LEDGER_SNAPSHOT_EVERY = int(os.getenv("LEDGER_SNAPSHOT_EVERY", "1000"))
+
+# Максимальный размер одного файла выгрузки /export в мегабайтах (лимит Telegram на отправку - 50 МБ)
+EXPORT_PART_MB = float(os.getenv("EXPORT_PART_MB", "45"))
+
+# Как часто (в секундах) состояние диалогов (незавершенные ставки, создание событий)
+# записывается в state.json; при остановке бота оно записывается всегда
+STATE_UPDATE_INTERVAL = float(os.getenv("STATE_UPDATE_INTERVAL", "10"))
+
+# Отчет о времени этапов запуска и бюджет на импорт модулей бота в миллисекундах
+# (при превышении бюджета при запуске выводится предупреждение)
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() in ("1", "true", "yes")
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+
+# Сколько обновлений Telegram обрабатывается одновременно (1 - по очереди). При большем значении
+# одинаковые одновременные чтения (список событий, карточка события) выполняются один раз
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "1"))
+
+# Фоновые отправки (рассылка анонсов, уведомления о результатах): сообщений в секунду
+# (лимит Telegram - около 30 на бота) и сколько получателей рассылки обрабатывается
+# между записями ее продвижения
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "100"))
+
+# Соединения с Telegram Bot API: пул для ответов пользователям и отдельный пул для фоновых
+# отправок (его размер - сколько фоновых сообщений отправляется одновременно)
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "32"))
+TELEGRAM_BACKGROUND_POOL_SIZE = int(os.getenv("TELEGRAM_BACKGROUND_POOL_SIZE", "8"))
+
+# HTTP/2: auto (если установлен пакет h2), true или false; TCP keep-alive простаивающих соединений
+# через столько секунд (0 - выключен)
+TELEGRAM_HTTP2 = os.getenv("TELEGRAM_HTTP2", "auto")
+TELEGRAM_KEEPALIVE = int(os.getenv("TELEGRAM_KEEPALIVE", "60"))
+
+# Таймауты запросов к Bot API в секундах; pool - ожидание свободного соединения пула
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "20"))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "3"))
+
+# Антифлуд: сколько запросов (сообщений и нажатий кнопок) в секунду пропускается от одного
+# пользователя в среднем, сколько подряд без ожидания, и через сколько секунд без запросов
+# пользователь забывается. THROTTLE_RATE=0 отключает ограничение; админ не ограничивается
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_IDLE_SECONDS = float(os.getenv("THROTTLE_IDLE_SECONDS", "600"))
+
+# Фоновые задачи админа (расчет события, рассылка, выгрузка): сколько раз повторить после сбоя,
+# пауза перед первым повтором в секундах (дальше удваивается) и как часто обновлять статус
+JOB_RETRIES = int(os.getenv("JOB_RETRIES", "2"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "3"))
+
+# Ставок в одной части расчета события: каждая часть - отдельная транзакция и контрольная точка
+SETTLEMENT_CHUNK = int(os.getenv("SETTLEMENT_CHUNK", "1000"))
+
+# Через сколько дней после закрытия событие уходит в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+
 # Проверяем обязательные параметры
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в переменных окружения")
@@ -1,72 +1,640 @@
+import functools
+import gzip
+import heapq
 import json
+import logging
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from bet_store import WON_NONE, BetStore, BetTail
+from ledger import Ledger, user_account
+from ranking import Ranking
+from settlement import settle_rows
+from single_flight import SingleFlight
+from storage import (
+    FileLock, GroupCommitWriter, PeriodicFlusher, StorageError, atomic_write, detect_codec, file_signature, get_codec,
+    remove_temp_files
+)
+
+logger = logging.getLogger(__name__)
+
+# Статусы предложений событий
+PROPOSAL_STATUSES = ('pending', 'approved', 'rejected')
+
+# Сколько новых ставок копится в журнале шарда, прежде чем файл ставок будет переписан целиком
+BETS_COMPACT_EVERY = 1000
+
+
+def transactional(method):
+    """Выполнить метод DataManager как одну транзакцию (см. DataManager.transaction)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.transaction():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def consistent_read(method):
+    """Выполнить чтение нескольких файлов под общей блокировкой (см. DataManager.read_transaction)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.read_transaction():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class DataManager:
     """Класс для управления данными в JSON файлах"""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", storage_format: str = "json", group_commit_ms: float = 0,
+                 write_mode: str = "sync", flush_interval_ms: float = 1000, flush_max_dirty: int = 100,
+                 process_lock: bool = False, shards: int = 1, ledger_snapshot_every: int = 1000,
+                 settlement_chunk: int = 1000):
         self.data_dir = data_dir
         self.users_file = os.path.join(data_dir, "users.json")
         self.events_file = os.path.join(data_dir, "events.json")
         self.bets_file = os.path.join(data_dir, "bets.json")
         self.proposals_file = os.path.join(data_dir, "proposals.json")
+        self.broadcasts_file = os.path.join(data_dir, "broadcasts.json")
+        
+        # Шардирование пользователей и ставок по telegram_id: users.K.json и bets.K.json,
+        # K = telegram_id % shards. При shards=1 используются обычные users.json и bets.json
+        if shards < 1:
+            raise ValueError(f"Количество шардов должно быть положительным: {shards}")
+        self.shards = shards
+        self.shards_file = os.path.join(data_dir, "shards.json")
+        self.users_files = self._shard_paths("users", shards)
+        self.bets_files = self._shard_paths("bets", shards)
+        self._bets_files_set = set(self.bets_files)
+        
+        # Формат записи файлов (json, compact, binary); при чтении формат определяется автоматически
+        self.codec = get_codec(storage_format)
+        
+        # Режим записи: sync - каждое изменение сразу на диск, behind - изменения копятся
+        # в памяти и сбрасываются фоном раз в flush_interval_ms (окно возможной потери данных)
+        # или раньше, когда накопится flush_max_dirty изменений
+        if write_mode not in ('sync', 'behind'):
+            raise ValueError(f"Неизвестный режим записи: {write_mode} (доступны: sync, behind)")
+        if write_mode == 'behind' and group_commit_ms > 0:
+            raise ValueError("Групповая фиксация не используется вместе с отложенной записью")
+        self.write_mode = write_mode
+        self.flush_max_dirty = flush_max_dirty
+        self._dirty: Dict[str, object] = {}       # путь -> данные (dict, BetStore или готовые байты)
+        self._flushing: Dict[str, bytes] = {}     # уже закодировано, пишется на диск
+        self._dirty_mutations = 0
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[PeriodicFlusher] = None
+        
+        # Групповая фиксация: записи в пределах окна сливаются в одну надежную запись
+        self._group_commit = GroupCommitWriter(group_commit_ms) if group_commit_ms > 0 else None
+        
+        # Транзакции: изменения данных выполняются по одной, ожидание записи на диск - вне блокировки
+        self._mutex = threading.RLock()
+        self._local = threading.local()
+        
+        # Блокировка между процессами (несколько экземпляров бота, скрипты обслуживания на одной папке):
+        # изменения - под исключительной блокировкой, согласованное чтение - под общей.
+        # Отложенная запись держит изменения в памяти процесса, поэтому с ней несовместима
+        if process_lock and write_mode == 'behind':
+            raise ValueError("Блокировка между процессами не используется вместе с отложенной записью")
+        if process_lock and not FileLock.available:
+            logger.warning("Блокировка между процессами недоступна на этой платформе (нет fcntl)")
+        self._process_lock = FileLock(os.path.join(data_dir, ".lock")) if process_lock else None
+        
+        # Подписи файлов после последней записи этим процессом
+        self._signatures: Dict[str, tuple] = {}
+        
+        # Кеш разобранных файлов: путь -> (подпись файла, данные)
+        self._read_cache: Dict[str, tuple] = {}
+        
+        # Одновременные загрузки одного и того же (файл изменили извне, все потоки промахнулись
+        # мимо кеша) выполняются один раз - остальные получают результат первой
+        self._flights = SingleFlight()
+        
+        # Архив закрытых событий и их ставок (сегменты по месяцам)
+        self.archive_dir = os.path.join(data_dir, "archive")
+        self.archive_index_file = os.path.join(self.archive_dir, "index.json")
+        self._archive_segments: Dict[str, tuple] = {}  # месяц -> (подпись файла, сегмент)
+        
+        # Ставки в памяти в компактном виде по файлам шардов + подписи файлов, из которых они прочитаны
+        self._bet_stores: Dict[str, BetStore] = {}
+        self._bet_store_signatures: Dict[str, tuple] = {}  # путь -> (подпись файла, подпись журнала)
+        
+        # Журналы новых ставок по файлам шардов (только при синхронной записи): ставка дописывается
+        # строкой, файл ставок переписывается раз в BETS_COMPACT_EVERY ставок
+        self._bet_tails: Dict[str, BetTail] = {}
         
         # Создаем папку data если её нет
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
         
-        # Инициализируем файлы если их нет
-        self._init_files()
+        # Журнал движений балансов - источник истины для балансов; в users.json баланс
+        # обновляется только при снимке (раз в ledger_snapshot_every движений)
+        self.ledger_file = os.path.join(data_dir, "ledger.jsonl")
+        self.ledger_snapshot_file = os.path.join(data_dir, "ledger_snapshot.json")
+        self.ledger_snapshot_every = ledger_snapshot_every
+        
+        # Ставок в одной части расчета события (каждая часть - отдельная транзакция)
+        self.settlement_chunk = settlement_chunk
+        
+        # Рейтинги пользователей: строятся при первом обращении, затем обновляются
+        # по каждому движению журнала (в том числе из других процессов)
+        self._rankings = {'balance': Ranking(), 'profit': Ranking()}
+        self._rankings_ready = False
+        self._rankings_lock = threading.Lock()
+        self.ledger = Ledger(self.ledger_file, on_change=self._update_rankings)
+        
+        # Индекс пользователей по telegram_id для каждого файла: путь -> (данные, {telegram_id: ключ})
+        self._user_index: Dict[str, tuple] = {}
+        
+        # Предложения по статусам: (данные файла, {статус: {ID: None}}). Упорядоченные словари -
+        # очереди: ожидающие по времени создания, рассмотренные по времени рассмотрения
+        self._proposal_index: Optional[tuple] = None
+        self._proposal_lock = threading.Lock()
+        
+        # Время этапов запуска в секундах (отчет о запуске). Остальные коллекции
+        # (события, ставки, предложения, архив) читаются при первом обращении
+        self.startup_profile: Dict[str, float] = {}
+        
+        with self.transaction():
+            # Убираем временные файлы от записей, прерванных сбоем
+            # (под блокировкой - чтобы не задеть запись другого процесса)
+            with self._startup_phase('cleanup'):
+                remove_temp_files(data_dir)
+            
+            # Перераскладываем данные, если количество шардов изменилось
+            with self._startup_phase('reshard'):
+                self._reshard()
+            
+            # Инициализируем файлы если их нет
+            with self._startup_phase('init_files'):
+                self._init_files()
+            
+            with self._startup_phase('ledger'):
+                self._load_ledger()
+        
+        self._flusher = PeriodicFlusher(self.flush, flush_interval_ms) if write_mode == 'behind' else None
+    
+    @contextmanager
+    def _startup_phase(self, name: str):
+        """Замер этапа запуска для отчета startup_profile"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_profile[name] = time.perf_counter() - started
     
     def _init_files(self):
         """Инициализация файлов данных"""
-        if not os.path.exists(self.users_file):
-            self._save_json(self.users_file, {})
+        for users_file in self.users_files:
+            if not os.path.exists(users_file):
+                self._save_json(users_file, {})
         
         if not os.path.exists(self.events_file):
             self._save_json(self.events_file, {})
         
-        if not os.path.exists(self.bets_file):
-            self._save_json(self.bets_file, {})
+        for bets_file in self.bets_files:
+            if not os.path.exists(bets_file):
+                self._save_json(bets_file, {})
             
         if not os.path.exists(self.proposals_file):
             self._save_json(self.proposals_file, {})
     
     def _load_json(self, file_path: str) -> dict:
-        """Загрузка данных из JSON файла"""
+        """Загрузка данных для изменения: собственная копия, которую можно менять и сохранять"""
+        return self._copy_records(self._read_json(file_path))
+    
+    def _read_json(self, file_path: str) -> dict:
+        """
+        Загрузка данных только для чтения: общий разобранный объект из кеша.
+        Кеш проверяется по подписи файла (mtime_ns, размер, inode) и перечитывается,
+        только если файл изменили извне. Менять результат нельзя - для изменений _load_json.
+        """
+        if file_path in self._bets_files_set:
+            # Ставки живут в компактном хранилище, словари не кешируем
+            return self._get_bet_store(file_path).to_dict()
+        
+        signature = file_signature(file_path)
+        cached = self._read_cache.get(file_path)
+        if cached is not None and (cached[0] == signature or self._is_own_version(file_path, signature)):
+            if cached[0] != signature:
+                self._read_cache[file_path] = (signature, cached[1])
+            return cached[1]
+        
+        return self._flights.do(('file', file_path), lambda: self._reload_json(file_path))
+    
+    def _reload_json(self, file_path: str) -> dict:
+        """Перечитать файл в кеш чтения"""
+        signature = file_signature(file_path)
+        data = self._parse_file(file_path)
+        self._read_cache[file_path] = (signature, data)
+        return data
+    
+    def _parse_file(self, file_path: str) -> dict:
+        """Чтение и разбор файла (JSON или бинарный формат - определяется по содержимому)"""
+        raw = self._get_unwritten(file_path)
+        if isinstance(raw, dict):
+            return raw
+        if isinstance(raw, BetStore):
+            return raw.to_dict()
+        if raw is None:
+            try:
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                return {}
+        
+        # Поврежденный файл не подменяем пустыми данными - иначе следующая запись сотрет его содержимое
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+            return detect_codec(raw).loads(raw)
+        except ValueError as e:
+            logger.error(f"Файл данных поврежден: {file_path}: {e}")
+            raise StorageError(f"Файл данных поврежден: {file_path}") from e
     
     def _save_json(self, file_path: str, data: dict):
-        """Сохранение данных в JSON файл"""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Сохранение данных в файл в настроенном формате (атомарно, с fsync)"""
+        if file_path in self._bets_files_set:
+            # Ставки сохраняются через компактное хранилище, чтобы оно не устарело
+            self._save_bet_store(file_path, BetStore.from_dict(data))
+            return
+        
+        # Кеш чтения получает собственную копию: дальнейшие изменения data его не затронут
+        snapshot = self._copy_records(data)
+        self._read_cache[file_path] = (None, snapshot)
+        
+        if self.write_mode == 'behind':
+            self._mark_dirty(file_path, snapshot)
+        else:
+            self._write_file(file_path, self.codec.dumps(snapshot))
+    
+    @staticmethod
+    def _copy_records(data: dict) -> dict:
+        """Копия коллекции с копиями записей (записи - плоские словари)"""
+        return {
+            key: value.copy() if isinstance(value, (dict, list)) else value
+            for key, value in data.items()
+        }
     
-    def _get_next_id(self, data: dict) -> int:
-        """Получение следующего ID"""
+    def _get_unwritten(self, file_path: str):
+        """Данные файла, еще не записанные на диск: объект, байты или None"""
+        data = self._dirty.get(file_path)
+        if data is None:
+            data = self._flushing.get(file_path)
+        if data is None and self._group_commit is not None:
+            data = self._group_commit.pending(file_path)
+        return data
+    
+    def _mark_dirty(self, file_path: str, data):
+        """Отложенная запись: запоминаем данные, на диск их сбросит фоновый поток"""
+        with self._mutex:
+            self._dirty[file_path] = data
+            self._dirty_mutations += 1
+            if self._dirty_mutations >= self.flush_max_dirty and self._flusher is not None:
+                self._flusher.wake()
+    
+    def flush(self):
+        """Сбросить на диск все отложенные изменения"""
+        # Журнал - первым: снимок в отложенных файлах ссылается на его содержимое
+        self.ledger.sync()
+        with self._flush_lock:
+            # Снимок под блокировкой транзакций, запись на диск - без неё
+            with self._mutex:
+                if not self._dirty:
+                    return
+                for file_path, data in self._dirty.items():
+                    if isinstance(data, BetStore):
+                        data = data.to_dict()
+                    self._flushing[file_path] = data if isinstance(data, bytes) else self.codec.dumps(data)
+                self._dirty = {}
+                self._dirty_mutations = 0
+            
+            failed = {}
+            for file_path, raw in list(self._flushing.items()):
+                try:
+                    self._write_file(file_path, raw)
+                except OSError as e:
+                    logger.error(f"Ошибка записи {file_path}: {e}")
+                    failed[file_path] = raw
+            
+            with self._mutex:
+                # Неудачные записи возвращаем в очередь, если их не сменила более новая версия
+                for file_path, raw in failed.items():
+                    self._dirty.setdefault(file_path, raw)
+                self._flushing = {}
+            
+            if failed:
+                raise StorageError(f"Не удалось записать: {', '.join(failed)}")
+    
+    def _write_file(self, file_path: str, raw: bytes):
+        """Надежная запись готовых байтов: сразу или через групповую фиксацию"""
+        if self._group_commit is None:
+            self._signatures[file_path] = atomic_write(file_path, raw)
+            return
+        
+        generation = self._group_commit.submit(file_path, raw)
+        tickets = getattr(self._local, 'tickets', None)
+        if tickets is None:
+            # Запись вне транзакции - ждем сразу
+            self._group_commit.wait(generation)
+        else:
+            tickets.append(generation)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Транзакция над данными: чтение-изменение-запись выполняются под блокировкой,
+        а ожидание надежной записи (при групповой фиксации) - уже после ее снятия,
+        чтобы записи параллельных транзакций сливались в одну.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            self._local.tickets = []
+            self._local.compacted = set()
+        
+        self._mutex.acquire()
+        self._local.depth = depth + 1
+        try:
+            with self._hold_process_lock(exclusive=True):
+                yield self
+                if depth == 0 and self._process_lock is not None:
+                    # Другие процессы видят только диск - дожидаемся записи до снятия блокировки
+                    self._wait_for_tickets()
+                if depth == 0:
+                    self._clear_bet_tails()
+        finally:
+            self._local.depth = depth
+            self._mutex.release()
+            if depth == 0:
+                self._wait_for_tickets()
+                self._local.tickets = None
+                self._local.compacted = None
+                if self.write_mode == 'sync':
+                    for tail in list(self._bet_tails.values()):
+                        tail.sync()
+                    self.ledger.sync()
+    
+    @contextmanager
+    def read_transaction(self):
+        """
+        Согласованное чтение нескольких файлов: под общей блокировкой между процессами
+        другой процесс не может изменить данные посередине чтения. Читатели друг другу не мешают.
+        Без блокировки между процессами (или внутри транзакции) ничего не делает.
+        """
+        with self._hold_process_lock(exclusive=False):
+            yield self
+    
+    @contextmanager
+    def _hold_process_lock(self, exclusive: bool):
+        """Захват блокировки между процессами; вложенные захваты в том же потоке ничего не делают"""
+        held = getattr(self._local, 'lock_mode', None)
+        if self._process_lock is None or held == 'exclusive' or (held == 'shared' and not exclusive):
+            yield
+            return
+        if held == 'shared':
+            raise StorageError("Изменение данных внутри согласованного чтения не поддерживается")
+        
+        self._local.lock_mode = 'exclusive' if exclusive else 'shared'
+        try:
+            with self._process_lock.acquire(exclusive):
+                yield
+        finally:
+            self._local.lock_mode = held
+    
+    def _wait_for_tickets(self):
+        """Дождаться надежной записи всего, что транзакция поставила в групповую фиксацию"""
+        tickets, self._local.tickets = self._local.tickets, []
+        if tickets:
+            self._group_commit.wait(max(tickets))
+    
+    def close(self):
+        """Завершить работу с хранилищем: дописать все отложенные записи"""
+        if self._flusher is not None:
+            self._flusher.close()
+            self._flusher = None
+        self.flush()
+        if self._group_commit is not None:
+            self._group_commit.close()
+        for tail in self._bet_tails.values():
+            tail.close()
+        self.ledger.close()
+    
+    def _is_own_version(self, file_path: str, signature) -> bool:
+        """Файл на диске (или в очереди записи) - последняя версия, записанная этим процессом"""
+        if self._get_unwritten(file_path) is not None:
+            return True
+        if self._group_commit is not None:
+            if signature is not None and signature == self._group_commit.signature(file_path):
+                return True
+        return signature is not None and signature == self._signatures.get(file_path)
+    
+    def _get_bet_tail(self, bets_file: str) -> BetTail:
+        """Журнал новых ставок файла: bets.json -> bets.tail.jsonl, bets.K.json -> bets.K.tail.jsonl"""
+        tail = self._bet_tails.get(bets_file)
+        if tail is None:
+            tail = BetTail(os.path.splitext(bets_file)[0] + ".tail.jsonl")
+            self._bet_tails[bets_file] = tail
+        return tail
+    
+    def _get_bet_store(self, bets_file: str) -> BetStore:
+        """
+        Ставки файла (шарда) в компактном виде: файл ставок + журнал новых ставок.
+        Перечитываются, только если файл или журнал изменили извне
+        """
+        tail = self._get_bet_tail(bets_file)
+        signature = file_signature(bets_file)
+        tail_signature = file_signature(tail.path)
+        store = self._bet_stores.get(bets_file)
+        cached = self._bet_store_signatures.get(bets_file, (None, None))
+        if store is not None and tail_signature == cached[1] and (
+                signature == cached[0] or self._is_own_version(bets_file, signature)):
+            self._bet_store_signatures[bets_file] = (signature, tail_signature)
+            return store
+        
+        # Не под _mutex: перечитывание возможно и внутри согласованного чтения, а транзакции
+        # берут _mutex раньше блокировки между процессами. Одновременные перечитывания
+        # одного шарда объединяются в одно
+        return self._flights.do(('bets', bets_file), lambda: self._reload_bet_store(bets_file, tail))
+    
+    def _reload_bet_store(self, bets_file: str, tail: BetTail) -> BetStore:
+        """Перечитать ставки шарда: файл ставок и журнал новых ставок"""
+        signature = file_signature(bets_file)
+        tail_signature = file_signature(tail.path)
+        store = BetStore.from_dict(self._parse_file(bets_file))
+        # Ставки журнала с ID не выше записанных в этот файл попали в него при уплотнении,
+        # но журнал еще не очищен - их пропускаем. Сверка только с самим файлом: последний
+        # ID архива выше ID ставок, оставшихся в рабочих файлах, и отсек бы их.
+        # Ставки событий, ушедших в архив, в рабочие ставки не возвращаются
+        archived_events = self._read_json(self.archive_index_file).get('events', {}) \
+            if os.path.exists(self.archive_index_file) else {}
+        for bet in tail.read():
+            if bet['id'] > store.max_id and str(bet.get('event_id')) not in archived_events:
+                store.add(bet)
+        self._bet_stores[bets_file] = store
+        self._bet_store_signatures[bets_file] = (signature, tail_signature)
+        return store
+    
+    def _save_bet_store(self, bets_file: str, store: BetStore):
+        """Сохранение ставок из компактного хранилища в файл ставок (шарда) целиком"""
+        if self.write_mode == 'behind':
+            # Выгрузка в словари откладывается до фонового сброса
+            self._mark_dirty(bets_file, store)
+        else:
+            self._write_file(bets_file, self.codec.dumps(store.to_dict()))
+            # Журнал новых ставок теперь дублирует файл - очищается в конце транзакции
+            tail = self._get_bet_tail(bets_file)
+            tail_signature = file_signature(tail.path)
+            if tail_signature is not None and tail_signature[1] > 0:
+                compacted = getattr(self._local, 'compacted', None)
+                if compacted is None:
+                    # Вне транзакции файл уже записан надежно
+                    tail.clear()
+                else:
+                    compacted.add(bets_file)
+        self._bet_stores[bets_file] = store
+    
+    def _append_bet(self, bets_file: str, store: BetStore, bet: dict):
+        """Запись новой ставки: строка в журнал шарда, а при накоплении журнала - файл ставок целиком"""
+        tail = self._get_bet_tail(bets_file)
+        if self.write_mode == 'behind' or tail.count >= BETS_COMPACT_EVERY or bets_file in getattr(self._local, 'compacted', ()):
+            # Файл, уже переписанный в этой транзакции, переписываем снова: его журнал будет очищен
+            self._save_bet_store(bets_file, store)
+            return
+        
+        tail.append(bet)
+        self._bet_stores[bets_file] = store
+        self._bet_store_signatures[bets_file] = (
+            self._bet_store_signatures.get(bets_file, (None, None))[0], file_signature(tail.path)
+        )
+    
+    def _clear_bet_tails(self):
+        """
+        Очистка журналов ставок, файлы которых транзакция переписала целиком.
+        Выполняется под блокировкой и только после надежной записи файлов
+        """
+        compacted = getattr(self._local, 'compacted', None)
+        if not compacted:
+            return
+        self._local.compacted = set()
+        self._wait_for_tickets()
+        for bets_file in compacted:
+            tail = self._get_bet_tail(bets_file)
+            tail.clear()
+            if bets_file in self._bet_store_signatures:
+                self._bet_store_signatures[bets_file] = (
+                    self._bet_store_signatures[bets_file][0], file_signature(tail.path)
+                )
+    
+    # ========== ШАРДЫ ==========
+    
+    def _shard_paths(self, name: str, count: int) -> List[str]:
+        """Файлы шардов коллекции: name.json для одного шарда, иначе name.K.json"""
+        if count == 1:
+            return [os.path.join(self.data_dir, f"{name}.json")]
+        return [os.path.join(self.data_dir, f"{name}.{shard}.json") for shard in range(count)]
+    
+    def _get_shard(self, telegram_id: int) -> int:
+        """Номер шарда пользователя"""
+        return telegram_id % self.shards
+    
+    def _get_next_shard_id(self, next_id: int, collection: str, shard: int) -> int:
+        """
+        Следующий ID записи в шарде: не меньше next_id и с остатком shard по модулю числа шардов,
+        поэтому шарды выдают ID независимо и без пересечений. ID до последней перераскладки
+        остатку не подчиняются, поэтому новые ID выдаются выше запомненной границы.
+        """
+        if self.shards == 1:
+            return next_id
+        floor = self._read_json(self.shards_file).get('id_floor', {}).get(collection, 0)
+        next_id = max(next_id, floor + 1)
+        return next_id + (shard - next_id) % self.shards
+    
+    def _reshard(self):
+        """Перераскладка пользователей и ставок, если количество шардов изменилось"""
+        meta = self._read_json(self.shards_file)
+        old_count = meta.get('count', 1)
+        if old_count == self.shards:
+            return
+        
+        logger.info(f"Перераскладка данных: {old_count} -> {self.shards} шардов")
+        id_floor = {}
+        old_files = []
+        for name, new_files in (('users', self.users_files), ('bets', self.bets_files)):
+            records = {}
+            for old_file in self._shard_paths(name, old_count):
+                # Ставки - вместе с журналом новых ставок
+                records.update(self._load_json(old_file) if name == 'users' else self._get_bet_store(old_file).to_dict())
+                old_files.append(old_file)
+            
+            shards = [{} for _ in range(self.shards)]
+            for key, record in records.items():
+                shards[self._get_shard(record.get('telegram_id') or 0)][key] = record
+            for new_file, data in zip(new_files, shards):
+                self._save_json(new_file, data)
+            id_floor[name] = max([int(key) for key in records] + [0])
+        
+        # Старые файлы удаляем только после того, как новая раскладка надежно записана
+        self._save_json(self.shards_file, {'count': self.shards, 'id_floor': id_floor})
+        self.flush()
+        self._wait_for_tickets()
+        for old_file in old_files:
+            if old_file not in self.users_files and old_file not in self._bets_files_set:
+                try:
+                    os.remove(old_file)
+                except FileNotFoundError:
+                    pass
+                self._read_cache.pop(old_file, None)
+                self._bet_stores.pop(old_file, None)
+                if old_file in self._bet_tails:
+                    self._bet_tails.pop(old_file).remove()
+    
+    def _get_next_id(self, data: dict, min_id: int = 0) -> int:
+        """Получение следующего ID (не меньше min_id + 1, чтобы не переиспользовать архивные ID)"""
         if not data:
-            return 1
-        return max([int(k) for k in data.keys()]) + 1
+            return min_id + 1
+        return max(max([int(k) for k in data.keys()]), min_id) + 1
     
     # ========== ПОЛЬЗОВАТЕЛИ ==========
     
     def get_user(self, telegram_id: int) -> Optional[dict]:
         """Получить пользователя по Telegram ID"""
-        users = self._load_json(self.users_file)
-        for user_data in users.values():
-            if user_data.get('telegram_id') == telegram_id:
-                return user_data
-        return None
+        user_data = self._find_user(telegram_id)
+        if user_data is None:
+            return None
+        
+        user = user_data.copy()
+        balance = self.ledger.balance(telegram_id)
+        if balance is not None:
+            user['balance'] = balance
+        return user
+    
+    def _find_user(self, telegram_id: int) -> Optional[dict]:
+        """Запись пользователя из файла (только для чтения) через индекс telegram_id -> ключ"""
+        users_file = self.users_files[self._get_shard(telegram_id)]
+        users = self._read_json(users_file)
+        cached = self._user_index.get(users_file)
+        if cached is None or cached[0] is not users:
+            # Файл перечитан или изменен - индекс строится заново (баланс в файле меняется редко)
+            index = {}
+            for key, user_data in users.items():
+                index.setdefault(user_data.get('telegram_id'), key)
+            cached = (users, index)
+            self._user_index[users_file] = cached
+        key = cached[1].get(telegram_id)
+        return users[key] if key is not None else None
     
+    @transactional
     def create_user(self, telegram_id: int, username: str = None, first_name: str = None) -> dict:
         """Создать нового пользователя"""
-        users = self._load_json(self.users_file)
-        user_id = self._get_next_id(users)
+        shard = self._get_shard(telegram_id)
+        users_file = self.users_files[shard]
+        users = self._load_json(users_file)
+        user_id = self._get_next_shard_id(self._get_next_id(users), 'users', shard)
         
         user_data = {
             'id': user_id,
@@ -78,81 +646,400 @@ class DataManager:
         }
         
         users[str(user_id)] = user_data
-        self._save_json(self.users_file, users)
+        self._save_json(users_file, users)
+        self._record_movements([(telegram_id, user_data['balance'], 'grant', None)])
         return user_data
     
+    @transactional
     def update_user_balance(self, telegram_id: int, new_balance: float) -> bool:
-        """Обновить баланс пользователя"""
-        users = self._load_json(self.users_file)
-        
-        for user_id, user_data in users.items():
-            if user_data.get('telegram_id') == telegram_id:
-                user_data['balance'] = new_balance
-                self._save_json(self.users_file, users)
-                return True
-        return False
+        """Установить баланс пользователя (в журнал пишется корректировка на разницу)"""
+        user = self.get_user(telegram_id)
+        if not user:
+            return False
+        self._record_movements([(telegram_id, new_balance - user['balance'], 'adjust', None)])
+        return True
     
+    @transactional
     def add_balance(self, telegram_id: int, amount: float) -> bool:
         """Добавить к балансу пользователя"""
         user = self.get_user(telegram_id)
         if user:
-            new_balance = user['balance'] + amount
-            return self.update_user_balance(telegram_id, new_balance)
+            self._record_movements([(telegram_id, amount, 'top_up', None)])
+            return True
         return False
     
+    @transactional
+    def add_balances(self, amounts: Dict[int, float], kind: str = 'top_up', ref: str = None) -> int:
+        """Добавить к балансам нескольких пользователей одной записью в журнал (telegram_id -> сумма)"""
+        if not amounts:
+            return 0
+        
+        movements = [
+            (telegram_id, amount, kind, ref) for telegram_id, amount in amounts.items()
+            if self._find_user(telegram_id) is not None
+        ]
+        self._record_movements(movements)
+        return len(movements)
+    
+    @transactional
+    def set_users_active(self, telegram_ids: Iterable[int], active: bool) -> int:
+        """
+        Пометить пользователей активными или неактивными (бот заблокирован) - неактивных
+        пропускают рассылки. Возвращает количество измененных пользователей
+        """
+        by_shard: Dict[int, set] = {}
+        for telegram_id in telegram_ids:
+            by_shard.setdefault(self._get_shard(telegram_id), set()).add(telegram_id)
+        
+        changed = 0
+        for shard, shard_ids in by_shard.items():
+            users_file = self.users_files[shard]
+            users = self._load_json(users_file)
+            shard_changed = 0
+            for user_data in users.values():
+                if user_data.get('telegram_id') in shard_ids and user_data.get('is_active', True) != active:
+                    user_data['is_active'] = active
+                    if active:
+                        user_data.pop('inactive_since', None)
+                    else:
+                        user_data['inactive_since'] = datetime.now().isoformat()
+                    shard_changed += 1
+            if shard_changed:
+                self._save_json(users_file, users)
+                changed += shard_changed
+        return changed
+    
+    @staticmethod
+    def _ordered_users(users: dict) -> Iterable[dict]:
+        """Записи файла пользователей по возрастанию ID (новые дописываются в конец - сортировать приходится редко)"""
+        if all(int(a) < int(b) for a, b in zip(users, islice(users, 1, None))):
+            return iter(users.values())
+        return (users[key] for key in sorted(users, key=int))
+    
+    def iter_recipients(self, after_id: int = 0, chunk_size: int = 100) -> Iterator[List[tuple]]:
+        """
+        Получатели рассылки пачками [(ID пользователя, telegram_id)] по возрастанию ID, начиная
+        после after_id. Неактивные пропускаются; шарды сливаются по ходу чтения, копии
+        пользователей не собираются
+        """
+        streams = [
+            ((user['id'], user['telegram_id']) for user in self._ordered_users(self._read_json(users_file))
+             if user['id'] > after_id and user.get('telegram_id') is not None and user.get('is_active', True))
+            for users_file in self.users_files
+        ]
+        merged = heapq.merge(*streams)
+        while True:
+            chunk = list(islice(merged, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+    
+    @consistent_read
+    def get_all_users(self) -> List[dict]:
+        """Все пользователи (по всем шардам)"""
+        self.ledger.refresh()
+        users = [user.copy() for users_file in self.users_files for user in self._read_json(users_file).values()]
+        for user in users:
+            balance = self.ledger.balances.get(user_account(user.get('telegram_id')))
+            if balance is not None:
+                user['balance'] = balance
+        return users
+    
+    # ========== РЕЙТИНГ ==========
+    
+    def _build_rankings(self):
+        """
+        Заполнение рейтингов по всем пользователям - при первом обращении к рейтингу, а не при запуске
+        (на больших папках данных это большая часть времени запуска)
+        """
+        with self._rankings_lock:
+            if self._rankings_ready:
+                return
+            self.ledger.refresh()
+            # Пока рейтинги заполняются, журнал не меняется: ни одно движение не пропадет
+            with self.ledger.frozen():
+                balances, profits = {}, {}
+                for users_file in self.users_files:
+                    for user in self._read_json(users_file).values():
+                        telegram_id = user.get('telegram_id')
+                        account = user_account(telegram_id)
+                        balances[telegram_id] = self.ledger.balances.get(account, user.get('balance', 0.0))
+                        profits[telegram_id] = self.ledger.profits.get(account, 0.0)
+                self._rankings['balance'].reset(balances)
+                self._rankings['profit'].reset(profits)
+                self._rankings_ready = True
+    
+    def _update_rankings(self, accounts):
+        """Обновление рейтингов по счетам, изменившимся в журнале"""
+        if not self._rankings_ready:
+            return
+        for account in accounts:
+            if account.startswith('user:'):
+                telegram_id = int(account[5:])
+                self._rankings['balance'].update(telegram_id, self.ledger.balances.get(account, 0.0))
+                self._rankings['profit'].update(telegram_id, self.ledger.profits.get(account, 0.0))
+    
+    def _get_ranking(self, by: str) -> Ranking:
+        if by not in self._rankings:
+            raise ValueError(f"Неизвестный рейтинг: {by} (доступны: {', '.join(self._rankings)})")
+        self._build_rankings()
+        self.ledger.refresh()
+        return self._rankings[by]
+    
+    def get_leaderboard(self, by: str = 'balance', limit: int = 10) -> List[dict]:
+        """Первые места рейтинга (by: balance - баланс, profit - выигрыши минус ставки)"""
+        leaders = []
+        for rank, telegram_id, value in self._get_ranking(by).top(limit):
+            user = self._find_user(telegram_id) or {}
+            leaders.append({
+                'rank': rank,
+                'telegram_id': telegram_id,
+                'username': user.get('username'),
+                'first_name': user.get('first_name'),
+                'value': value
+            })
+        return leaders
+    
+    def get_user_rank(self, telegram_id: int, by: str = 'balance') -> Optional[dict]:
+        """Место пользователя в рейтинге: {'rank', 'value', 'total'} или None"""
+        ranking = self._get_ranking(by)
+        position = ranking.rank(telegram_id)
+        if position is None:
+            return None
+        return {'rank': position[0], 'value': position[1], 'total': len(ranking)}
+    
+    # ========== ЖУРНАЛ БАЛАНСОВ ==========
+    
+    def _load_ledger(self):
+        """Загрузка журнала балансов; при первом запуске текущие балансы становятся начальными движениями"""
+        self.ledger.load(self._read_json(self.ledger_snapshot_file) or None)
+        if self.ledger.exists:
+            return
+        
+        movements = [
+            (user['telegram_id'], user.get('balance', 0), 'opening', None)
+            for users_file in self.users_files for user in self._read_json(users_file).values()
+        ]
+        if self.ledger.record(movements):
+            logger.info(f"Журнал балансов создан: {len(movements)} начальных балансов")
+            self._snapshot_ledger()
+    
+    def _record_movements(self, movements: List[tuple]) -> List[dict]:
+        """Записать движения балансов (telegram_id, изменение, вид, ссылка); снимок - по накоплении"""
+        entries = self.ledger.record(movements)
+        if self.ledger.since_snapshot >= self.ledger_snapshot_every:
+            self._snapshot_ledger()
+        return entries
+    
+    def _snapshot_ledger(self):
+        """Снимок балансов: изменившиеся балансы переносятся в файлы пользователей, затем пишется снимок"""
+        snapshot, changed = self.ledger.snapshot()
+        
+        for shard in {self._get_shard(telegram_id) for telegram_id in changed}:
+            users_file = self.users_files[shard]
+            users = self._load_json(users_file)
+            for user_data in users.values():
+                balance = changed.get(user_data.get('telegram_id'))
+                if balance is not None:
+                    user_data['balance'] = balance
+            self._save_json(users_file, users)
+        
+        # Снимок ссылается на смещение в журнале - журнал должен быть на диске раньше
+        if self.write_mode == 'sync':
+            self.ledger.sync()
+        self._save_json(self.ledger_snapshot_file, snapshot)
+    
+    @consistent_read
+    def reconcile_ledger(self) -> dict:
+        """
+        Сверка журнала балансов: пересчет всех движений с начала и сравнение со снимком + хвостом,
+        нулевая сумма по всем счетам (двойная запись), соответствие счетов пользователям,
+        балансов в файлах пользователей - последнему снимку, списание по каждой ставке
+        и ставка (рабочая или архивная) по каждому списанию
+        """
+        self.ledger.refresh()
+        replayed: Dict[str, float] = {}
+        bet_debits: Dict[str, float] = {}
+        entries = 0
+        started_at = None
+        for entry in self.ledger.entries():
+            Ledger.apply(replayed, entry)
+            entries += 1
+            if started_at is None:
+                started_at = entry['at']
+            if entry['kind'] == 'bet' and entry.get('ref'):
+                bet_debits[entry['ref']] = bet_debits.get(entry['ref'], 0.0) + entry['amount']
+        
+        bet_refs = {
+            f"bet:{bet_id}" for bets_file in self.bets_files
+            for bet_id in self._get_bet_store(bets_file).ids
+        }
+        
+        def differs(a: float, b: float) -> bool:
+            return abs(a - b) > 1e-6
+        
+        current = self.ledger.balances
+        mismatched = sorted(
+            account for account in set(replayed) | set(current)
+            if differs(replayed.get(account, 0.0), current.get(account, 0.0))
+        )
+        
+        snapshot_balances = self._read_json(self.ledger_snapshot_file).get('balances', {})
+        stored_users = [user for users_file in self.users_files for user in self._read_json(users_file).values()]
+        user_accounts = {user_account(user.get('telegram_id')) for user in stored_users}
+        users_without_account = sorted(
+            user.get('telegram_id') for user in stored_users
+            if user_account(user.get('telegram_id')) not in replayed and user.get('balance')
+        )
+        accounts_without_user = sorted(
+            account for account in replayed if account.startswith('user:') and account not in user_accounts
+        )
+        stale_users = sorted(
+            user.get('telegram_id') for user in stored_users
+            if user_account(user.get('telegram_id')) in snapshot_balances
+            and differs(user.get('balance', 0.0), snapshot_balances[user_account(user.get('telegram_id'))])
+        )
+        
+        # Ставки, сделанные до появления журнала, списаний в нем не имеют
+        bets_without_debit = sorted(
+            bet['id'] for bets_file in self.bets_files for bet in self._get_bet_store(bets_file).to_dict().values()
+            if started_at is not None and bet.get('created_at', '') >= started_at
+            and differs(bet_debits.get(f"bet:{bet['id']}", 0.0), bet.get('amount', 0.0))
+        )
+        
+        # Списания по ставкам, которых нет ни в рабочих файлах, ни в архиве (потерянные ставки)
+        debits_without_bet = [ref for ref in bet_debits if ref not in bet_refs]
+        if debits_without_bet and os.path.exists(self.archive_index_file):
+            for month in self._load_archive_index()['segments']:
+                archived = self._load_archive_segment(month, cache=False)['bets']
+                debits_without_bet = [ref for ref in debits_without_bet if ref[len('bet:'):] not in archived]
+        debits_without_bet = sorted(int(ref[len('bet:'):]) for ref in debits_without_bet)
+        
+        imbalance = sum(replayed.values())
+        report = {
+            'entries': entries,
+            'accounts': len(replayed),
+            'mismatched': mismatched,
+            'imbalance': imbalance,
+            'users_without_account': users_without_account,
+            'accounts_without_user': accounts_without_user,
+            'stale_users': stale_users,
+            'bets_without_debit': bets_without_debit,
+            'debits_without_bet': debits_without_bet,
+        }
+        report['ok'] = not (mismatched or differs(imbalance, 0.0) or users_without_account
+                            or accounts_without_user or stale_users or bets_without_debit
+                            or debits_without_bet)
+        return report
+    
     # ========== СОБЫТИЯ ==========
     
     def create_event(self, title: str, option1: str, option2: str, odds1: float = 2.0, odds2: float = 2.0, description: str = None, image_url: str = None, image_file_id: str = None) -> dict:
         """Создать новое событие"""
-        events = self._load_json(self.events_file)
-        event_id = self._get_next_id(events)
-        
-        event_data = {
-            'id': event_id,
+        return self.create_events([{
             'title': title,
-            'description': description,
             'option1': option1,
             'option2': option2,
             'odds1': odds1,
             'odds2': odds2,
+            'description': description,
             'image_url': image_url,
-            'image_file_id': image_file_id,
-            'is_active': True,
-            'created_at': datetime.now().isoformat(),
-            'closed_at': None,
-            'result': None
-        }
+            'image_file_id': image_file_id
+        }])[0]
+    
+    @transactional
+    def create_events(self, events_data: List[dict]) -> List[dict]:
+        """Создать несколько событий одной записью (поля - как у create_event)"""
+        events = self._load_json(self.events_file)
+        event_id = self._get_next_id(events, self._get_archive_last_id('events'))
+        created_at = datetime.now().isoformat()
         
-        events[str(event_id)] = event_data
-        self._save_json(self.events_file, events)
-        return event_data
+        created = []
+        for fields in events_data:
+            event_data = {
+                'id': event_id,
+                'title': fields['title'],
+                'description': fields.get('description'),
+                'option1': fields['option1'],
+                'option2': fields['option2'],
+                'odds1': fields.get('odds1', 2.0),
+                'odds2': fields.get('odds2', 2.0),
+                'image_url': fields.get('image_url'),
+                'image_file_id': fields.get('image_file_id'),
+                'is_active': True,
+                'created_at': created_at,
+                'closed_at': None,
+                'result': None
+            }
+            events[str(event_id)] = event_data
+            created.append(event_data)
+            event_id += 1
+        
+        if created:
+            self._save_json(self.events_file, events)
+        return created
     
+    @consistent_read
     def get_event(self, event_id: int) -> Optional[dict]:
-        """Получить событие по ID"""
-        events = self._load_json(self.events_file)
-        return events.get(str(event_id))
+        """Получить событие по ID (с поиском в архиве)"""
+        events = self._read_json(self.events_file)
+        event = events.get(str(event_id))
+        if event is None:
+            event = self._get_archived_event(event_id)
+        return event.copy() if event is not None else None
     
     def get_active_events(self) -> List[dict]:
         """Получить все активные события"""
+        events = self._read_json(self.events_file)
+        return [event.copy() for event in events.values() if event.get('is_active', False)]
+    
+    @transactional
+    def set_event_image_file_id(self, event_id: int, image_url: str, file_id: str) -> bool:
+        """
+        Запомнить file_id картинки события, загруженной в Telegram по image_url: дальше картинка
+        отправляется по file_id, и Telegram не скачивает ее заново. Если картинку события
+        за это время сменили, file_id не записывается
+        """
         events = self._load_json(self.events_file)
-        return [event for event in events.values() if event.get('is_active', False)]
+        event = events.get(str(event_id))
+        if event is None or event.get('image_file_id') or event.get('image_url') != image_url:
+            return False
+        
+        event['image_file_id'] = file_id
+        self._save_json(self.events_file, events)
+        return True
     
+    @transactional
     def close_event(self, event_id: int, result: int) -> bool:
-        """Закрыть событие с результатом (1 или 2)"""
+        """
+        Закрыть событие с результатом (1 или 2): ставки больше не принимаются, расчет
+        переходит в состояние closing. Повторное закрытие с тем же результатом - без ошибки
+        (расчет продолжается или уже завершен); False - события нет
+        """
         events = self._load_json(self.events_file)
+        event = events.get(str(event_id))
+        if event is None:
+            return False
         
-        if str(event_id) in events:
-            event = events[str(event_id)]
-            event['is_active'] = False
-            event['result'] = result
-            event['closed_at'] = datetime.now().isoformat()
-            
-            self._save_json(self.events_file, events)
-            return True
-        return False
+        if not event.get('is_active'):
+            # Повтор с тем же результатом: расчет продолжается (или уже завершен)
+            if event.get('settlement') and event.get('result') == result:
+                return True
+            if event.get('settlement') in ('closing', 'settling'):
+                raise ValueError(f"Событие уже рассчитывается с результатом {event.get('result')}")
+            raise ValueError("Событие уже закрыто")
+        
+        event['is_active'] = False
+        event['result'] = result
+        event['closed_at'] = datetime.now().isoformat()
+        event['settlement'] = 'closing'
+        
+        self._save_json(self.events_file, events)
+        return True
     
     # ========== СТАВКИ ==========
     
+    @transactional
     def create_bet(self, telegram_id: int, event_id: int, amount: float, option: int, odds: float) -> dict:
         """Создать новую ставку"""
         user = self.get_user(telegram_id)
@@ -166,8 +1053,47 @@ class DataManager:
         if not event or not event.get('is_active'):
             raise ValueError("Событие не активно")
         
-        bets = self._load_json(self.bets_file)
-        bet_id = self._get_next_id(bets)
+        return self._insert_bet(user, event_id, amount, option, odds)
+    
+    @transactional
+    def place_bet(self, telegram_id: int, event_id: int, option: int, amount: float) -> dict:
+        """
+        Принять ставку одной операцией хранилища: проверка пользователя, события и баланса,
+        запись ставки и списание под одной блокировкой. Коэффициент берется из события.
+        Возвращает {'bet', 'event', 'balance'} - баланс после списания.
+        """
+        user = self._find_user(telegram_id)
+        if user is None:
+            raise ValueError("Пользователь не найден. Используйте /start")
+        
+        # Закрытые события уходят в архив, поэтому активное событие может быть только в events.json
+        event = self._read_json(self.events_file).get(str(event_id))
+        if event is None or not event.get('is_active'):
+            raise ValueError("Событие больше не активно")
+        if option not in (1, 2):
+            raise ValueError(f"Неизвестный вариант ставки: {option}")
+        
+        balance = self.ledger.balance(telegram_id)
+        if balance is None:
+            balance = user.get('balance', 0.0)
+        if balance < amount:
+            raise ValueError(f"Недостаточно средств. Ваш баланс: {balance:.2f} монет")
+        
+        odds = event['odds1'] if option == 1 else event['odds2']
+        bet = self._insert_bet(user, event_id, amount, option, odds)
+        return {
+            'bet': bet,
+            'event': event.copy(),
+            'balance': self.ledger.balances.get(user_account(telegram_id), balance - amount)
+        }
+    
+    def _insert_bet(self, user: dict, event_id: int, amount: float, option: int, odds: float) -> dict:
+        """Запись ставки в шард пользователя и списание суммы (вызывается внутри транзакции)"""
+        telegram_id = user['telegram_id']
+        shard = self._get_shard(telegram_id)
+        bets_file = self.bets_files[shard]
+        store = self._get_bet_store(bets_file)
+        bet_id = self._get_next_shard_id(max(store.max_id, self._get_archive_last_id('bets')) + 1, 'bets', shard)
         
         bet_data = {
             'id': bet_id,
@@ -181,75 +1107,264 @@ class DataManager:
             'is_won': None
         }
         
-        bets[str(bet_id)] = bet_data
-        self._save_json(self.bets_file, bets)
+        store.add(bet_data)
+        self._append_bet(bets_file, store, bet_data)
         
         # Списываем средства с баланса
-        self.update_user_balance(telegram_id, user['balance'] - amount)
+        self._record_movements([(telegram_id, -amount, 'bet', f"bet:{bet_id}")])
         
         return bet_data
     
+    @consistent_read
     def get_user_bets(self, telegram_id: int, limit: int = 10) -> List[dict]:
-        """Получить ставки пользователя"""
-        bets = self._load_json(self.bets_file)
-        user_bets = [bet for bet in bets.values() if bet.get('telegram_id') == telegram_id]
+        """Получить ставки пользователя (при нехватке - догружаем из архива)"""
+        user_bets = self._get_bet_store(self.bets_files[self._get_shard(telegram_id)]).user_bets(telegram_id)
         
         # Сортируем по дате создания (новые сначала)
         user_bets.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         
+        if len(user_bets) < limit:
+            user_bets = self._get_archived_user_bets(telegram_id, limit, user_bets)
+        
         return user_bets[:limit]
     
+    @consistent_read
     def get_event_bets(self, event_id: int) -> List[dict]:
-        """Получить все ставки на событие"""
-        bets = self._load_json(self.bets_file)
-        return [bet for bet in bets.values() if bet.get('event_id') == event_id]
-    
-    def process_event_results(self, event_id: int, winning_option: int) -> dict:
-        """Обработать результаты события и выплатить выигрыши"""
-        event_bets = self.get_event_bets(event_id)
-        stats = {
-            'total_bets': len(event_bets),
-            'winners': 0,
-            'total_payouts': 0
-        }
+        """Получить все ставки на событие (со всех шардов)"""
+        if self.shards == 1:
+            return self._get_bet_store(self.bets_files[0]).event_bets(event_id)
         
-        bets = self._load_json(self.bets_file)
-        
-        for bet in event_bets:
-            bet_id = str(bet['id'])
-            if bet['option'] == winning_option:
-                # Выигрышная ставка
-                bets[bet_id]['is_won'] = True
-                payout = bet['amount'] * bet['odds']
-                self.add_balance(bet['telegram_id'], payout)
-                stats['winners'] += 1
-                stats['total_payouts'] += payout
-            else:
-                # Проигрышная ставка
-                bets[bet_id]['is_won'] = False
-        
-        self._save_json(self.bets_file, bets)
-        return stats
+        bets = [bet for bets_file in self.bets_files for bet in self._get_bet_store(bets_file).event_bets(event_id)]
+        bets.sort(key=lambda x: x.get('id', 0))
+        return bets
+    
+    def count_event_bets(self, event_id: int) -> int:
+        """Количество ставок на событие (по индексу, без сборки ставок)"""
+        return sum(len(self._get_bet_store(bets_file).event_rows(event_id)) for bets_file in self.bets_files)
+    
+    @consistent_read
+    def get_event_view(self, event_id: int) -> Optional[dict]:
+        """Карточка события: {'event', 'total_bets'} или None, если события нет"""
+        event = self.get_event(event_id)
+        if event is None:
+            return None
+        return {'event': event, 'total_bets': self.count_event_bets(event_id)}
+    
+    @consistent_read
+    def get_all_bets(self) -> List[dict]:
+        """Все ставки рабочих файлов (по всем шардам)"""
+        return [bet for bets_file in self.bets_files for bet in self._get_bet_store(bets_file).to_dict().values()]
     
+    @consistent_read
     def get_active_bets_count(self, telegram_id: int) -> int:
         """Получить количество активных ставок пользователя"""
-        bets = self._load_json(self.bets_file)
-        events = self._load_json(self.events_file)
+        events = self._read_json(self.events_file)
         
         count = 0
-        for bet in bets.values():
-            if (bet.get('telegram_id') == telegram_id and 
-                bet.get('event_id') and
-                str(bet['event_id']) in events and
-                events[str(bet['event_id'])].get('is_active')):
+        bets_file = self.bets_files[self._get_shard(telegram_id)]
+        for event_id in self._get_bet_store(bets_file).user_event_ids(telegram_id):
+            if (event_id and
+                str(event_id) in events and
+                events[str(event_id)].get('is_active')):
                 count += 1
         
         return count
     
+    # ========== РАСЧЕТ СОБЫТИЙ ==========
+    #
+    # Расчет - конечный автомат в записи события (поле settlement):
+    #   closing  - событие закрыто для ставок, результат зафиксирован (close_event);
+    #   settling - ставки разбиты на части по возрастанию ID, границы частей сохранены в событии
+    #              (settlement_plan), каждая часть рассчитывается своей транзакцией (settle_chunk);
+    #   settled  - все ставки отмечены, итоги в settlement_stats (finish_settlement).
+    # Выплата по части пишется в журнал со ссылкой event:ID:номер части, номер части - в событие
+    # (paid_chunks), а ставки части получают отметку результата (is_won). Расчет, прерванный сбоем,
+    # продолжается с начала плана: части, выплата по которым уже есть в журнале или в событии,
+    # только отмечаются - дважды ничего не выплачивается, даже если часть рассчитывают два плана.
+    # Закрытые до появления автомата события (без поля settlement) считаются рассчитанными.
+    
+    def process_event_results(self, event_id: int, winning_option: int, chunk_size: Optional[int] = None) -> dict:
+        """Закрыть событие и рассчитать его целиком (или продолжить прерванный расчет)"""
+        if not self.close_event(event_id, winning_option):
+            raise ValueError("Событие не найдено")
+        plan = self.start_settlement(event_id, chunk_size)
+        for number in range(len(plan['chunks'])):
+            self.settle_chunk(plan, number)
+        return self.finish_settlement(event_id)
+    
+    def start_settlement(self, event_id: int, chunk_size: Optional[int] = None) -> dict:
+        """
+        План расчета закрытого события (closing -> settling): части ставок и уже выплаченные части.
+        Границы частей (первый и последний ID ставки) фиксируются в событии при первом вызове -
+        при продолжении части те же, даже если с тех пор изменилось число шардов.
+        chunk_size - ставок в части (по умолчанию settlement_chunk хранилища)
+        """
+        plan = self._plan_settlement(event_id, self.settlement_chunk if chunk_size is None else chunk_size)
+        if self.write_mode == 'behind' and plan['chunks']:
+            # Закрытие события и план - на диск до первой выплаты: журнал пишется сразу,
+            # и сбой до фонового сброса оставил бы выплаты при снова открытом событии
+            self.flush()
+        return plan
+    
+    @transactional
+    def _plan_settlement(self, event_id: int, chunk_size: int) -> dict:
+        """План расчета (см. start_settlement) одной транзакцией"""
+        events = self._load_json(self.events_file)
+        event = events.get(str(event_id))
+        if event is None:
+            raise ValueError("Событие не найдено")
+        state = event.get('settlement')
+        if state not in ('closing', 'settling', 'settled'):
+            raise ValueError("Событие не закрыто" if event.get('is_active') else "Событие уже рассчитано")
+        
+        plan = {'event_id': event_id, 'result': event['result'], 'chunks': [], 'paid': set(), 'total': 0}
+        if state == 'settled':
+            return plan
+        
+        # Ставки события из всех шардов по возрастанию ID
+        located = sorted(
+            (store.ids[row], shard)
+            for shard, store in enumerate(self._get_bet_store(bets_file) for bets_file in self.bets_files)
+            for row in store.event_rows(event_id)
+        )
+        if state == 'closing':
+            chunk_size = max(1, chunk_size)
+            event['settlement'] = 'settling'
+            event['settlement_plan'] = [
+                [located[start][0], located[min(start + chunk_size, len(located)) - 1][0]]
+                for start in range(0, len(located), chunk_size)
+            ]
+            event['paid_chunks'] = []
+            self._save_json(self.events_file, events)
+        
+        # Какие части уже выплачены, видно по журналу - и при продолжении, и при новом плане
+        # (сбой мог потерять отложенную запись события, но не выплаты)
+        self.ledger.refresh()
+        plan['paid'] = self.ledger.payout_refs(f"event:{event_id}")
+        
+        # Часть - ставки с ID в ее границах, сгруппированные по текущим шардам
+        bounds = event['settlement_plan']
+        starts = [first for first, _ in bounds]
+        chunks: List[Dict[int, List[int]]] = [{} for _ in bounds]
+        for bet_id, shard in located:
+            number = bisect_right(starts, bet_id) - 1
+            if number < 0 or bet_id > bounds[number][1]:
+                raise ValueError(f"Ставка #{bet_id} не входит в план расчета события")
+            chunks[number].setdefault(shard, []).append(bet_id)
+        plan['chunks'] = [sorted(chunk.items()) for chunk in chunks]
+        plan['total'] = len(located)
+        return plan
+    
+    @transactional
+    def settle_chunk(self, plan: dict, number: int) -> int:
+        """
+        Рассчитать часть плана одной транзакцией: выплата (если ее еще нет в журнале или в событии),
+        отметки ставок и контрольная точка в событии. Возвращает число ставок части
+        """
+        event_id = plan['event_id']
+        events = self._load_json(self.events_file)
+        event = events.get(str(event_id))
+        if event is None or event.get('settlement') != 'settling':
+            # Расчет уже завершил другой план
+            return 0
+        # Отметка в событии читается внутри транзакции: plan['paid'] - снимок на момент начала,
+        # а ту же часть мог выплатить другой план
+        paid_chunks = event.setdefault('paid_chunks', [])
+        
+        payouts: Dict[int, float] = {}
+        marks = []
+        for shard, bet_ids in plan['chunks'][number]:
+            bets_file = self.bets_files[shard]
+            store = self._get_bet_store(bets_file)
+            # Расчет по столбцам ставок части (векторно, если есть NumPy)
+            rows = store.rows_of(bet_ids)
+            result = settle_rows(store, rows, plan['result'])
+            for telegram_id, payout in result['payouts'].items():
+                payouts[telegram_id] = payouts.get(telegram_id, 0.0) + payout
+            marks.append((bets_file, store, rows, result['won']))
+        
+        ref = f"event:{event_id}:{number}"
+        if ref not in plan['paid'] and number not in paid_chunks:
+            self.add_balances(payouts, kind='payout', ref=ref)
+        plan['paid'].add(ref)
+        
+        for bets_file, store, rows, won in marks:
+            store.set_won_rows(rows, won)
+            self._save_bet_store(bets_file, store)
+        
+        if number not in paid_chunks:
+            paid_chunks.append(number)
+        self._save_json(self.events_file, events)
+        return sum(len(rows) for _, _, rows, _ in marks)
+    
+    @transactional
+    def finish_settlement(self, event_id: int) -> dict:
+        """Завершить расчет (settling -> settled): итоги по отметкам ставок. Повторный вызов - те же итоги"""
+        events = self._load_json(self.events_file)
+        event = events.get(str(event_id))
+        if event is None:
+            raise ValueError("Событие не найдено")
+        if event.get('settlement') == 'settled':
+            return dict(event['settlement_stats'])
+        if event.get('settlement') != 'settling':
+            raise ValueError("Расчет события не начат")
+        
+        totals = {'total_bets': 0, 'winners': 0, 'total_payouts': 0.0}
+        for bets_file in self.bets_files:
+            store = self._get_bet_store(bets_file)
+            rows = store.event_rows(event_id)
+            if any(store.is_won[row] == WON_NONE for row in rows):
+                raise ValueError("Не все ставки события рассчитаны")
+            result = settle_rows(store, rows, event['result'])
+            for key in totals:
+                totals[key] += result[key]
+        
+        event['settlement'] = 'settled'
+        event['settlement_stats'] = totals
+        event['settled_at'] = datetime.now().isoformat()
+        self._save_json(self.events_file, events)
+        return dict(totals)
+    
+    def get_unfinished_settlements(self) -> List[dict]:
+        """События с прерванным расчетом (продолжаются при запуске)"""
+        return [
+            event.copy() for event in self._read_json(self.events_file).values()
+            if event.get('settlement') in ('closing', 'settling')
+        ]
+    
     # ========== ПРЕДЛОЖЕНИЯ СОБЫТИЙ ==========
     
+    def _get_proposal_index(self) -> Dict[str, Dict[int, None]]:
+        """
+        Индекс предложений по статусам. Строится заново, только если файл предложений
+        изменили извне; свои изменения вносятся в индекс по одному предложению
+        """
+        proposals = self._read_json(self.proposals_file)
+        with self._proposal_lock:
+            if self._proposal_index is None or self._proposal_index[0] is not proposals:
+                index = {status: {} for status in PROPOSAL_STATUSES}
+                ordered = sorted(
+                    proposals.values(),
+                    key=lambda p: (p.get('reviewed_at') or p.get('created_at') or '', p['id'])
+                )
+                for proposal in ordered:
+                    index.setdefault(proposal.get('status', 'pending'), {})[proposal['id']] = None
+                self._proposal_index = (proposals, index)
+            return self._proposal_index[1]
+    
+    def _move_proposal(self, proposal_id: int, old_status: Optional[str], new_status: str):
+        """Перенос предложения между очередями после сохранения файла (внутри транзакции)"""
+        with self._proposal_lock:
+            index = self._proposal_index[1]
+            if old_status is not None:
+                index.get(old_status, {}).pop(proposal_id, None)
+            index.setdefault(new_status, {})[proposal_id] = None
+            self._proposal_index = (self._read_json(self.proposals_file), index)
+    
+    @transactional
     def create_proposal(self, telegram_id: int, title: str, option1: str, option2: str, description: str = None, image_file_id: str = None) -> dict:
         """Создать предложение события от пользователя"""
+        self._get_proposal_index()
         proposals = self._load_json(self.proposals_file)
         proposal_id = self._get_next_id(proposals)
         
@@ -274,33 +1389,53 @@ class DataManager:
         
         proposals[str(proposal_id)] = proposal_data
         self._save_json(self.proposals_file, proposals)
+        self._move_proposal(proposal_id, None, 'pending')
         return proposal_data
     
     def get_proposal(self, proposal_id: int) -> Optional[dict]:
         """Получить предложение по ID"""
-        proposals = self._load_json(self.proposals_file)
-        return proposals.get(str(proposal_id))
+        proposals = self._read_json(self.proposals_file)
+        proposal = proposals.get(str(proposal_id))
+        return proposal.copy() if proposal is not None else None
     
     def get_pending_proposals(self) -> List[dict]:
-        """Получить все ожидающие рассмотрения предложения"""
-        proposals = self._load_json(self.proposals_file)
-        pending = [p for p in proposals.values() if p.get('status') == 'pending']
+        """Получить все ожидающие рассмотрения предложения (в порядке очереди - старые первыми)"""
+        return self.get_proposals_page('pending', 0, None)
+    
+    def get_proposals_page(self, status: str = 'pending', offset: int = 0, limit: Optional[int] = 10) -> List[dict]:
+        """
+        Страница очереди предложений: ожидающие - старые первыми (в порядке рассмотрения),
+        рассмотренные - недавно рассмотренные первыми. Читаются только предложения страницы
+        """
+        if status not in PROPOSAL_STATUSES:
+            raise ValueError(f"Неизвестный статус предложения: {status} (доступны: {', '.join(PROPOSAL_STATUSES)})")
         
-        # Сортируем по дате создания (новые первыми)
-        pending.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        return pending
+        index = self._get_proposal_index()
+        proposals = self._proposal_index[0]
+        with self._proposal_lock:
+            queue = index.get(status, {})
+            ids = iter(queue) if status == 'pending' else reversed(queue)
+            stop = None if limit is None else offset + limit
+            page_ids = list(islice(ids, offset, stop))
+        return [proposals[str(proposal_id)].copy() for proposal_id in page_ids if str(proposal_id) in proposals]
+    
+    def count_proposals(self, status: str = 'pending') -> int:
+        """Количество предложений в статусе"""
+        return len(self._get_proposal_index().get(status, ()))
     
     def get_user_proposals(self, telegram_id: int, limit: int = 10) -> List[dict]:
         """Получить предложения пользователя"""
-        proposals = self._load_json(self.proposals_file)
-        user_proposals = [p for p in proposals.values() if p.get('telegram_id') == telegram_id]
+        proposals = self._read_json(self.proposals_file)
+        user_proposals = [p.copy() for p in proposals.values() if p.get('telegram_id') == telegram_id]
         
         # Сортируем по дате создания (новые первыми)
         user_proposals.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         return user_proposals[:limit]
     
+    @transactional
     def approve_proposal(self, proposal_id: int, odds1: float = 2.0, odds2: float = 2.0) -> dict:
         """Одобрить предложение и создать событие"""
+        self._get_proposal_index()
         proposals = self._load_json(self.proposals_file)
         
         if str(proposal_id) not in proposals:
@@ -329,14 +1464,17 @@ class DataManager:
         
         proposals[str(proposal_id)] = proposal
         self._save_json(self.proposals_file, proposals)
+        self._move_proposal(proposal_id, 'pending', 'approved')
         
         return {
             'proposal': proposal,
             'event': event
         }
     
+    @transactional
     def reject_proposal(self, proposal_id: int, reason: str = None) -> bool:
         """Отклонить предложение"""
+        self._get_proposal_index()
         proposals = self._load_json(self.proposals_file)
         
         if str(proposal_id) not in proposals:
@@ -354,5 +1492,320 @@ class DataManager:
         
         proposals[str(proposal_id)] = proposal
         self._save_json(self.proposals_file, proposals)
+        self._move_proposal(proposal_id, 'pending', 'rejected')
         
         return True
+
+    # ========== РАССЫЛКИ ==========
+    
+    @transactional
+    def create_broadcast(self, event_id: int) -> dict:
+        """Создать рассылку анонса события (одна рассылка на событие)"""
+        broadcasts = self._load_json(self.broadcasts_file)
+        for broadcast in broadcasts.values():
+            if broadcast['event_id'] == event_id:
+                state = {'running': 'идет', 'done': 'выполнена', 'cancelled': 'отменена'}[broadcast['status']]
+                raise ValueError(f"Рассылка о событии {event_id} уже {state}")
+        
+        broadcast_id = self._get_next_id(broadcasts)
+        broadcast = {
+            'id': broadcast_id,
+            'event_id': event_id,
+            'status': 'running',  # running, done, cancelled
+            'cursor': 0,  # ID последнего обработанного пользователя
+            'sent': 0,
+            'failed': 0,
+            'blocked': 0,
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+        broadcasts[str(broadcast_id)] = broadcast
+        self._save_json(self.broadcasts_file, broadcasts)
+        return broadcast
+    
+    def get_broadcast(self, broadcast_id: int) -> Optional[dict]:
+        """Получить рассылку по ID"""
+        broadcast = self._read_json(self.broadcasts_file).get(str(broadcast_id))
+        return broadcast.copy() if broadcast is not None else None
+    
+    def get_unfinished_broadcasts(self) -> List[dict]:
+        """Рассылки, прерванные остановкой бота (продолжаются при запуске)"""
+        return [b.copy() for b in self._read_json(self.broadcasts_file).values() if b['status'] == 'running']
+    
+    @transactional
+    def save_broadcast_progress(self, broadcast_id: int, cursor: int, sent: int, failed: int,
+                                blocked: List[int], status: str = 'running') -> dict:
+        """
+        Записать продвижение рассылки после пачки: курсор, счетчики отправленных/неудачных
+        и пометку заблокировавших бота пользователей неактивными - в одной транзакции.
+        status done или cancelled завершает рассылку - при запуске она не продолжается
+        """
+        broadcasts = self._load_json(self.broadcasts_file)
+        broadcast = broadcasts.get(str(broadcast_id))
+        if broadcast is None:
+            raise ValueError("Рассылка не найдена")
+        
+        broadcast['cursor'] = cursor
+        broadcast['sent'] += sent
+        broadcast['failed'] += failed
+        broadcast['blocked'] += len(blocked)
+        if status != 'running':
+            broadcast['status'] = status
+            broadcast['finished_at'] = datetime.now().isoformat()
+        
+        self._save_json(self.broadcasts_file, broadcasts)
+        if blocked:
+            self.set_users_active(blocked, False)
+        return broadcast
+    
+    # ========== АРХИВ ==========
+    
+    def _load_archive_index(self) -> dict:
+        """Загрузка индекса архива: событие -> месяц сегмента, последние ID и счетчики"""
+        index = self._load_json(self.archive_index_file)
+        index.setdefault('events', {})
+        index.setdefault('segments', [])
+        index.setdefault('last_ids', {'events': 0, 'bets': 0})
+        index.setdefault('totals', {'events': 0, 'bets': 0, 'won_bets': 0})
+        return index
+    
+    def _get_archive_last_id(self, collection: str) -> int:
+        """Последний ID, ушедший в архив (чтобы новые ID не пересекались с архивными)"""
+        if not os.path.exists(self.archive_index_file):
+            return 0
+        return self._read_json(self.archive_index_file).get('last_ids', {}).get(collection, 0)
+    
+    def _archive_segment_path(self, month: str) -> str:
+        """Путь к сжатому сегменту архива за месяц (YYYY-MM)"""
+        return os.path.join(self.archive_dir, f"{month}.json.gz")
+    
+    def _load_archive_segment(self, month: str, cache: bool = True) -> dict:
+        """
+        Загрузка сегмента архива (с кешированием в памяти, пока файл не изменили извне).
+        cache=False - для разовых проходов по всему архиву: сегмент не остается в памяти.
+        """
+        path = self._archive_segment_path(month)
+        signature = file_signature(path)
+        cached = self._archive_segments.get(month)
+        if cached is None or (cached[0] != signature and not self._is_own_version(path, signature)):
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    segment = json.load(f)
+            except FileNotFoundError:
+                segment = {}
+            except (OSError, EOFError, ValueError) as e:
+                logger.error(f"Сегмент архива поврежден: {path}: {e}")
+                raise StorageError(f"Сегмент архива поврежден: {path}") from e
+            segment.setdefault('events', {})
+            segment.setdefault('bets', {})
+            cached = (signature, segment)
+            if cache:
+                self._archive_segments[month] = cached
+        return cached[1]
+    
+    def _save_archive_segment(self, month: str, segment: dict):
+        """Сохранение сегмента архива в сжатом компактном виде"""
+        raw = json.dumps(segment, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._write_file(self._archive_segment_path(month), gzip.compress(raw))
+        self._archive_segments[month] = (None, segment)
+    
+    @staticmethod
+    def _next_month_start(month: str) -> str:
+        """Начало следующего месяца в ISO формате (для сравнения с created_at)"""
+        year, mon = int(month[:4]), int(month[5:7])
+        if mon == 12:
+            year, mon = year + 1, 1
+        else:
+            mon += 1
+        return f"{year:04d}-{mon:02d}-01T00:00:00"
+    
+    def _get_archived_event(self, event_id: int) -> Optional[dict]:
+        """Найти событие в архиве по индексу"""
+        if not os.path.exists(self.archive_index_file):
+            return None
+        month = self._read_json(self.archive_index_file).get('events', {}).get(str(event_id))
+        if not month:
+            return None
+        return self._load_archive_segment(month)['events'].get(str(event_id))
+    
+    def _get_archived_user_bets(self, telegram_id: int, limit: int, user_bets: List[dict]) -> List[dict]:
+        """Догрузить ставки пользователя из архива, начиная с самых свежих сегментов"""
+        if not os.path.exists(self.archive_index_file):
+            return user_bets
+        
+        result = list(user_bets)
+        for month in sorted(self._read_json(self.archive_index_file).get('segments', []), reverse=True):
+            # Все ставки сегмента сделаны до конца его месяца: если уже набрали limit
+            # ставок новее этой границы, более старые сегменты можно не читать
+            if len(result) >= limit and result[limit - 1].get('created_at', '') >= self._next_month_start(month):
+                break
+            
+            segment = self._load_archive_segment(month)
+            result.extend(bet.copy() for bet in segment['bets'].values() if bet.get('telegram_id') == telegram_id)
+            result.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        
+        return result
+    
+    @transactional
+    def archive_closed_events(self, older_than_days: int = 30) -> dict:
+        """Перенести закрытые более N дней назад события и их ставки в архив"""
+        events = self._load_json(self.events_file)
+        threshold = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        
+        # Группируем события для архивации по месяцу закрытия
+        by_month: Dict[str, dict] = {}
+        for event_key, event in events.items():
+            closed_at = event.get('closed_at')
+            if event.get('is_active') or not closed_at or closed_at >= threshold:
+                continue
+            # Событие с незавершенным расчетом остается до его завершения
+            if event.get('settlement') in ('closing', 'settling'):
+                continue
+            by_month.setdefault(closed_at[:7], {})[event_key] = event
+        
+        stats = {'events': 0, 'bets': 0, 'segments': sorted(by_month)}
+        if not by_month:
+            return stats
+        
+        os.makedirs(self.archive_dir, exist_ok=True)
+        index = self._load_archive_index()
+        
+        # Раскладываем ставки по событиям за один проход по каждому шарду
+        event_month = {event_key: month for month, month_events in by_month.items() for event_key in month_events}
+        bets_by_month: Dict[str, dict] = {}
+        shard_bets = {bets_file: self._load_json(bets_file) for bets_file in self.bets_files}
+        archived_bets = {bets_file: [] for bets_file in self.bets_files}
+        for bets_file, bets in shard_bets.items():
+            for bet_key, bet in bets.items():
+                month = event_month.get(str(bet.get('event_id')))
+                if month:
+                    bets_by_month.setdefault(month, {})[bet_key] = bet
+                    archived_bets[bets_file].append(bet_key)
+        
+        for month, month_events in by_month.items():
+            month_bets = bets_by_month.get(month, {})
+            segment = self._load_archive_segment(month)
+            segment['events'].update(month_events)
+            segment['bets'].update(month_bets)
+            self._save_archive_segment(month, segment)
+            
+            for event_key in month_events:
+                index['events'][event_key] = month
+            if month not in index['segments']:
+                index['segments'].append(month)
+            
+            index['totals']['events'] += len(month_events)
+            index['totals']['bets'] += len(month_bets)
+            index['totals']['won_bets'] += len([b for b in month_bets.values() if b.get('is_won') is True])
+            stats['events'] += len(month_events)
+            stats['bets'] += len(month_bets)
+        
+        index['segments'].sort()
+        index['last_ids']['events'] = max([index['last_ids']['events']] + [int(k) for k in events])
+        index['last_ids']['bets'] = max([index['last_ids']['bets']] + [int(k) for bets in shard_bets.values() for k in bets])
+        
+        # Сначала сохраняем архив и индекс, затем убираем данные из рабочих файлов
+        self._save_json(self.archive_index_file, index)
+        
+        for month_events in by_month.values():
+            for event_key in month_events:
+                del events[event_key]
+        self._save_json(self.events_file, events)
+        
+        # Переписываются все шарды, не только потерявшие ставки: файл вбирает ставки
+        # журнала шарда, и журнал очищается - в нем не остается ставок до архивации
+        for bets_file, bet_keys in archived_bets.items():
+            bets = shard_bets[bets_file]
+            for bet_key in bet_keys:
+                del bets[bet_key]
+            self._save_json(bets_file, bets)
+        return stats
+    
+    def get_archive_totals(self) -> dict:
+        """Счетчики заархивированных событий и ставок (для статистики)"""
+        if not os.path.exists(self.archive_index_file):
+            return {'events': 0, 'bets': 0, 'won_bets': 0}
+        return self._load_archive_index()['totals']
+    
+    # ========== ВЫГРУЗКА ==========
+    
+    def export_rows(self, kind: str, event_id: int = None, date_from: str = None, date_to: str = None) -> Iterator[dict]:
+        """
+        Записи для выгрузки по одной: bets, events, users или ledger (архив, затем рабочие файлы).
+        Фильтры: событие и диапазон [date_from, date_to) по дате создания (для журнала - по дате движения).
+        Архивные сегменты читаются по одному и в кеше не остаются.
+        """
+        if kind == 'bets':
+            rows, stamp = self._export_bets(event_id, date_from), 'created_at'
+        elif kind == 'events':
+            rows, stamp = self._export_events(event_id, date_from), 'created_at'
+        elif kind == 'users':
+            if event_id is not None:
+                raise ValueError("Фильтр по событию не применяется к пользователям")
+            rows, stamp = self._export_users(), 'created_at'
+        elif kind == 'ledger':
+            rows, stamp = self._export_ledger(event_id), 'at'
+        else:
+            raise ValueError(f"Неизвестный вид выгрузки: {kind} (доступны: bets, events, users, ledger)")
+        
+        for row in rows:
+            value = row.get(stamp) or ''
+            if (date_from and value < date_from) or (date_to and value >= date_to):
+                continue
+            yield row
+    
+    def _export_months(self, event_id: Optional[int], date_from: Optional[str]) -> List[str]:
+        """Сегменты архива, которые нужно прочитать для выгрузки"""
+        if not os.path.exists(self.archive_index_file):
+            return []
+        index = self._read_json(self.archive_index_file)
+        if event_id is not None:
+            month = index.get('events', {}).get(str(event_id))
+            months = [month] if month else []
+        else:
+            months = sorted(index.get('segments', []))
+        # Все записи сегмента созданы до начала следующего за ним месяца
+        return [month for month in months if not date_from or self._next_month_start(month) > date_from]
+    
+    def _export_bets(self, event_id: Optional[int], date_from: Optional[str]) -> Iterator[dict]:
+        for month in self._export_months(event_id, date_from):
+            for bet in self._load_archive_segment(month, cache=False)['bets'].values():
+                if event_id is None or bet.get('event_id') == event_id:
+                    yield bet
+        
+        for bets_file in self.bets_files:
+            store = self._get_bet_store(bets_file)
+            yield from store.iter_bets(store.event_rows(event_id) if event_id is not None else None)
+    
+    def _export_events(self, event_id: Optional[int], date_from: Optional[str]) -> Iterator[dict]:
+        for month in self._export_months(event_id, date_from):
+            for event_key, event in self._load_archive_segment(month, cache=False)['events'].items():
+                if event_id is None or event_key == str(event_id):
+                    yield event
+        
+        for event_key, event in self._read_json(self.events_file).items():
+            if event_id is None or event_key == str(event_id):
+                yield event.copy()
+    
+    def _export_users(self) -> Iterator[dict]:
+        self.ledger.refresh()
+        for users_file in self.users_files:
+            for user_data in self._read_json(users_file).values():
+                user = user_data.copy()
+                balance = self.ledger.balances.get(user_account(user.get('telegram_id')))
+                if balance is not None:
+                    user['balance'] = balance
+                yield user
+    
+    def _export_ledger(self, event_id: Optional[int]) -> Iterator[dict]:
+        if event_id is None:
+            yield from self.ledger.entries()
+            return
+        
+        # Движения по событию: выплаты по нему (целиком или по частям расчета) и списания по его ставкам
+        refs = {f"event:{event_id}"} | {f"bet:{bet['id']}" for bet in self._export_bets(event_id, None)}
+        prefix = f"event:{event_id}:"
+        for entry in self.ledger.entries():
+            ref = entry.get('ref') or ''
+            if ref in refs or ref.startswith(prefix):
+                yield entry
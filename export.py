@@ -0,0 +1,67 @@
+"""
+Потоковая выгрузка данных в CSV/JSONL частями (временные файлы, а не строки в памяти)
+"""
+
+import csv
+import io
+import json
+import tempfile
+from typing import Iterable, Iterator, Tuple
+
+# Колонки CSV по видам выгрузки (в JSONL записи выгружаются целиком)
+EXPORT_FIELDS = {
+    'bets': ['id', 'user_id', 'telegram_id', 'event_id', 'amount', 'option', 'odds', 'created_at', 'is_won'],
+    'events': ['id', 'title', 'description', 'option1', 'option2', 'odds1', 'odds2', 'image_url',
+               'image_file_id', 'is_active', 'created_at', 'closed_at', 'result'],
+    'users': ['id', 'telegram_id', 'username', 'first_name', 'balance', 'created_at'],
+    'ledger': ['seq', 'at', 'kind', 'debit', 'credit', 'amount', 'ref'],
+}
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Сколько выгрузки держать в памяти, прежде чем временный файл уйдет на диск
+SPOOL_SIZE = 1024 * 1024
+
+
+def export_parts(rows: Iterable[dict], kind: str, fmt: str, part_size: int) -> Iterator[Tuple[tempfile.SpooledTemporaryFile, int]]:
+    """
+    Записать строки во временные файлы частями примерно по part_size байт.
+    Отдает (файл, количество строк) - файл открыт на начале, закрывает его получатель.
+    Каждая часть CSV начинается с заголовка.
+    """
+    fields = EXPORT_FIELDS[kind]
+    part = None
+    for row in rows:
+        if part is None:
+            part, text, writer, count = _start_part(fmt, fields)
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            text.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+        count += 1
+
+        if part.tell() >= part_size:
+            yield _finish_part(part, text), count
+            part = None
+
+    if part is not None:
+        yield _finish_part(part, text), count
+
+
+def _start_part(fmt: str, fields: list):
+    part = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+b')
+    # utf-8-sig - чтобы Excel открывал CSV с кириллицей без выбора кодировки;
+    # write_through - чтобы tell() файла учитывал все записанное
+    text = io.TextIOWrapper(part, encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='', write_through=True)
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(text, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+    return part, text, writer, 0
+
+
+def _finish_part(part, text: io.TextIOWrapper):
+    text.flush()
+    text.detach()  # файл остается открытым для отправки
+    part.seek(0)
+    return part
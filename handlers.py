@@ -31,9 +31,13 @@ class CallbackHandler:
         self.prefix_handlers: Dict[str, Callable] = {
             "odds_": self._handle_odds_selection,
             "custom_odds_": self._handle_custom_odds,
+            "proposals_page_": self._handle_proposals_page,
             "proposal_": self._handle_proposal_action,
             "event_": self._handle_event_details,
             "bet_": self._handle_make_bet,
+            "top_": self._handle_leaderboard,
+            "broadcast_event_": self._handle_broadcast,
+            "job_cancel_": self._handle_job_cancel,
         }
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
@@ -62,6 +66,10 @@ class CallbackHandler:
         proposal_id = int(callback_data.split("_")[2])
         await self.bot.start_custom_odds_input(update, context, proposal_id)
     
+    async def _handle_proposals_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
+        """Листание очереди предложений"""
+        await self.bot.show_proposals_inline(update, context, int(callback_data[len("proposals_page_"):]))
+    
     async def _handle_proposal_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
         """Обработка действий с предложениями"""
         await self.bot.handle_proposal_action(update, context, callback_data)
@@ -73,6 +81,18 @@ class CallbackHandler:
     async def _handle_make_bet(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
         """Обработка создания ставки"""
         await self.bot.make_bet(update, context, callback_data)
+    
+    async def _handle_broadcast(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
+        """Запуск рассылки анонса события"""
+        await self.bot.start_event_broadcast(update, context, int(callback_data[len("broadcast_event_"):]))
+    
+    async def _handle_job_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
+        """Отмена фоновой задачи"""
+        await self.bot.cancel_job(update, context, int(callback_data[len("job_cancel_"):]))
+    
+    async def _handle_leaderboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
+        """Переключение рейтинга (top_balance / top_profit)"""
+        await self.bot.show_leaderboard_inline(update, context, callback_data[len("top_"):])
 
 
 class TextHandler:
@@ -87,6 +107,7 @@ class TextHandler:
             "💰 Баланс": self.bot.balance,
             "🎯 Мои ставки": self.bot.my_bets,
             "💡 Предложить событие": self.bot.start_proposal_creation,
+            "🏆 Рейтинг": self.bot.show_leaderboard,
             "ℹ️ Помощь": self.bot.help_command,
             "👑 Админ панель": self.bot.admin_menu_handler,
             "🆕 Создать событие": self.bot.start_event_creation,
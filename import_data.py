@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Массовый импорт в хранилище бота-тотализатора из командной строки
+
+Примеры:
+    python import_data.py events events.csv
+    python import_data.py balances bonuses.jsonl --dry-run
+
+Файл: CSV с заголовком, JSON-массив объектов или JSONL.
+События: title, option1, option2, odds1, odds2 (по умолчанию 2.0), description, image_url.
+Балансы: telegram_id, amount (изменение баланса, может быть отрицательным).
+Импорт выполняется целиком или не выполняется вовсе: при ошибке хотя бы в одной строке ничего не записывается.
+Бот может работать одновременно только с PROCESS_LOCK=true.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from data_manager import DataManager
+from importer import IMPORT_KINDS, import_rows, parse_rows
+
+
+def main():
+    # config.py требует токен бота - здесь нужны только настройки хранилища
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Массовый импорт событий и изменений балансов")
+    parser.add_argument('kind', choices=list(IMPORT_KINDS), help="что импортировать")
+    parser.add_argument('file', help="CSV, JSON или JSONL")
+    parser.add_argument('--data-dir', default=os.getenv("DATA_DIR", "data"))
+    parser.add_argument('--dry-run', action='store_true', help="только проверить файл, ничего не записывая")
+    args = parser.parse_args()
+
+    try:
+        with open(args.file, 'rb') as f:
+            rows = parse_rows(f.read(), args.file)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    data_manager = DataManager(
+        args.data_dir,
+        storage_format=os.getenv("STORAGE_FORMAT", "json"),
+        process_lock=os.getenv("PROCESS_LOCK", "false").lower() in ("1", "true", "yes"),
+        shards=int(os.getenv("STORAGE_SHARDS", "1")),
+        ledger_snapshot_every=int(os.getenv("LEDGER_SNAPSHOT_EVERY", "1000")),
+    )
+    try:
+        ref = f"import:{os.path.basename(args.file)}:{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        report = import_rows(data_manager, args.kind, rows, dry_run=args.dry_run, ref=ref)
+    finally:
+        data_manager.close()
+
+    if report['errors']:
+        for number, error in report['errors']:
+            print(f"❌ Строка {number}: {error}")
+        print(f"❌ Ошибок: {len(report['errors'])} из {report['total']} строк, ничего не импортировано")
+        sys.exit(1)
+
+    if args.dry_run:
+        print(f"✅ Проверено строк: {report['total']}, ошибок нет")
+    else:
+        print(f"✅ Импортировано строк: {report['imported']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Массовый импорт событий и изменений балансов из CSV/JSON/JSONL
+"""
+
+import csv
+import io
+import json
+import math
+import os
+from typing import Dict, List, Tuple
+
+# Виды импорта и поля строк
+IMPORT_KINDS = {
+    'events': ['title', 'option1', 'option2', 'odds1', 'odds2', 'description', 'image_url'],
+    'balances': ['telegram_id', 'amount'],
+}
+
+# Пределы коэффициентов - как при ручном вводе
+MIN_ODDS, MAX_ODDS = 0.1, 10.0
+
+
+def parse_rows(raw: bytes, filename: str = '') -> List[Tuple[int, dict]]:
+    """
+    Разобрать файл импорта: CSV с заголовком, JSON-массив объектов или JSONL.
+    Возвращает (номер строки в файле, запись); ошибка формата файла - ValueError.
+    """
+    try:
+        text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("Файл должен быть в кодировке UTF-8")
+
+    extension = os.path.splitext(filename)[1].lower()
+    stripped = text.lstrip()
+    if extension == '.json' or (extension != '.jsonl' and stripped.startswith('[')):
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Некорректный JSON: {e}")
+        if not isinstance(data, list):
+            raise ValueError("JSON должен быть массивом объектов")
+        return [(number, row) for number, row in enumerate(data, start=1)]
+
+    if extension == '.jsonl' or stripped.startswith('{'):
+        rows = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append((number, json.loads(line)))
+            except ValueError as e:
+                raise ValueError(f"Строка {number}: некорректный JSON: {e}")
+        return rows
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ValueError("Пустой файл")
+    # Номер строки файла: заголовок - строка 1
+    return [(reader.line_num, row) for row in reader]
+
+
+def _text(row: dict, field: str, required: bool = True):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise ValueError(f"не заполнено поле {field}")
+        return None
+    return value
+
+
+def _number(row: dict, field: str, default=None) -> float:
+    value = row.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if default is None:
+            raise ValueError(f"не заполнено поле {field}")
+        return default
+    try:
+        number = float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"{field}: ожидается число, получено {value!r}")
+    if not math.isfinite(number):
+        raise ValueError(f"{field}: ожидается число, получено {value!r}")
+    return number
+
+
+def validate_event(row: dict) -> dict:
+    """Поля события для DataManager.create_events; ошибка - ValueError с описанием"""
+    if not isinstance(row, dict):
+        raise ValueError("запись должна быть объектом")
+    event = {
+        'title': _text(row, 'title'),
+        'option1': _text(row, 'option1'),
+        'option2': _text(row, 'option2'),
+        'odds1': _number(row, 'odds1', 2.0),
+        'odds2': _number(row, 'odds2', 2.0),
+        'description': _text(row, 'description', required=False),
+        'image_url': _text(row, 'image_url', required=False),
+    }
+    for field in ('odds1', 'odds2'):
+        if not MIN_ODDS <= event[field] <= MAX_ODDS:
+            raise ValueError(f"{field}: коэффициент должен быть от {MIN_ODDS} до {MAX_ODDS}")
+    if event['image_url'] and not event['image_url'].startswith(('http://', 'https://')):
+        raise ValueError("image_url должен начинаться с http:// или https://")
+    return event
+
+
+def validate_balance(row: dict) -> Tuple[int, float]:
+    """(telegram_id, изменение баланса); ошибка - ValueError с описанием"""
+    if not isinstance(row, dict):
+        raise ValueError("запись должна быть объектом")
+    telegram_id = _number(row, 'telegram_id')
+    if telegram_id != int(telegram_id):
+        raise ValueError(f"telegram_id должен быть целым числом: {row.get('telegram_id')!r}")
+    amount = _number(row, 'amount')
+    if amount == 0:
+        raise ValueError("amount не может быть нулевым")
+    return int(telegram_id), amount
+
+
+def import_rows(data_manager, kind: str, rows: List[Tuple[int, dict]], dry_run: bool = False, ref: str = None) -> dict:
+    """
+    Проверить все строки и, если ошибок нет, записать их в одной транзакции хранилища.
+    При любой ошибке не записывается ничего - файл можно исправить и загрузить повторно без дублей.
+    Возвращает {'kind', 'total', 'imported', 'errors': [(номер строки, текст)]}.
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Неизвестный вид импорта: {kind} (доступны: {', '.join(IMPORT_KINDS)})")
+
+    report = {'kind': kind, 'total': len(rows), 'imported': 0, 'errors': []}
+    with data_manager.transaction():
+        if kind == 'events':
+            valid = []
+            for number, row in rows:
+                try:
+                    valid.append(validate_event(row))
+                except ValueError as e:
+                    report['errors'].append((number, str(e)))
+            if not report['errors'] and not dry_run:
+                report['imported'] = len(data_manager.create_events(valid))
+        else:
+            amounts: Dict[int, float] = {}
+            balances: Dict[int, float] = {}
+            for number, row in rows:
+                try:
+                    telegram_id, amount = validate_balance(row)
+                    if telegram_id not in balances:
+                        user = data_manager.get_user(telegram_id)
+                        if not user:
+                            raise ValueError(f"пользователь {telegram_id} не найден")
+                        balances[telegram_id] = user['balance']
+                    if balances[telegram_id] + amount < 0:
+                        raise ValueError(f"баланс пользователя {telegram_id} станет отрицательным")
+                    balances[telegram_id] += amount
+                    amounts[telegram_id] = amounts.get(telegram_id, 0.0) + amount
+                except ValueError as e:
+                    report['errors'].append((number, str(e)))
+            if not report['errors'] and not dry_run:
+                data_manager.add_balances(amounts, kind='adjust', ref=ref)
+                report['imported'] = len(rows)
+    return report
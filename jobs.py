@@ -0,0 +1,232 @@
+"""
+Фоновые задачи админа (расчет события, рассылка, выгрузка): статус-сообщение с прогрессом,
+отмена кнопкой, повтор после сбоя
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    Задача в работе. state - результаты пройденных шагов: работа сохраняет их сюда,
+    и повтор после сбоя продолжает с того шага, на котором сбой случился
+    """
+
+    def __init__(self, supervisor: 'JobSupervisor', job_id: int, title: str, chat_id: int,
+                 key: Optional[Hashable] = None):
+        self.supervisor = supervisor
+        self.id = job_id
+        self.title = title
+        self.chat_id = chat_id
+        self.key = key
+        self.status = 'running'  # running, done, failed, cancelled, stopped
+        self.attempt = 0
+        self.state: dict = {}
+        self.text = ''
+        self.message_id: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_requested = False
+        self._uninterruptible = 0
+        self._edited_at = 0.0
+
+    async def report(self, text: str, force: bool = False):
+        """Прогресс в статус-сообщение (не чаще интервала супервизора, force - сразу)"""
+        self.text = text
+        await self.supervisor.progress(self, force)
+
+    async def in_thread(self, func: Callable, *args):
+        """
+        Выполнить шаг в отдельном потоке. Поток отменой не остановить, поэтому при отмене
+        (в том числе при остановке бота) задача сначала дожидается конца шага
+        """
+        step = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        try:
+            return await asyncio.shield(step)
+        except asyncio.CancelledError:
+            await asyncio.wait({step})
+            raise
+
+    @contextmanager
+    def uninterruptible(self):
+        """
+        Шаги, которые админ не может прервать (например, выплаты по событию): отмена, нажатая
+        во время них, выполняется после. Остановка бота прерывает и их
+        """
+        self._uninterruptible += 1
+        try:
+            yield
+        finally:
+            self._uninterruptible -= 1
+            if not self._uninterruptible and self.cancel_requested and self.task is not None:
+                self.task.cancel()
+
+
+class JobSupervisor:
+    """
+    Запуск долгих операций админа в фоне. Админ сразу получает статус-сообщение с номером
+    задачи и кнопкой отмены; работа пишет в него прогресс (правки не чаще progress_interval
+    секунд - лимит Telegram на правки). Исключение работы - повтор через retry_delay,
+    2*retry_delay, ... секунд, всего retries повторов; ValueError - ошибка в данных,
+    она не повторяется. Итог (текст, который вернула работа, или ошибка) заменяет статус.
+    """
+
+    def __init__(self, bot, retries: int = 2, retry_delay: float = 5, progress_interval: float = 3):
+        self.bot = bot
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.progress_interval = progress_interval
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self.metrics = {'started': 0, 'done': 0, 'failed': 0, 'cancelled': 0, 'retries': 0}
+
+    def active(self) -> List[Job]:
+        """Задачи в работе, по номерам"""
+        return list(self._jobs.values())
+
+    def find(self, key: Hashable) -> Optional[Job]:
+        """Задача в работе с ключом key"""
+        return next((job for job in self._jobs.values() if job.key == key), None)
+
+    async def start(self, title: str, work: Callable[[Job], Awaitable[Optional[str]]], chat_id: int,
+                    retries: Optional[int] = None, on_cancel: Optional[Callable[[Job], None]] = None,
+                    key: Optional[Hashable] = None) -> Job:
+        """
+        Запустить work(job) в фоне; on_cancel(job) вызывается после отмены админом
+        (но не при остановке бота). key - задачи с одним ключом не выполняются одновременно:
+        пока такая задача в работе, возвращается она. Статус-сообщение уже отправлено
+        """
+        running = self.find(key) if key is not None else None
+        if running is not None:
+            return running
+        # Задача регистрируется до первого await: одновременный запуск с тем же ключом
+        # (обработчики идут параллельно) уже найдет ее
+        job = Job(self, next(self._ids), title, chat_id, key)
+        self._jobs[job.id] = job
+        self.metrics['started'] += 1
+        try:
+            message = await self.bot.send_message(
+                chat_id=chat_id, text=self._render(job, "⏳ Запущена"), reply_markup=self._cancel_markup(job)
+            )
+            job.message_id = message.message_id
+        except asyncio.CancelledError:
+            self._jobs.pop(job.id, None)
+            raise
+        except Exception as e:
+            # Без статус-сообщения задача все равно выполняется
+            logger.error(f"Ошибка при отправке статуса задачи #{job.id}: {e}")
+
+        if job.status == 'stopped':
+            # Бот остановился, пока отправлялось статус-сообщение
+            self._jobs.pop(job.id, None)
+            return job
+        job.task = asyncio.get_running_loop().create_task(
+            self._run(job, work, self.retries if retries is None else retries, on_cancel)
+        )
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """Отменить задачу по кнопке; False - такой задачи в работе нет"""
+        job = self._jobs.get(job_id)
+        if job is None or job.cancel_requested:
+            return job is not None
+        job.cancel_requested = True
+        # Без task задача еще запускается: _run увидит cancel_requested до начала работы
+        if not job._uninterruptible and job.task is not None:
+            job.task.cancel()
+        return True
+
+    async def stop(self):
+        """Остановка бота: прервать задачи (рассылки продолжатся при запуске со своего курсора)"""
+        jobs = self.active()
+        for job in jobs:
+            job.status = 'stopped'
+            if job.task is not None:
+                job.task.cancel()
+        await asyncio.gather(*(job.task for job in jobs if job.task is not None), return_exceptions=True)
+
+    async def progress(self, job: Job, force: bool = False):
+        now = time.monotonic()
+        if not force and now - job._edited_at < self.progress_interval:
+            return
+        job._edited_at = now
+        await self._edit(job, self._render(job, f"⏳ Выполняется\n{job.text}"), self._cancel_markup(job))
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Optional[str]]], retries: int,
+                   on_cancel: Optional[Callable[[Job], None]]):
+        try:
+            if job.cancel_requested:
+                raise asyncio.CancelledError
+            while True:
+                job.attempt += 1
+                try:
+                    result = await work(job)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка в задаче #{job.id} ({job.title}), попытка {job.attempt}: {e}")
+                    if isinstance(e, ValueError) or job.attempt > retries:
+                        job.status = 'failed'
+                        self.metrics['failed'] += 1
+                        await self._edit(job, self._render(job, f"❌ Ошибка: {e}\n{job.text}"))
+                        return
+
+                    self.metrics['retries'] += 1
+                    delay = self.retry_delay * 2 ** (job.attempt - 1)
+                    await self._edit(
+                        job,
+                        self._render(job, f"⚠️ Ошибка: {e}\n🔁 Повтор через {delay:.0f} с "
+                                          f"(попытка {job.attempt + 1} из {retries + 1})\n{job.text}"),
+                        self._cancel_markup(job)
+                    )
+                    await asyncio.sleep(delay)
+
+            job.status = 'done'
+            self.metrics['done'] += 1
+            await self._edit(job, self._render(job, result or f"✅ Готово\n{job.text}"))
+
+        except asyncio.CancelledError:
+            if job.status == 'stopped':
+                await self._edit(job, self._render(job, f"⏸ Прервана остановкой бота\n{job.text}"))
+                return
+            job.status = 'cancelled'
+            self.metrics['cancelled'] += 1
+            if on_cancel is not None:
+                try:
+                    on_cancel(job)
+                except Exception as e:
+                    logger.error(f"Ошибка при отмене задачи #{job.id}: {e}")
+            await self._edit(job, self._render(job, f"🛑 Отменена\n{job.text}"))
+        finally:
+            self._jobs.pop(job.id, None)
+
+    async def _edit(self, job: Job, text: str, reply_markup=None):
+        """Правка статус-сообщения; ее сбой на задачу не влияет"""
+        if job.message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                chat_id=job.chat_id, message_id=job.message_id, text=text, reply_markup=reply_markup
+            )
+        except Exception as e:
+            if 'not modified' not in str(e).lower():
+                logger.error(f"Ошибка при обновлении статуса задачи #{job.id}: {e}")
+
+    @staticmethod
+    def _render(job: Job, body: str) -> str:
+        return f"🧰 Задача #{job.id}: {job.title}\n{body}".rstrip()
+
+    @staticmethod
+    def _cancel_markup(job: Job) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([[
+            InlineKeyboardButton("🛑 Отменить", callback_data=f"job_cancel_{job.id}")
+        ]])
@@ -0,0 +1,265 @@
+"""
+Журнал движений балансов: только дописывание (JSON Lines), двойная запись, снимки
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from storage import StorageError
+
+logger = logging.getLogger(__name__)
+
+# Размер порции чтения журнала с диска
+READ_CHUNK = 1024 * 1024
+
+# Системные счета: касса тотализатора (ставки и выигрыши) и эмиссия (стартовые балансы, пополнения)
+HOUSE = 'house'
+ISSUE = 'issue'
+
+# Вид движения -> встречный счет
+KINDS = {
+    'opening': ISSUE,   # баланс, существовавший до появления журнала
+    'grant': ISSUE,     # стартовый баланс нового пользователя
+    'top_up': ISSUE,    # пополнение администратором
+    'adjust': ISSUE,    # прямая установка баланса
+    'bet': HOUSE,       # ставка
+    'payout': HOUSE,    # выигрыш
+}
+
+
+def user_account(telegram_id: int) -> str:
+    """Счет пользователя в журнале"""
+    return f"user:{telegram_id}"
+
+
+class Ledger:
+    """
+    Каждое движение - строка журнала с двумя счетами: сумма списывается со счета debit
+    и зачисляется на счет credit, поэтому сумма балансов всех счетов всегда равна нулю.
+
+    Балансы держатся в памяти: снимок (балансы на смещение в файле) + движения после него.
+    Там же - чистый результат пользователей (выигрыши минус ставки) для рейтинга
+    и ссылки выплат по частям (чтобы не выплатить часть дважды, не читая журнал целиком).
+    Запись движения - одно дописывание в конец файла; fsync выполняет sync()
+    (один раз на транзакцию, а не на каждое движение).
+    """
+
+    def __init__(self, path: str, on_change: Optional[Callable[[Set[str]], None]] = None):
+        self.path = path
+        self.balances: Dict[str, float] = {}
+        self.profits: Dict[str, float] = {}
+        self.payouts: Dict[str, Set[str]] = {}  # event:ID -> ссылки выплат event:ID:N по частям
+        self.on_change = on_change      # вызывается со счетами, изменившимися после записи или дочитывания
+        self.seq = 0                    # номер последнего движения
+        self.since_snapshot = 0         # движений после последнего снимка
+        self._offset = 0                # сколько байт файла уже учтено в балансах
+        self._changed: Set[str] = set()  # счета, изменившиеся после последнего снимка
+        self._unsynced = False
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+
+    @property
+    def exists(self) -> bool:
+        """В журнале есть хотя бы одно движение"""
+        return self.seq > 0
+
+    # ---------- загрузка ----------
+
+    def load(self, snapshot: Optional[dict] = None):
+        """Восстановить балансы: снимок + движения после него (недописанный хвост после сбоя отрезается)"""
+        with self._lock:
+            self.balances, self.profits, self.payouts, self.seq, self._offset = {}, {}, {}, 0, 0
+            size = os.fstat(self._fd).st_size
+            if snapshot and snapshot.get('offset', 0) <= size and 'profits' in snapshot and 'payouts' in snapshot:
+                self.balances = dict(snapshot.get('balances', {}))
+                self.profits = dict(snapshot['profits'])
+                self.payouts = {group: set(refs) for group, refs in snapshot['payouts'].items()}
+                self.seq = snapshot.get('seq', 0)
+                self._offset = snapshot.get('offset', 0)
+            elif snapshot:
+                logger.warning(f"Снимок журнала устарел или новее файла {self.path} - балансы пересчитываются с начала")
+
+            self.since_snapshot = self._replay()
+            self._changed = set()
+
+            size = os.fstat(self._fd).st_size
+            if size > self._offset:
+                logger.warning(f"Недописанная запись в конце {self.path} ({size - self._offset} байт) удалена")
+                os.ftruncate(self._fd, self._offset)
+
+    def refresh(self):
+        """Учесть движения, дописанные другими процессами"""
+        with self._lock:
+            size = os.fstat(self._fd).st_size
+            if size > self._offset:
+                self.since_snapshot += self._replay()
+
+    def _replay(self) -> int:
+        """Применить к балансам полные строки файла после учтенного смещения"""
+        count = 0
+        changed = set()
+        for entry, end in self._read_from(self._offset):
+            self._apply_entry(entry, changed)
+            self.seq = entry['seq']
+            self._offset = end
+            count += 1
+        self._notify(changed)
+        return count
+
+    def _apply_entry(self, entry: dict, changed: Set[str]):
+        """Учесть движение в балансах и чистых результатах"""
+        self.apply(self.balances, entry)
+        if entry['kind'] == 'bet':
+            self.profits[entry['debit']] = self.profits.get(entry['debit'], 0.0) - entry['amount']
+        elif entry['kind'] == 'payout':
+            self.profits[entry['credit']] = self.profits.get(entry['credit'], 0.0) + entry['amount']
+            # Выплата по части: ссылка вида группа:номер, где группа сама составная (event:ID)
+            group = (entry.get('ref') or '').rpartition(':')[0]
+            if ':' in group:
+                self.payouts.setdefault(group, set()).add(entry['ref'])
+        changed.update((entry['debit'], entry['credit']))
+        self._changed.update((entry['debit'], entry['credit']))
+
+    @contextmanager
+    def frozen(self):
+        """Балансы не меняются, пока выполняется блок (записи и дочитывание ждут)"""
+        with self._lock:
+            yield
+
+    def _notify(self, changed: Set[str]):
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+
+    def _read_from(self, offset: int) -> Iterator[Tuple[dict, int]]:
+        """Полные строки журнала начиная со смещения: (движение, смещение конца строки); читается частями"""
+        size = os.fstat(self._fd).st_size
+        position = offset
+        tail = b''
+        while position < size:
+            chunk = os.pread(self._fd, min(READ_CHUNK, size - position), position)
+            if not chunk:
+                break
+            position += len(chunk)
+            data = tail + chunk
+            end = data.rfind(b'\n') + 1
+            tail = data[end:]
+            line_end = position - len(data)
+            for line in data[:end].splitlines(keepends=True):
+                line_end += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    logger.error(f"Журнал балансов поврежден: {self.path} (смещение {line_end - len(line)}): {e}")
+                    raise StorageError(f"Журнал балансов поврежден: {self.path}") from e
+                yield entry, line_end
+
+    def entries(self) -> Iterator[dict]:
+        """Все движения журнала с начала файла"""
+        for entry, _ in self._read_from(0):
+            yield entry
+
+    def payout_refs(self, group: str) -> Set[str]:
+        """Ссылки выплат по частям группы (event:ID -> {event:ID:0, ...}) - без чтения журнала"""
+        with self._lock:
+            return set(self.payouts.get(group, ()))
+
+    @staticmethod
+    def apply(balances: Dict[str, float], entry: dict):
+        """Применить движение к балансам счетов"""
+        amount = entry['amount']
+        balances[entry['debit']] = balances.get(entry['debit'], 0.0) - amount
+        balances[entry['credit']] = balances.get(entry['credit'], 0.0) + amount
+
+    # ---------- запись ----------
+
+    def balance(self, telegram_id: int) -> Optional[float]:
+        """Текущий баланс пользователя или None, если счета в журнале нет"""
+        self.refresh()
+        return self.balances.get(user_account(telegram_id))
+
+    def record(self, movements: Iterable[Tuple[int, float, str, Optional[str]]]) -> List[dict]:
+        """
+        Записать движения одной дозаписью: (telegram_id, изменение баланса, вид, ссылка).
+        Нулевые изменения пропускаются.
+        """
+        with self._lock:
+            size = os.fstat(self._fd).st_size
+            if size > self._offset:
+                self.since_snapshot += self._replay()
+
+            at = datetime.now().isoformat()
+            entries = []
+            for telegram_id, amount, kind, ref in movements:
+                if not amount:
+                    continue
+                counter = KINDS[kind]
+                account = user_account(telegram_id)
+                debit, credit = (counter, account) if amount > 0 else (account, counter)
+                entries.append({
+                    'seq': self.seq + len(entries) + 1,
+                    'at': at,
+                    'kind': kind,
+                    'debit': debit,
+                    'credit': credit,
+                    'amount': abs(float(amount)),
+                    'ref': ref,
+                })
+            if not entries:
+                return entries
+
+            raw = ''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in entries)
+            raw = raw.encode('utf-8')
+            written = os.write(self._fd, raw)
+            if written != len(raw):
+                raise StorageError(f"Журнал балансов записан не полностью: {self.path}")
+
+            changed = set()
+            for entry in entries:
+                self._apply_entry(entry, changed)
+            self._notify(changed)
+            self.seq = entries[-1]['seq']
+            self._offset += written
+            self.since_snapshot += len(entries)
+            self._unsynced = True
+            return entries
+
+    def sync(self):
+        """Сбросить дописанные движения на диск"""
+        if self._unsynced:
+            self._unsynced = False
+            os.fsync(self._fd)
+
+    # ---------- снимки ----------
+
+    def snapshot(self) -> Tuple[dict, Dict[int, float]]:
+        """
+        Снимок балансов на текущее смещение и балансы пользователей,
+        изменившиеся после предыдущего снимка (telegram_id -> баланс)
+        """
+        with self._lock:
+            snapshot = {
+                'seq': self.seq,
+                'offset': self._offset,
+                'balances': dict(self.balances),
+                'profits': dict(self.profits),
+                'payouts': {group: sorted(refs) for group, refs in self.payouts.items()},
+            }
+            changed = {
+                int(account[5:]): self.balances[account]
+                for account in self._changed if account.startswith('user:')
+            }
+            self._changed = set()
+            self.since_snapshot = 0
+            return snapshot, changed
+
+    def close(self):
+        """Закрыть файл журнала"""
+        if self._fd is not None:
+            self.sync()
+            os.close(self._fd)
+            self._fd = None
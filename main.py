@@ -1,9 +1,23 @@
+import asyncio
+import html
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+import os
+import time
+from datetime import datetime, timedelta
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from bot_requests import make_request, resolve_http_version
+from broadcast import Broadcaster, RateLimiter, deliver
 from data_manager import DataManager
+from export import EXPORT_FIELDS, EXPORT_FORMATS, export_parts
+from importer import IMPORT_KINDS, import_rows, parse_rows
+from jobs import Job, JobSupervisor
+from navigator import Navigator
+from persistence import StatePersistence
+from single_flight import AsyncSingleFlight
+from throttle import Throttle
 import config
-from messages import ADMIN_MESSAGES, USER_MESSAGES, ERROR_MESSAGES, SUCCESS_MESSAGES, NOTIFICATION_MESSAGES, CREATION_MESSAGES
+from messages import ADMIN_MESSAGES, USER_MESSAGES, ERROR_MESSAGES, SUCCESS_MESSAGES, NOTIFICATION_MESSAGES, CREATION_MESSAGES, LEADERBOARD_MEDALS
 from handlers import CallbackHandler, TextHandler
 
 # Настройка логирования
@@ -13,24 +27,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Предложений на одной странице очереди у админа
+PROPOSALS_PAGE_SIZE = 10
+
 class TotalizerBot:
     def __init__(self):
-        self.application = Application.builder().token(config.BOT_TOKEN).build()
-        self.data_manager = DataManager(config.DATA_DIR)
+        # Время этапов запуска в секундах (отчет о запуске в run.py)
+        self.startup_profile = {}
+        started = time.perf_counter()
+        
+        # Состояние диалогов (незавершенные ставки, создание событий) переживает перезапуск
+        self.persistence = StatePersistence(
+            os.path.join(config.DATA_DIR, "state.json"),
+            update_interval=config.STATE_UPDATE_INTERVAL
+        )
+        # Ответы пользователям и фоновые отправки (рассылки, уведомления о результатах) идут
+        # через разные пулы соединений: массовая отправка не занимает соединения обработчиков
+        request_settings = dict(
+            http_version=resolve_http_version(config.TELEGRAM_HTTP2),
+            keepalive_idle=config.TELEGRAM_KEEPALIVE,
+            connect_timeout=config.TELEGRAM_CONNECT_TIMEOUT,
+            read_timeout=config.TELEGRAM_READ_TIMEOUT,
+            write_timeout=config.TELEGRAM_WRITE_TIMEOUT,
+            pool_timeout=config.TELEGRAM_POOL_TIMEOUT
+        )
+        self.application = (
+            Application.builder()
+            .token(config.BOT_TOKEN)
+            .request(make_request(config.TELEGRAM_POOL_SIZE, **request_settings))
+            .persistence(self.persistence)
+            .concurrent_updates(config.CONCURRENT_UPDATES)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+        self.background_bot = Bot(
+            config.BOT_TOKEN, request=make_request(config.TELEGRAM_BACKGROUND_POOL_SIZE, **request_settings)
+        )
+        # Общий лимит скорости фоновых отправок (лимит Telegram - на бота целиком)
+        self.background_limiter = RateLimiter(config.BROADCAST_RATE)
+        self.startup_profile['application'] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        self.data_manager = DataManager(
+            config.DATA_DIR,
+            storage_format=config.STORAGE_FORMAT,
+            group_commit_ms=config.GROUP_COMMIT_MS,
+            write_mode=config.WRITE_MODE,
+            flush_interval_ms=config.FLUSH_INTERVAL_MS,
+            flush_max_dirty=config.FLUSH_MAX_DIRTY,
+            process_lock=config.PROCESS_LOCK,
+            shards=config.STORAGE_SHARDS,
+            ledger_snapshot_every=config.LEDGER_SNAPSHOT_EVERY,
+            settlement_chunk=config.SETTLEMENT_CHUNK
+        )
+        self.startup_profile['storage'] = time.perf_counter() - started
         self.config = config
         
+        # Рассылка анонсов событий всем пользователям (в фоне, с ограничением скорости)
+        self.broadcaster = Broadcaster(
+            self.data_manager, self.background_limiter, config.BROADCAST_CHUNK, config.TELEGRAM_BACKGROUND_POOL_SIZE
+        )
+        
+        # Долгие операции админа (расчет события, рассылка, выгрузка) - фоновыми задачами
+        self.jobs = JobSupervisor(
+            self.application.bot, config.JOB_RETRIES, config.JOB_RETRY_DELAY, config.JOB_PROGRESS_INTERVAL
+        )
+        
+        # Ограничение частоты запросов от одного пользователя (админ не ограничивается)
+        self.throttle = Throttle(config.THROTTLE_RATE, config.THROTTLE_BURST, config.THROTTLE_IDLE_SECONDS)
+        
+        # Переходы между экранами в сообщениях с кнопками - самой дешевой операцией API
+        self.navigator = Navigator()
+        
+        # Одинаковые одновременные чтения (список событий, карточка события) выполняются один раз
+        self.reads = AsyncSingleFlight()
+        
         # Инициализируем обработчики
+        started = time.perf_counter()
         self.callback_handler = CallbackHandler(self)
         self.text_handler = TextHandler(self)
         
         self.setup_handlers()
+        self.startup_profile['handlers'] = time.perf_counter() - started
     
     def get_main_menu(self, is_admin: bool = False):
         """Создание главного меню"""
         keyboard = [
             [KeyboardButton("🎲 События"), KeyboardButton("💰 Баланс")],
             [KeyboardButton("🎯 Мои ставки"), KeyboardButton("💡 Предложить событие")],
-            [KeyboardButton("ℹ️ Помощь")]
+            [KeyboardButton("🏆 Рейтинг"), KeyboardButton("ℹ️ Помощь")]
         ]
         
         if is_admin:
@@ -83,11 +170,17 @@ class TotalizerBot:
             "balance": self.balance,
             "events": self.show_events,
             "mybets": self.my_bets,
+            "top": self.show_leaderboard,
             # Админские команды
             "admin": self.admin_panel,
             "create_event": self.create_event,
             "close_event": self.close_event,
             "add_balance": self.add_balance,
+            "archive": self.archive_events,
+            "reconcile": self.reconcile_ledger,
+            "export": self.export_data,
+            "import": self.import_data,
+            "jobs": self.show_jobs,
         }
         
         # Регистрируем все команды
@@ -99,6 +192,7 @@ class TotalizerBot:
             (CallbackQueryHandler, self.button_callback),
             (MessageHandler, self.handle_text, filters.TEXT & ~filters.COMMAND),
             (MessageHandler, self.handle_photo, filters.PHOTO),
+            (MessageHandler, self.handle_document, filters.Document.ALL),
         ]
         
         # Регистрируем специальные обработчики
@@ -125,6 +219,9 @@ class TotalizerBot:
                     username=user.username,
                     first_name=user.first_name
                 )
+            elif db_user.get('is_active') is False:
+                # Пользователь снова запустил бота после блокировки - рассылки снова приходят
+                self.data_manager.set_users_active([user.id], True)
             
             # Используем сообщение из файла messages.py
             welcome_text = USER_MESSAGES['start']
@@ -182,10 +279,18 @@ class TotalizerBot:
             logger.error(f"Ошибка в balance: {e}")
             await update.message.reply_text("❌ Ошибка при получении баланса")
 
+    async def shared_read(self, key: tuple, read, *args):
+        """
+        Чтение из хранилища в отдельном потоке; одновременные запросы с тем же ключом (при
+        CONCURRENT_UPDATES > 1 сотни пользователей открывают новое событие разом) получают
+        результат одного чтения. Результат общий - менять его нельзя
+        """
+        return await self.reads.do(key, lambda: asyncio.to_thread(read, *args))
+
     async def show_events(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /events - показать активные события"""
         try:
-            events = self.data_manager.get_active_events()
+            events = await self.shared_read(('active_events',), self.data_manager.get_active_events)
             
             if not events:
                 await update.message.reply_text("📭 Нет активных событий для ставок")
@@ -327,8 +432,17 @@ class TotalizerBot:
                 event_id=event['id']
             )
             
-            if event.get('image_file_id') or event.get('image_url'):
-                success_text += f"\n🖼️ Картинка прикреплена"
+            if event.get('image_url'):
+                # Картинка загружается в Telegram сразу: админ видит, что она открывается,
+                # а пользователи получат ее по file_id
+                try:
+                    preview = await update.message.reply_photo(photo=event['image_url'], caption="🖼️ Картинка события")
+                    self.remember_event_photo(event, preview)
+                except Exception as e:
+                    logger.error(f"Ошибка при загрузке картинки события: {e}")
+                    success_text += "\n⚠️ Картинка по ссылке не загружается"
+                else:
+                    success_text += "\n🖼️ Картинка прикреплена"
             
             await update.message.reply_text(success_text, parse_mode='Markdown')
             
@@ -360,30 +474,22 @@ class TotalizerBot:
                 await update.message.reply_text("❌ Событие не найдено")
                 return
             
-            if not event['is_active']:
+            # Событие с прерванным расчетом можно закрыть повторно - расчет продолжится
+            unfinished = event.get('settlement') in ('closing', 'settling')
+            if not event['is_active'] and not unfinished:
                 await update.message.reply_text("❌ Событие уже закрыто")
                 return
+            if unfinished and event['result'] != result:
+                await update.message.reply_text(f"❌ Событие уже рассчитывается с результатом {event['result']}")
+                return
             
-            # Закрываем событие
-            self.data_manager.close_event(event_id, result)
-            
-            # Подводим итоги ставок
-            stats = self.data_manager.process_event_results(event_id, result)
-            
-            # Уведомляем всех игроков о результатах их ставок
-            await self.notify_players_about_results(event, result)
-            
-            winning_option = event['option1'] if result == 1 else event['option2']
-            
-            result_text = SUCCESS_MESSAGES['event_closed_simple'].format(
-                title=event['title'],
-                winning_option=winning_option,
-                total_bets=stats['total_bets'],
-                winners=stats['winners'],
-                total_payouts=stats['total_payouts']
-            )
+            running = self.jobs.find(('settlement', event_id))
+            if running is not None:
+                await update.message.reply_text(f"⏳ Расчет события уже идет (задача #{running.id})")
+                return
             
-            await update.message.reply_text(result_text, parse_mode='Markdown')
+            # Расчет и уведомления - в фоне: админ сразу получает статус задачи
+            await self.start_settlement_job(event, result, update.effective_chat.id)
             
         except ValueError:
             await update.message.reply_text("❌ ID события и результат должны быть числами")
@@ -391,6 +497,50 @@ class TotalizerBot:
             logger.error(f"Ошибка при закрытии события: {e}")
             await update.message.reply_text("❌ Ошибка при закрытии события")
 
+    async def start_settlement_job(self, event: dict, result: int, chat_id: int):
+        """Расчет события фоновой задачей (одна задача на событие)"""
+        await self.jobs.start(
+            f"расчет события «{event['title']}»",
+            lambda job: self.settle_event_job(job, event, result),
+            chat_id,
+            key=('settlement', event['id'])
+        )
+
+    async def settle_event_job(self, job: Job, event: dict, result: int) -> str:
+        """
+        Задача расчета события: закрытие, выплаты частями (каждая часть - своя транзакция),
+        затем уведомления игроков. Повтор после сбоя продолжает расчет с того же места
+        """
+        if 'stats' not in job.state:
+            await job.report("💰 Начисление выплат...", force=True)
+            # Выплаты админ не прерывает: отмена во время них остановит только уведомления.
+            # Остановка бота прерывает расчет между частями - при запуске он продолжится
+            with job.uninterruptible():
+                if not await job.in_thread(self.data_manager.close_event, event['id'], result):
+                    raise ValueError("Событие не найдено")
+                plan = await job.in_thread(self.data_manager.start_settlement, event['id'])
+                done = 0
+                for number in range(len(plan['chunks'])):
+                    done += await job.in_thread(self.data_manager.settle_chunk, plan, number)
+                    await job.report(SUCCESS_MESSAGES['settlement_progress'].format(done=done, total=plan['total']))
+                job.state['stats'] = await job.in_thread(self.data_manager.finish_settlement, event['id'])
+        stats = job.state['stats']
+        settled = SUCCESS_MESSAGES['settlement_paid'].format(**stats)
+        
+        async def progress(done: int, total: int):
+            await job.report(f"{settled}\n📬 Уведомлено игроков: {done} из {total}")
+        
+        await job.report(settled, force=True)
+        notified = await self.notify_players_about_results(event, result, progress)
+        
+        return SUCCESS_MESSAGES['event_closed_simple'].format(
+            title=event['title'],
+            winning_option=event['option1'] if result == 1 else event['option2'],
+            notified=notified['sent'],
+            players=notified['players'],
+            **stats
+        )
+
     async def add_balance(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Добавление баланса пользователю"""
         if not await self.check_admin_access(update, "❌ У вас нет прав для изменения баланса"):
@@ -431,25 +581,231 @@ class TotalizerBot:
             logger.error(f"Ошибка при изменении баланса: {e}")
             await update.message.reply_text("❌ Ошибка при изменении баланса")
 
-    async def safe_edit_message(self, update: Update, text: str, parse_mode: str = 'HTML', reply_markup=None):
-        """Безопасное редактирование сообщения (с фото или без)"""
+    async def archive_events(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Перенос давно закрытых событий и их ставок в архив"""
+        if not await self.check_admin_access(update, "❌ У вас нет прав для архивации"):
+            return
+        
         try:
-            # Проверяем, есть ли фото в сообщении
-            if update.callback_query.message.photo:
-                # Если есть фото, удаляем сообщение и отправляем новое
-                await update.callback_query.delete_message()
-                await update.callback_query.message.reply_text(
-                    text, 
-                    parse_mode=parse_mode, 
-                    reply_markup=reply_markup
-                )
+            days = int(context.args[0]) if context.args else config.ARCHIVE_AFTER_DAYS
+            if days < 0:
+                await update.message.reply_text("❌ Количество дней не может быть отрицательным")
+                return
+            
+            stats = self.data_manager.archive_closed_events(days)
+            
+            result_text = SUCCESS_MESSAGES['archive_done'].format(
+                days=days,
+                events=stats['events'],
+                bets=stats['bets'],
+                segments=', '.join(stats['segments']) or 'нет'
+            )
+            
+            await update.message.reply_text(result_text, parse_mode='Markdown')
+            
+        except ValueError:
+            await update.message.reply_text("❌ Формат: /archive [количество дней]")
+        except Exception as e:
+            logger.error(f"Ошибка при архивации: {e}")
+            await update.message.reply_text("❌ Ошибка при архивации")
+
+    async def reconcile_ledger(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Сверка журнала балансов с файлами пользователей и ставок"""
+        if not await self.check_admin_access(update, "❌ У вас нет прав для сверки балансов"):
+            return
+        
+        try:
+            report = self.data_manager.reconcile_ledger()
+            
+            def sample(items: list) -> str:
+                return ', '.join(str(item) for item in items[:10]) + (' …' if len(items) > 10 else '') or 'нет'
+            
+            template = SUCCESS_MESSAGES['reconcile_ok'] if report['ok'] else ERROR_MESSAGES['reconcile_failed']
+            result_text = template.format(
+                entries=report['entries'],
+                accounts=report['accounts'],
+                imbalance=report['imbalance'],
+                mismatched=sample(report['mismatched']),
+                users_without_account=sample(report['users_without_account']),
+                accounts_without_user=sample(report['accounts_without_user']),
+                stale_users=sample(report['stale_users']),
+                bets_without_debit=sample(report['bets_without_debit']),
+                debits_without_bet=sample(report['debits_without_bet'])
+            )
+            
+            await update.message.reply_text(result_text)
+            
+        except Exception as e:
+            logger.error(f"Ошибка при сверке балансов: {e}")
+            await update.message.reply_text("❌ Ошибка при сверке балансов")
+
+    @staticmethod
+    def parse_export_args(args: list) -> dict:
+        """Разбор аргументов /export: вид, формат и фильтры event=ID, from=ДАТА, to=ДАТА"""
+        if not args or args[0] not in EXPORT_FIELDS:
+            raise ValueError("❌ Укажите, что выгрузить: bets, events, users или ledger")
+        
+        options = {'kind': args[0], 'fmt': 'csv', 'event_id': None, 'date_from': None, 'date_to': None}
+        for arg in args[1:]:
+            key, _, value = arg.partition('=')
+            if not value and key in EXPORT_FORMATS:
+                options['fmt'] = key
+            elif key == 'event':
+                try:
+                    options['event_id'] = int(value)
+                except ValueError:
+                    raise ValueError(f"❌ Неверный ID события: {value}")
+            elif key in ('from', 'to'):
+                try:
+                    day = datetime.strptime(value, '%Y-%m-%d')
+                except ValueError:
+                    raise ValueError(f"❌ Неверная дата: {value} (нужно ГГГГ-ММ-ДД)")
+                if key == 'from':
+                    options['date_from'] = day.isoformat()
+                else:
+                    # Граница "по" включает весь указанный день
+                    options['date_to'] = (day + timedelta(days=1)).isoformat()
             else:
-                # Если нет фото, редактируем существующее сообщение
-                await update.callback_query.edit_message_text(
-                    text, 
-                    parse_mode=parse_mode, 
-                    reply_markup=reply_markup
-                )
+                raise ValueError(f"❌ Непонятный параметр: {arg}")
+        return options
+
+    async def export_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Выгрузка данных документом (фоновой задачей)"""
+        if not await self.check_admin_access(update, "❌ У вас нет прав для выгрузки данных"):
+            return
+        
+        try:
+            options = self.parse_export_args(context.args or [])
+        except ValueError as e:
+            await update.message.reply_text(str(e))
+            await update.message.reply_text(ADMIN_MESSAGES['export_help'], parse_mode='Markdown')
+            return
+        
+        # Выгрузка больших данных - в фоне: админ сразу получает статус задачи
+        await self.jobs.start(
+            f"выгрузка {options['kind']} ({options['fmt']})",
+            lambda job: self.export_job(job, update.effective_chat.id, options),
+            update.effective_chat.id
+        )
+
+    async def export_job(self, job: Job, chat_id: int, options: dict) -> str:
+        """Задача выгрузки: строки пишутся во временный файл и отправляются частями"""
+        kind, fmt = options['kind'], options['fmt']
+        # При повторе после сбоя уже отправленные части не отправляются снова
+        sent_parts = job.state.setdefault('parts', 0)
+        stamp = job.state.setdefault('stamp', datetime.now().strftime('%Y%m%d_%H%M%S'))
+        
+        rows = self.data_manager.export_rows(
+            kind, event_id=options['event_id'], date_from=options['date_from'], date_to=options['date_to']
+        )
+        parts = export_parts(rows, kind, fmt, int(config.EXPORT_PART_MB * 1024 * 1024))
+        total_rows = 0
+        number = 0
+        
+        while True:
+            # Чтение данных и запись файла - в отдельном потоке, чтобы не останавливать бота
+            part = await asyncio.to_thread(next, parts, None)
+            if part is None:
+                break
+            
+            file, count = part
+            number += 1
+            total_rows += count
+            with file:
+                if number > sent_parts:
+                    await self.application.bot.send_document(
+                        chat_id=chat_id,
+                        document=file,
+                        filename=f"{kind}_{stamp}_{number}.{fmt}",
+                        caption=f"📤 {kind}, часть {number}: {count} строк"
+                    )
+                    job.state['parts'] = number
+            await job.report(f"📤 Отправлено частей: {number}, строк: {total_rows}")
+        
+        return SUCCESS_MESSAGES['export_done'].format(kind=kind, fmt=fmt, rows=total_rows, parts=number)
+
+    async def show_jobs(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Фоновые задачи в работе, с кнопками отмены"""
+        if not await self.check_admin_access(update):
+            return
+        
+        jobs = self.jobs.active()
+        if not jobs:
+            await update.message.reply_text("📭 Нет задач в работе")
+            return
+        
+        lines = [f"#{job.id}: {job.title}" + (f"\n{job.text}" if job.text else "") for job in jobs]
+        keyboard = [[InlineKeyboardButton(f"🛑 Отменить #{job.id}", callback_data=f"job_cancel_{job.id}")] for job in jobs]
+        await update.message.reply_text(
+            "🧰 Задачи в работе:\n\n" + "\n\n".join(lines), reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    async def cancel_job(self, update: Update, context: ContextTypes.DEFAULT_TYPE, job_id: int):
+        """Отмена фоновой задачи кнопкой (итог задача пишет в свое статус-сообщение)"""
+        if not await self.check_admin_access(update, "❌ Нет доступа"):
+            return
+        
+        if not self.jobs.cancel(job_id):
+            await update.callback_query.message.reply_text(f"ℹ️ Задача #{job_id} уже завершена")
+
+    async def import_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Начало загрузки: запоминаем вид данных и ждем файл документом"""
+        if not await self.check_admin_access(update, "❌ У вас нет прав для загрузки данных"):
+            return
+        
+        kind = context.args[0] if context.args else None
+        if kind not in IMPORT_KINDS:
+            await update.message.reply_text(ADMIN_MESSAGES['import_help'], parse_mode='Markdown')
+            return
+        
+        context.user_data['import_kind'] = kind
+        await update.message.reply_text(ADMIN_MESSAGES['import_waiting'].format(kind=kind))
+
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка документов: файл загрузки после /import"""
+        user = update.effective_user
+        kind = context.user_data.get('import_kind')
+        
+        if not self.is_admin(user.id) or not kind:
+            await update.message.reply_text("📎 Я пока не знаю, что делать с этим файлом.")
+            return
+        
+        context.user_data.pop('import_kind', None)
+        document = update.message.document
+        try:
+            file = await document.get_file()
+            raw = bytes(await file.download_as_bytearray())
+            rows = parse_rows(raw, document.file_name or '')
+            ref = f"import:{update.message.message_id}"
+            # Проверка и запись тысяч строк - в отдельном потоке, чтобы не останавливать бота
+            report = await asyncio.to_thread(import_rows, self.data_manager, kind, rows, False, ref)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке {kind}: {e}")
+            await update.message.reply_text("❌ Ошибка при загрузке данных")
+            return
+        
+        if report['errors']:
+            shown = report['errors'][:20]
+            errors = "\n".join(f"• Строка {number}: {error}" for number, error in shown)
+            if len(report['errors']) > len(shown):
+                errors += f"\n… и еще {len(report['errors']) - len(shown)}"
+            await update.message.reply_text(ERROR_MESSAGES['import_failed'].format(
+                kind=kind, count=len(report['errors']), total=report['total'], errors=errors
+            ))
+            return
+        
+        await update.message.reply_text(SUCCESS_MESSAGES['import_done'].format(kind=kind, imported=report['imported']))
+        if kind == 'events':
+            # Картинки по ссылкам загружаются в Telegram заранее, а не при первом показе
+            self.application.create_task(self.preupload_event_photos())
+
+    async def safe_edit_message(self, update: Update, text: str, parse_mode: str = 'HTML', reply_markup=None):
+        """Безопасное редактирование сообщения (с фото или без): навигатор выбирает операцию"""
+        try:
+            await self.navigator.show(update.callback_query, text, parse_mode=parse_mode, reply_markup=reply_markup)
         except Exception as e:
             logger.error(f"Ошибка в safe_edit_message: {e}")
             try:
@@ -463,18 +819,87 @@ class TotalizerBot:
                 # Последний резерв - просто ответ на callback
                 await update.callback_query.answer(text)
 
+    async def throttled(self, update: Update) -> bool:
+        """
+        Антифлуд: True, если запрос сверх лимита пользователя и отброшен. О серии отброшенных
+        запросов пользователь узнает один раз; на нажатие кнопки отвечаем всегда, чтобы пропали часики
+        """
+        user = update.effective_user
+        if user is None or user.id == self.config.ADMIN_ID or self.throttle.allow(user.id):
+            return False
+        
+        warn = self.throttle.should_warn(user.id)
+        if warn:
+            logger.info(f"Антифлуд: запросы пользователя {user.id} отбрасываются")
+        if update.callback_query:
+            await update.callback_query.answer(ERROR_MESSAGES['throttled'] if warn else None)
+        elif warn and update.message:
+            await update.message.reply_text(ERROR_MESSAGES['throttled'])
+        return True
+
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка нажатий на inline кнопки"""
         query = update.callback_query
+        if await self.throttled(update):
+            return
         await query.answer()
         
         # Делегируем обработку новому CallbackHandler
         await self.callback_handler.handle_callback(update, context, query.data)
 
+    def build_leaderboard(self, user_id: int, by: str):
+        """Текст рейтинга (первые места и место пользователя) и кнопки переключения"""
+        unit = "{value:.0f}" if by == 'balance' else "{value:+.0f}"
+        lines = []
+        for leader in self.data_manager.get_leaderboard(by, 10):
+            name = leader['first_name'] or (f"@{leader['username']}" if leader['username'] else f"Игрок {leader['telegram_id']}")
+            lines.append(USER_MESSAGES['leaderboard_item'].format(
+                place=LEADERBOARD_MEDALS.get(leader['rank'], f"{leader['rank']}."),
+                name=html.escape(name),
+                value=unit.format(value=leader['value'])
+            ))
+        
+        position = self.data_manager.get_user_rank(user_id, by)
+        your_rank = USER_MESSAGES['leaderboard_your_rank'].format(
+            rank=position['rank'],
+            total=position['total'],
+            value=unit.format(value=position['value'])
+        ) if position else ""
+        
+        text = USER_MESSAGES['leaderboard'].format(
+            title="по балансу" if by == 'balance' else "по выигрышу (выигрыши минус ставки)",
+            leaders='\n'.join(lines) or "Пока никого нет",
+            your_rank=your_rank
+        )
+        keyboard = [[
+            InlineKeyboardButton("💰 По балансу", callback_data="top_balance"),
+            InlineKeyboardButton("📈 По выигрышу", callback_data="top_profit")
+        ]]
+        return text, InlineKeyboardMarkup(keyboard)
+
+    async def show_leaderboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /top [profit] - рейтинг игроков"""
+        try:
+            by = 'profit' if context.args and context.args[0].lower() in ('profit', 'выигрыш') else 'balance'
+            text, reply_markup = self.build_leaderboard(update.effective_user.id, by)
+            await update.message.reply_text(text, parse_mode='HTML', reply_markup=reply_markup)
+        except Exception as e:
+            logger.error(f"Ошибка в show_leaderboard: {e}")
+            await update.message.reply_text("❌ Ошибка при загрузке рейтинга")
+
+    async def show_leaderboard_inline(self, update: Update, context: ContextTypes.DEFAULT_TYPE, by: str):
+        """Переключение рейтинга кнопками"""
+        try:
+            text, reply_markup = self.build_leaderboard(update.effective_user.id, by)
+            await self.safe_edit_message(update, text, parse_mode='HTML', reply_markup=reply_markup)
+        except Exception as e:
+            logger.error(f"Ошибка в show_leaderboard_inline: {e}")
+            await self.safe_edit_message(update, "❌ Ошибка при загрузке рейтинга")
+
     async def show_events_inline(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать события в inline режиме"""
         try:
-            events = self.data_manager.get_active_events()
+            events = await self.shared_read(('active_events',), self.data_manager.get_active_events)
             
             if not events:
                 await self.safe_edit_message(update, "📭 Нет активных событий для ставок")
@@ -502,15 +927,14 @@ class TotalizerBot:
         """Показать детали события"""
         try:
             event_id = int(callback_data.split("_")[1])
-            event = self.data_manager.get_event(event_id)
+            view = await self.shared_read(('event', event_id), self.data_manager.get_event_view, event_id)
+            event = view['event'] if view else None
             
             if not event or not event['is_active']:
                 await self.safe_edit_message(update, "❌ Событие не найдено или неактивно")
                 return
             
-            # Считаем общую сумму ставок
-            event_bets = self.data_manager.get_event_bets(event_id)
-            total_bets = len(event_bets)
+            total_bets = view['total_bets']
             
             event_text = CREATION_MESSAGES['event_details'].format(
                 title=event['title'],
@@ -530,20 +954,15 @@ class TotalizerBot:
             
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            # Если есть картинка, отправляем её отдельно
+            # Если есть картинка, показываем событие с ней
             if event.get('image_file_id') or event.get('image_url'):
                 try:
-                    # Приоритет у file_id, потом URL
+                    # Приоритет у file_id, потом URL (по URL - один раз, дальше по сохраненному file_id)
                     photo = event.get('image_file_id') or event.get('image_url')
-                    
-                    await update.callback_query.message.reply_photo(
-                        photo=photo,
-                        caption=event_text,
-                        parse_mode='HTML',
-                        reply_markup=reply_markup
+                    sent = await self.navigator.show(
+                        update.callback_query, event_text, parse_mode='HTML', reply_markup=reply_markup, photo=photo
                     )
-                    # Удаляем предыдущее сообщение
-                    await update.callback_query.delete_message()
+                    self.remember_event_photo(event, sent)
                 except Exception as e:
                     logger.error(f"Ошибка при отправке картинки: {e}")
                     # Если картинка не загрузилась, показываем без неё
@@ -565,6 +984,43 @@ class TotalizerBot:
             logger.error(f"Ошибка в show_event_details: {e}")
             await self.safe_edit_message(update, "❌ Ошибка при загрузке события")
 
+    def remember_event_photo(self, event: dict, message):
+        """Картинка события ушла по URL - сохраняем file_id из ответа Telegram для следующих показов"""
+        if event.get('image_file_id') or not event.get('image_url') or not getattr(message, 'photo', None):
+            return
+        try:
+            self.data_manager.set_event_image_file_id(event['id'], event['image_url'], message.photo[-1].file_id)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении file_id картинки события {event['id']}: {e}")
+
+    async def upload_event_photo(self, event: dict) -> dict:
+        """
+        Загрузить картинку события по URL заранее (в чат админа, сообщение сразу удаляется),
+        чтобы пользователи получали ее по file_id. Возвращает событие с file_id, если загрузилось
+        """
+        if event.get('image_file_id') or not event.get('image_url'):
+            return event
+        try:
+            message = await self.background_bot.send_photo(
+                chat_id=config.ADMIN_ID, photo=event['image_url'], disable_notification=True
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке картинки события {event['id']}: {e}")
+            return event
+        
+        self.remember_event_photo(event, message)
+        try:
+            await message.delete()
+        except Exception as e:
+            logger.error(f"Ошибка при удалении загрузочного сообщения: {e}")
+        return self.data_manager.get_event(event['id']) or event
+
+    async def preupload_event_photos(self):
+        """Фоновая загрузка картинок по URL для активных событий без file_id (после импорта событий)"""
+        for event in self.data_manager.get_active_events():
+            if event.get('image_url') and not event.get('image_file_id'):
+                await self.upload_event_photo(event)
+
     async def make_bet(self, update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str):
         """Начать процесс создания ставки"""
         try:
@@ -597,6 +1053,9 @@ class TotalizerBot:
         """Обработка текстовых сообщений"""
         text = update.message.text
         
+        if await self.throttled(update):
+            return
+        
         # Делегируем обработку новому TextHandler
         await self.text_handler.handle_text(update, context, text)
 
@@ -605,7 +1064,12 @@ class TotalizerBot:
         user = update.effective_user
         
         try:
-            amount = float(amount_text)
+            try:
+                amount = float(amount_text)
+            except ValueError:
+                await update.message.reply_text("❌ Введите корректную сумму (число)")
+                context.user_data.clear()
+                return
             
             if amount < 10:
                 await update.message.reply_text("❌ Минимальная сумма ставки: 10 монет")
@@ -614,58 +1078,30 @@ class TotalizerBot:
             event_id = context.user_data.get('betting_event_id')
             option = context.user_data.get('betting_option')
             
-            # Проверяем пользователя и его баланс
-            db_user = self.data_manager.get_user(user.id)
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            if db_user['balance'] < amount:
-                await update.message.reply_text(f"❌ Недостаточно средств. Ваш баланс: {db_user['balance']:.2f} монет")
-                return
-            
-            # Проверяем событие
-            event = self.data_manager.get_event(event_id)
-            if not event or not event['is_active']:
-                await update.message.reply_text("❌ Событие больше не активно")
-                return
-            
-            # Создаем ставку
-            odds = event['odds1'] if option == 1 else event['odds2']
-            option_text = event['option1'] if option == 1 else event['option2']
-            
-            bet = self.data_manager.create_bet(
-                telegram_id=user.id,
-                event_id=event_id,
-                amount=amount,
-                option=option,
-                odds=odds
-            )
+            # Проверка пользователя, события и баланса, запись ставки и списание - одна операция хранилища
+            placed = self.data_manager.place_bet(user.id, event_id, option, amount)
+            event, bet = placed['event'], placed['bet']
             
             # Очищаем временные данные
             context.user_data.clear()
             
-            # Получаем обновленный баланс
-            updated_user = self.data_manager.get_user(user.id)
-            potential_win = amount * odds
+            option_text = event['option1'] if option == 1 else event['option2']
+            potential_win = amount * bet['odds']
             
             success_text = SUCCESS_MESSAGES['bet_accepted'].format(
                 event_title=event['title'],
                 option_text=option_text,
                 amount=amount,
-                odds=odds,
+                odds=bet['odds'],
                 potential_win=potential_win,
-                new_balance=updated_user['balance']
+                new_balance=placed['balance']
             )
             
             await update.message.reply_text(success_text, parse_mode='Markdown')
             
         except ValueError as e:
-            if "Недостаточно средств" in str(e) or "Событие не активно" in str(e):
-                await update.message.reply_text(f"❌ {e}")
-            else:
-                await update.message.reply_text("❌ Введите корректную сумму (число)")
-            context.user_data.clear()
+            # Ставка не принята (нет средств, событие закрыто) - можно ввести другую сумму
+            await update.message.reply_text(f"❌ {e}")
         except Exception as e:
             logger.error(f"Ошибка при обработке ставки: {e}")
             await update.message.reply_text("❌ Ошибка при создании ставки")
@@ -855,6 +1291,14 @@ class TotalizerBot:
                 reply_markup=reply_markup
             )
             
+            # Рассылка анонса - по желанию админа
+            await update.message.reply_text(
+                ADMIN_MESSAGES['broadcast_offer'].format(title=event['title']),
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("📣 Разослать всем", callback_data=f"broadcast_event_{event['id']}")
+                ]])
+            )
+            
             # Очищаем данные
             context.user_data.clear()
             
@@ -965,22 +1409,23 @@ class TotalizerBot:
         
         try:
             # Загружаем данные
-            users = self.data_manager._load_json(self.data_manager.users_file)
+            users = self.data_manager.get_all_users()
             events = self.data_manager._load_json(self.data_manager.events_file)
-            bets = self.data_manager._load_json(self.data_manager.bets_file)
+            bets = self.data_manager.get_all_bets()
+            archived = self.data_manager.get_archive_totals()
             
-            # Считаем статистику
+            # Считаем статистику (с учетом архива)
             total_users = len(users)
-            total_events = len(events)
+            total_events = len(events) + archived['events']
             active_events = len([e for e in events.values() if e.get('is_active')])
-            total_bets = len(bets)
+            total_bets = len(bets) + archived['bets']
             
             # Считаем общий баланс и общую сумму ставок
-            total_balance = sum(user.get('balance', 0) for user in users.values())
-            total_bet_amount = sum(bet.get('amount', 0) for bet in bets.values())
+            total_balance = sum(user.get('balance', 0) for user in users)
+            total_bet_amount = sum(bet.get('amount', 0) for bet in bets)
             
             # Считаем выигрышные ставки
-            won_bets = len([b for b in bets.values() if b.get('is_won') is True])
+            won_bets = len([b for b in bets if b.get('is_won') is True]) + archived['won_bets']
             
             # Вычисляем процент выигрышей
             win_percentage = (won_bets/total_bets*100) if total_bets > 0 else 0
@@ -992,7 +1437,16 @@ class TotalizerBot:
                 active_events=active_events,
                 total_bets=total_bets,
                 won_bets=won_bets,
-                win_percentage=win_percentage
+                win_percentage=win_percentage,
+                pending_proposals=self.data_manager.count_proposals('pending'),
+                approved_proposals=self.data_manager.count_proposals('approved'),
+                rejected_proposals=self.data_manager.count_proposals('rejected'),
+                **{f"throttle_{key}": value for key, value in self.throttle.stats().items()},
+                **{f"reads_{key}": value for key, value in self.reads.metrics.items()},
+                jobs_active=len(self.jobs.active()),
+                **{f"jobs_{key}": value for key, value in self.jobs.metrics.items()},
+                navigations=self.navigator.navigations,
+                navigation_requests=self.navigator.stats()['per_navigation']
             )
             
             await update.message.reply_text(stats_text, parse_mode='Markdown')
@@ -1164,42 +1618,55 @@ class TotalizerBot:
         except Exception as e:
             logger.error(f"Ошибка при уведомлении админа: {e}")
 
+    def build_proposals_page(self, page: int):
+        """Текст страницы очереди предложений (старые первыми) и кнопки: предложения, листание, назад"""
+        total = self.data_manager.count_proposals('pending')
+        if not total:
+            return "📭 Нет ожидающих рассмотрения предложений", None
+        
+        pages = (total + PROPOSALS_PAGE_SIZE - 1) // PROPOSALS_PAGE_SIZE
+        page = min(max(page, 0), pages - 1)
+        proposals = self.data_manager.get_proposals_page('pending', page * PROPOSALS_PAGE_SIZE, PROPOSALS_PAGE_SIZE)
+        
+        proposals_text = f"📋 **Ожидающие рассмотрения предложения ({total}):**\n\n"
+        keyboard = []
+        
+        for proposal in proposals:
+            # Добавляем информацию о картинке
+            image_info = "🖼️" if proposal.get('image_file_id') else "📝"
+            proposals_text += f"**ID {proposal['id']}:** {proposal['title']} {image_info}\n"
+            proposals_text += f"👤 От: {proposal['first_name']}\n"
+            proposals_text += f"1️⃣ {proposal['option1']} | 2️⃣ {proposal['option2']}\n\n"
+            
+            keyboard.append([
+                InlineKeyboardButton(f"📋 Предложение {proposal['id']}", callback_data=f"proposal_view_{proposal['id']}")
+            ])
+        
+        if pages > 1:
+            proposals_text += f"Страница {page + 1} из {pages}"
+            navigation = []
+            if page > 0:
+                navigation.append(InlineKeyboardButton("⬅️", callback_data=f"proposals_page_{page - 1}"))
+            if page < pages - 1:
+                navigation.append(InlineKeyboardButton("➡️", callback_data=f"proposals_page_{page + 1}"))
+            keyboard.append(navigation)
+        
+        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_admin")])
+        return proposals_text, InlineKeyboardMarkup(keyboard)
+
     async def show_proposals_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать меню предложений для админа"""
         if not await self.check_admin_access(update, "❌ У вас нет доступа к предложениям"):
             return
         
         try:
-            pending_proposals = self.data_manager.get_pending_proposals()
+            context.user_data['proposals_page'] = 0
+            proposals_text, reply_markup = self.build_proposals_page(0)
             
-            if not pending_proposals:
-                await update.message.reply_text(
-                    "📭 Нет ожидающих рассмотрения предложений",
-                    reply_markup=self.get_admin_menu()
-                )
+            if reply_markup is None:
+                await update.message.reply_text(proposals_text, reply_markup=self.get_admin_menu())
                 return
             
-            proposals_text = "📋 **Ожидающие рассмотрения предложения:**\n\n"
-            keyboard = []
-            
-            for proposal in pending_proposals[:10]:  # Показываем первые 10
-                # Добавляем информацию о картинке
-                image_info = "🖼️" if proposal.get('image_file_id') else "📝"
-                proposals_text += f"**ID {proposal['id']}:** {proposal['title']} {image_info}\n"
-                proposals_text += f"👤 От: {proposal['first_name']}\n"
-                proposals_text += f"1️⃣ {proposal['option1']} | 2️⃣ {proposal['option2']}\n\n"
-                
-                keyboard.append([
-                    InlineKeyboardButton(f"📋 Предложение {proposal['id']}", callback_data=f"proposal_view_{proposal['id']}")
-                ])
-            
-            if len(pending_proposals) > 10:
-                proposals_text += f"... и еще {len(pending_proposals) - 10} предложений"
-            
-            keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_admin")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await update.message.reply_text(
                 proposals_text,
                 parse_mode='Markdown',
@@ -1210,44 +1677,26 @@ class TotalizerBot:
             logger.error(f"Ошибка в show_proposals_menu: {e}")
             await update.message.reply_text("❌ Ошибка при загрузке предложений")
 
-    async def show_proposals_inline(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Показать предложения в inline режиме"""
+    async def show_proposals_inline(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = None):
+        """Показать предложения в inline режиме (страница page; без нее - последняя открытая)"""
         if not await self.check_admin_access(update, "❌ У вас нет доступа к предложениям"):
             return
         
         try:
-            pending_proposals = self.data_manager.get_pending_proposals()
+            if page is None:
+                page = context.user_data.get('proposals_page', 0)
+            context.user_data['proposals_page'] = page
+            proposals_text, reply_markup = self.build_proposals_page(page)
             
-            if not pending_proposals:
+            if reply_markup is None:
                 await update.callback_query.edit_message_text(
-                    "📭 Нет ожидающих рассмотрения предложений",
+                    proposals_text,
                     reply_markup=InlineKeyboardMarkup([[
                         InlineKeyboardButton("🔙 Назад", callback_data="back_to_admin")
                     ]])
                 )
                 return
             
-            proposals_text = "📋 **Ожидающие рассмотрения предложения:**\n\n"
-            keyboard = []
-            
-            for proposal in pending_proposals[:10]:  # Показываем первые 10
-                # Добавляем информацию о картинке
-                image_info = "🖼️" if proposal.get('image_file_id') else "📝"
-                proposals_text += f"**ID {proposal['id']}:** {proposal['title']} {image_info}\n"
-                proposals_text += f"👤 От: {proposal['first_name']}\n"
-                proposals_text += f"1️⃣ {proposal['option1']} | 2️⃣ {proposal['option2']}\n\n"
-                
-                keyboard.append([
-                    InlineKeyboardButton(f"📋 Предложение {proposal['id']}", callback_data=f"proposal_view_{proposal['id']}")
-                ])
-            
-            if len(pending_proposals) > 10:
-                proposals_text += f"... и еще {len(pending_proposals) - 10} предложений"
-            
-            keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_admin")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await update.callback_query.edit_message_text(
                 proposals_text,
                 parse_mode='Markdown',
@@ -1390,9 +1839,10 @@ class TotalizerBot:
                 update,
                 success_text,
                 parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 К предложениям", callback_data="back_to_proposals")
-                ]])
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("📣 Разослать анонс всем", callback_data=f"broadcast_event_{result['event']['id']}")],
+                    [InlineKeyboardButton("🔙 К предложениям", callback_data="back_to_proposals")]
+                ])
             )
             
             # Очищаем контекст
@@ -1614,14 +2064,118 @@ class TotalizerBot:
         except Exception as e:
             logger.error(f"Ошибка при уведомлении пользователя об отклонении: {e}")
 
-    async def notify_players_about_results(self, event: dict, winning_option: int):
-        """Уведомить всех игроков о результатах их ставок"""
+    async def start_event_broadcast(self, update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
+        """Запуск рассылки анонса события всем пользователям (кнопка после создания события)"""
+        if not await self.check_admin_access(update, "❌ Нет доступа"):
+            return
+        
+        try:
+            event = self.data_manager.get_event(event_id)
+            if not event or not event['is_active']:
+                await update.callback_query.edit_message_text("❌ Событие не найдено или неактивно")
+                return
+            
+            try:
+                broadcast = self.data_manager.create_broadcast(event_id)
+            except ValueError as e:
+                await update.callback_query.edit_message_text(f"❌ {e}")
+                return
+            
+            await update.callback_query.edit_message_text(
+                ADMIN_MESSAGES['broadcast_started'].format(title=event['title'], rate=config.BROADCAST_RATE)
+            )
+            await self.start_broadcast_job(broadcast, event)
+            
+        except Exception as e:
+            logger.error(f"Ошибка при запуске рассылки: {e}")
+            await update.callback_query.edit_message_text("❌ Ошибка при запуске рассылки")
+
+    async def start_broadcast_job(self, broadcast: dict, event: dict):
+        """Рассылка анонса события фоновой задачей; отмена админом завершает рассылку"""
+        def on_cancel(job: Job):
+            # Курсор уже записан рассылкой при остановке - меняется только статус
+            cursor = self.data_manager.get_broadcast(broadcast['id'])['cursor']
+            self.data_manager.save_broadcast_progress(broadcast['id'], cursor, 0, 0, [], status='cancelled')
+        
+        await self.jobs.start(
+            f"рассылка анонса «{event['title']}»",
+            lambda job: self.broadcast_job(job, broadcast['id'], event),
+            config.ADMIN_ID,
+            on_cancel=on_cancel
+        )
+
+    async def broadcast_job(self, job: Job, broadcast_id: int, event: dict) -> str:
+        """Задача рассылки: продолжается с записанного курсора, в том числе при повторе после сбоя"""
+        # Картинка по URL загружается один раз до рассылки - получатели получат ее по file_id
+        event = await self.upload_event_photo(event)
+        
+        text = NOTIFICATION_MESSAGES['new_event'].format(
+            title=html.escape(event['title']),
+            description=f"{html.escape(event['description'])}\n" if event.get('description') else "",
+            option1=html.escape(event['option1']),
+            option2=html.escape(event['option2']),
+            odds1=event['odds1'],
+            odds2=event['odds2']
+        )
+        reply_markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🎯 Сделать ставку", callback_data=f"event_{event['id']}")
+        ]])
+        
+        async def send(telegram_id: int):
+            # Картинка - только загруженная в Telegram (file_id): по URL Telegram скачивал бы ее для каждого
+            # получателя (upload_event_photo загружает ее до рассылки)
+            if event.get('image_file_id'):
+                await self.background_bot.send_photo(
+                    chat_id=telegram_id, photo=event['image_file_id'], caption=text,
+                    parse_mode='HTML', reply_markup=reply_markup
+                )
+            else:
+                await self.background_bot.send_message(
+                    chat_id=telegram_id, text=text, parse_mode='HTML', reply_markup=reply_markup
+                )
+        
+        async def progress(broadcast: dict):
+            await job.report(SUCCESS_MESSAGES['broadcast_progress'].format(**broadcast))
+        
+        result = await self.broadcaster.run(broadcast_id, send, progress)
+        return SUCCESS_MESSAGES['broadcast_done'].format(
+            title=event['title'], sent=result['sent'], blocked=result['blocked'], failed=result['failed']
+        )
+
+    async def post_init(self, application: Application):
+        """После запуска: открыть фоновый пул и продолжить расчеты и рассылки, прерванные прошлой остановкой"""
+        await self.background_bot.initialize()
+        for event in self.data_manager.get_unfinished_settlements():
+            logger.info(f"Продолжение расчета события {event['id']}")
+            await self.start_settlement_job(event, event['result'], config.ADMIN_ID)
+        for broadcast in self.data_manager.get_unfinished_broadcasts():
+            event = self.data_manager.get_event(broadcast['event_id'])
+            if event is None:
+                self.data_manager.save_broadcast_progress(broadcast['id'], broadcast['cursor'], 0, 0, [], status='done')
+                continue
+            logger.info(f"Продолжение рассылки {broadcast['id']} с пользователя ID {broadcast['cursor']}")
+            await self.start_broadcast_job(broadcast, event)
+
+    async def post_stop(self, application: Application):
+        """При остановке: прервать фоновые задачи (расчеты и рассылки продолжатся при запуске)"""
+        await self.jobs.stop()
+
+    async def post_shutdown(self, application: Application):
+        """Закрыть соединения фонового пула"""
+        await self.background_bot.shutdown()
+
+    async def notify_players_about_results(self, event: dict, winning_option: int, progress=None) -> dict:
+        """
+        Уведомить всех игроков о результатах их ставок; progress(уведомлено, всего) вызывается
+        после каждой отправки. Возвращает число игроков и доставленных уведомлений
+        """
+        notified = {'players': 0, 'sent': 0}
         try:
             # Получаем все ставки на это событие
             event_bets = self.data_manager.get_event_bets(event['id'])
             
             if not event_bets:
-                return
+                return notified
             
             winning_text = event['option1'] if winning_option == 1 else event['option2']
             
@@ -1633,7 +2187,8 @@ class TotalizerBot:
                     user_bets[user_id] = []
                 user_bets[user_id].append(bet)
             
-            # Отправляем уведомления каждому игроку
+            # Готовим уведомления каждому игроку
+            texts = {}
             for user_id, bets in user_bets.items():
                 try:
                     # Подсчитываем результаты для этого пользователя
@@ -1688,17 +2243,33 @@ class TotalizerBot:
                         result_text=result_text
                     )
                     
-                    await self.application.bot.send_message(
-                        chat_id=user_id,
-                        text=notification_text,
-                        parse_mode='HTML'
-                    )
+                    texts[user_id] = notification_text
                     
                 except Exception as e:
                     logger.error(f"Ошибка при уведомлении игрока {user_id}: {e}")
+            
+            # Отправляем параллельно через фоновый пул, с общим лимитом скорости
+            recipients = list(texts)
+            results = [None] * len(recipients)
+            notified['players'] = len(recipients)
+            
+            async def send(telegram_id: int):
+                await self.background_bot.send_message(chat_id=telegram_id, text=texts[telegram_id], parse_mode='HTML')
+                notified['sent'] += 1
+                if progress is not None:
+                    await progress(notified['sent'], notified['players'])
+            
+            try:
+                await deliver(self.background_limiter, config.TELEGRAM_BACKGROUND_POOL_SIZE, recipients, send, results)
+            finally:
+                # Заблокировавшие бота не получают и рассылки (и при отмене посреди отправки)
+                blocked = [telegram_id for telegram_id, result in zip(recipients, results) if result == 'blocked']
+                if blocked:
+                    self.data_manager.set_users_active(blocked, False)
                     
         except Exception as e:
             logger.error(f"Ошибка при уведомлении игроков о результатах: {e}")
+        return notified
 
     async def cancel_proposal_creation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Отмена создания предложения"""
@@ -1786,7 +2357,12 @@ class TotalizerBot:
         
         # Запускаем бота
         print("🤖 Бот запущен и готов к работе!")
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        try:
+            self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        finally:
+            # Дописываем отложенные изменения перед выходом
+            self.data_manager.close()
+            print("💾 Данные сохранены")
 
 if __name__ == '__main__':
     try:
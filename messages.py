@@ -26,6 +26,13 @@ ADMIN_MESSAGES = {
 💰 **Пользователи:**
 /add_balance [user_id] [сумма] - Добавить монеты пользователю
 
+🗄 **Обслуживание:**
+/archive [дней] - Перенести давно закрытые события в архив
+/reconcile - Сверить журнал балансов
+/export [вид] [формат] [фильтры] - Выгрузить данные файлом
+/import [вид] - Загрузить события или изменения балансов файлом
+/jobs - Фоновые задачи в работе (расчет, рассылка, выгрузка)
+
 📊 **Просмотр:**
 /events - Все активные события
 
@@ -92,6 +99,40 @@ ADMIN_MESSAGES = {
 Введите команду в указанном формате:
     """,
     
+    'export_help': """
+📤 **Выгрузка данных:**
+`/export вид [формат] [event=ID] [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД]`
+
+Виды: bets, events, users, ledger
+Форматы: csv (по умолчанию), jsonl
+
+**Примеры:**
+`/export bets csv event=5`
+`/export ledger jsonl from=2024-01-01 to=2024-01-31`
+    """,
+    
+    'import_help': """
+📥 **Загрузка данных:**
+`/import events` или `/import balances`, затем отправьте файл документом
+
+Форматы: CSV с заголовком, JSON-массив или JSONL
+События: `title, option1, option2, odds1, odds2, description, image_url`
+Балансы: `telegram_id, amount` (amount - изменение, может быть отрицательным)
+
+Файл загружается целиком: при ошибке хотя бы в одной строке ничего не записывается
+    """,
+    
+    'import_waiting': """
+📥 Отправьте файл документом ({kind})
+    """,
+    
+    'broadcast_offer': "📣 Разослать анонс события «{title}» всем пользователям?",
+    
+    'broadcast_started': """
+📣 Рассылка анонса «{title}» запущена
+⏱ Скорость: до {rate:.0f} сообщений в секунду, ход рассылки - в сообщении задачи
+    """,
+    
     'detailed_stats': """
 📊 **СТАТИСТИКА БОТА**
 
@@ -107,6 +148,17 @@ ADMIN_MESSAGES = {
 Всего ставок: {total_bets}
 Выигравших ставок: {won_bets}
 Процент выигрышей: {win_percentage:.1f}% (из {total_bets})
+
+💡 **Предложения:**
+Ожидают рассмотрения: {pending_proposals}
+Одобрено: {approved_proposals} | Отклонено: {rejected_proposals}
+
+🚦 **Антифлуд:**
+Пропущено запросов: {throttle_passed} | Отброшено: {throttle_throttled}
+Активных пользователей в ограничителе: {throttle_buckets}
+Чтений событий: {reads_loads} | объединено одновременных: {reads_shared}
+Переходов по экранам: {navigations} | запросов к API на переход: {navigation_requests:.2f}
+Фоновых задач в работе: {jobs_active} | выполнено: {jobs_done} | с ошибкой: {jobs_failed} | отменено: {jobs_cancelled} | повторов: {jobs_retries}
     """
 }
 
@@ -137,6 +189,7 @@ USER_MESSAGES = {
 🎲 **События** - посмотреть активные события для ставок
 💰 **Баланс** - проверить ваш текущий баланс
 🎯 **Мои ставки** - история и статус ваших ставок
+🏆 **Рейтинг** - лучшие игроки по балансу и выигрышу (/top)
 ℹ️ **Помощь** - показать эту справку
 
 🎯 **Как делать ставки:**
@@ -179,9 +232,23 @@ USER_MESSAGES = {
 🎲 <b>Активные события для ставок:</b>
 
 Выберите событие:
-    """
+    """,
+    
+    'leaderboard': """
+🏆 <b>Рейтинг игроков</b> - {title}
+
+{leaders}
+{your_rank}
+    """,
+    
+    'leaderboard_item': "{place} {name} - {value} монет",
+    
+    'leaderboard_your_rank': "\n📍 <b>Ваше место:</b> {rank} из {total} ({value} монет)"
 }
 
+# Медали для первых мест рейтинга
+LEADERBOARD_MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
+
 # Сообщения об ошибках
 ERROR_MESSAGES = {
     'no_access': "❌ У вас нет доступа к этой функции",
@@ -190,10 +257,30 @@ ERROR_MESSAGES = {
     'invalid_amount': "❌ Введите корректную сумму (число больше 0)",
     'insufficient_balance': "❌ Недостаточно средств на балансе",
     'bet_creation_error': "❌ Ошибка при создании ставки",
+    'throttled': "⏳ Слишком много запросов. Подождите пару секунд и повторите",
     'loading_error': "❌ Ошибка при загрузке данных",
     'invalid_coefficient': "❌ Коэффициент должен быть числом от 0.1 до 10.0",
     'invalid_input': "❌ Введите корректное число (например: 1.8)",
-    'creation_cancelled': "❌ Создание отменено"
+    'creation_cancelled': "❌ Создание отменено",
+    'reconcile_failed': """
+❌ Сверка балансов: найдены расхождения
+
+📒 Движений: {entries}, счетов: {accounts}
+⚖️ Сумма по всем счетам: {imbalance:.2f}
+🔀 Снимок + хвост не сходятся с журналом: {mismatched}
+👤 Пользователи без счета: {users_without_account}
+📂 Счета без пользователя: {accounts_without_user}
+🕰 Баланс в файле не равен снимку: {stale_users}
+🎯 Ставки без списания: {bets_without_debit}
+💸 Списания без ставки: {debits_without_bet}
+    """,
+    
+    'import_failed': """
+❌ Загрузка {kind} отклонена, ничего не записано
+
+⚠️ Ошибок: {count} из {total} строк
+{errors}
+    """
 }
 
 # Сообщения об успехе
@@ -295,22 +382,73 @@ ID события: {event_id}
     """,
     
     'event_closed_simple': """
-✅ **Событие закрыто!**
+✅ Событие закрыто!
 
-🎯 **{title}**
+🎯 {title}
 🏆 Результат: {winning_option}
 
-📊 **Итоги:**
+📊 Итоги:
 👥 Всего ставок: {total_bets}
 🎉 Выигравших: {winners}
 💰 Общие выплаты: {total_payouts:.2f} монет
 
-📬 Все игроки уведомлены о результатах своих ставок.
+📬 Уведомлено игроков: {notified} из {players}
+    """,
+    
+    'settlement_progress': "💰 Рассчитано ставок: {done} из {total}",
+    
+    'settlement_paid': "💰 Выплаты начислены: ставок {total_bets}, выигравших {winners}, выплачено {total_payouts:.2f} монет",
+    
+    'archive_done': """
+🗄 **Архивация завершена!**
+
+📅 Закрыты более {days} дн. назад
+🎯 Событий перенесено: {events}
+💰 Ставок перенесено: {bets}
+📦 Сегменты: {segments}
+    """,
+    
+    'export_done': """
+✅ Выгрузка {kind} ({fmt}) завершена
+📄 Строк: {rows}, файлов: {parts}
+    """,
+    
+    'import_done': """
+✅ Загрузка {kind} завершена
+📄 Записано строк: {imported}
+    """,
+    
+    'broadcast_progress': "📣 Доставлено: {sent}, заблокировали бота: {blocked}, ошибок: {failed}",
+    
+    'broadcast_done': """
+📣 Рассылка анонса «{title}» завершена
+
+✅ Доставлено: {sent}
+🚫 Заблокировали бота: {blocked}
+❌ Ошибок: {failed}
+    """,
+    
+    'reconcile_ok': """
+✅ Сверка балансов: расхождений нет
+
+📒 Движений: {entries}, счетов: {accounts}
+⚖️ Сумма по всем счетам: {imbalance:.2f}
     """
 }
 
 # Сообщения уведомлений
 NOTIFICATION_MESSAGES = {
+    'new_event': """
+🆕 <b>Новое событие!</b>
+
+🎯 <b>{title}</b>
+{description}
+1️⃣ {option1} (коэф. {odds1})
+2️⃣ {option2} (коэф. {odds2})
+
+Делайте ставки!
+    """,
+    
     'admin_new_proposal': """
 🆕 **Новое предложение события!**
 
@@ -0,0 +1,136 @@
+"""
+Переходы между экранами бота в одном сообщении самой дешевой операцией Telegram API
+"""
+
+import logging
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from telegram import InputMediaPhoto
+
+logger = logging.getLogger(__name__)
+
+
+class Navigator:
+    """
+    Показ экрана (текст, кнопки и, если нужно, картинка) в сообщении, на кнопку которого нажали:
+      - текст -> текст: edit_message_text;
+      - картинка -> картинка: та же картинка - edit_message_caption, другая - edit_message_media;
+      - текст -> картинка и картинка -> текст: тип сообщения правкой не сменить (подпись под старой
+        картинкой показала бы чужой экран) - новое сообщение и удаление старого.
+
+    После каждого изменения запоминается, что в сообщении (картинка, текст, кнопки); повтор
+    того же экрана не стоит ни одного запроса. Запомненное используется, только если сообщение
+    с тех пор не меняли в обход навигатора (сверяются время правки и текст из нажатия).
+    calls - счетчик запросов к API по операциям, navigations - число переходов.
+    """
+
+    def __init__(self, max_tracked: int = 10000):
+        self.max_tracked = max_tracked
+        # (chat_id, message_id) -> (картинки, текст, кнопки, текст в Telegram, время правки)
+        self._states: OrderedDict = OrderedDict()
+        self.calls: Counter = Counter()
+        self.navigations = 0
+
+    async def show(self, query, text: str, parse_mode: Optional[str] = None, reply_markup=None,
+                   photo: Optional[str] = None):
+        """
+        Показать экран в сообщении нажатой кнопки; photo - file_id или URL картинки.
+        Возвращает сообщение с экраном (из него берется file_id картинки, загруженной по URL).
+        Ошибки API передаются вызывающему, кроме «сообщение не изменилось»
+        """
+        self.navigations += 1
+        message = query.message
+        photos, current_text, current_markup = self._state_of(message)
+
+        if photos:
+            if photo is None:
+                operation = 'replace'
+            else:
+                operation = 'edit_caption' if photo in photos else 'edit_media'
+        else:
+            operation = 'edit_text' if photo is None else 'replace'
+
+        if operation in ('edit_caption', 'edit_text') and text == current_text and reply_markup == current_markup:
+            self.calls['skipped'] += 1
+            return message
+
+        try:
+            result = await self._apply(query, operation, text, parse_mode, reply_markup, photo)
+        except Exception as e:
+            if 'not modified' in str(e).lower():
+                return message
+            raise
+
+        if operation == 'edit_caption':
+            result_photos = photos
+        elif photo is not None:
+            result_photos = {photo}
+            if getattr(result, 'photo', None):
+                result_photos.add(result.photo[-1].file_id)
+        else:
+            result_photos = set()
+
+        if operation == 'replace':
+            self._states.pop((message.chat_id, message.message_id), None)
+        if getattr(result, 'message_id', None) is not None:
+            self._remember(result, result_photos, text, reply_markup)
+            return result
+        return message
+
+    async def _apply(self, query, operation: str, text: str, parse_mode, reply_markup, photo):
+        """Выполнить операцию (каждый запрос к API учитывается в calls)"""
+        self.calls[operation if operation != 'replace' else 'send'] += 1
+        if operation == 'edit_text':
+            return await query.edit_message_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        if operation == 'edit_caption':
+            return await query.edit_message_caption(caption=text, parse_mode=parse_mode, reply_markup=reply_markup)
+        if operation == 'edit_media':
+            return await query.edit_message_media(
+                InputMediaPhoto(photo, caption=text, parse_mode=parse_mode), reply_markup=reply_markup
+            )
+
+        if photo is not None:
+            result = await query.message.reply_photo(
+                photo=photo, caption=text, parse_mode=parse_mode, reply_markup=reply_markup
+            )
+        else:
+            result = await query.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        # Новое сообщение уже отправлено - неудачное удаление старого экран не ломает
+        self.calls['delete'] += 1
+        try:
+            await query.delete_message()
+        except Exception as e:
+            logger.error(f"Ошибка при удалении предыдущего сообщения: {e}")
+        return result
+
+    def _state_of(self, message) -> tuple:
+        """(картинки сообщения, текст экрана, кнопки); текст None - экран неизвестен"""
+        key = (message.chat_id, message.message_id)
+        state = self._states.get(key)
+        plain = message.caption if message.photo else message.text
+        if state is not None and state[3] == plain and state[4] == message.edit_date:
+            self._states.move_to_end(key)
+            return state[0], state[1], state[2]
+
+        # Сообщение не менялось навигатором (или менялось в обход него) - судим по нему самому
+        photos = {message.photo[-1].file_id} if message.photo else set()
+        return photos, None, None
+
+    def _remember(self, message, photos: set, text: str, reply_markup):
+        key = (message.chat_id, message.message_id)
+        plain = message.caption if message.photo else message.text
+        self._states[key] = (photos, text, reply_markup, plain, message.edit_date)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_tracked:
+            self._states.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Запросы к API по операциям, всего и в среднем на переход"""
+        requests = sum(count for operation, count in self.calls.items() if operation != 'skipped')
+        return {
+            'navigations': self.navigations,
+            'requests': requests,
+            'per_navigation': requests / self.navigations if self.navigations else 0.0,
+            **self.calls
+        }
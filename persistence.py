@@ -0,0 +1,117 @@
+"""
+Сохранение user_data / chat_data между перезапусками бота (BasePersistence для python-telegram-bot)
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from state_store import StateStore
+from storage import get_codec
+
+logger = logging.getLogger(__name__)
+
+
+class StatePersistence(BasePersistence):
+    """
+    Незавершенные шаги (ставка, создание события, предложение, свои коэффициенты) живут
+    в context.user_data. Application передает изменения раз в update_interval секунд
+    и при остановке; все изменения одной передачи записываются в файл одной записью
+    в отдельном потоке, поэтому обработка сообщений диск не ждет.
+
+    bot_data, callback_data и состояния ConversationHandler бот не использует и не хранит.
+    """
+
+    def __init__(self, path: str, update_interval: float = 10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        # Состояния разнородны (у каждого шага свои поля) - компактный JSON для них
+        # и быстрее, и меньше бинарного формата (benchmark.py state)
+        self.store = StateStore(path, get_codec("compact"))
+        self.store.load()
+        self._write_task: Optional[asyncio.Task] = None
+
+    # ---------- загрузка при запуске ----------
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {user_id: dict(data) for user_id, data in self.store.users.items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {chat_id: dict(data) for chat_id, data in self.store.chats.items()}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    # ---------- изменения ----------
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self.store.set_user(user_id, data)
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        self.store.set_chat(chat_id, data)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int):
+        self.store.drop_user(user_id)
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id: int):
+        self.store.drop_chat(chat_id)
+        self._schedule_write()
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # ---------- запись ----------
+
+    def _schedule_write(self):
+        """
+        Запланировать запись после текущей передачи изменений: задача запускается,
+        когда Application передаст все изменения, и пишет их одним файлом
+        """
+        if self.store.dirty and (self._write_task is None or self._write_task.done()):
+            self._write_task = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        # Пока идет запись, могли прийти новые изменения - пишем, пока они есть
+        while True:
+            raw = self.store.dumps()
+            if raw is None:
+                return
+            try:
+                await asyncio.to_thread(self.store.write, raw)
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении состояния диалогов: {e}")
+                return
+
+    async def flush(self):
+        """Остановка бота: дождаться фоновой записи и записать остаток"""
+        if self._write_task is not None:
+            await self._write_task
+        self.store.flush()
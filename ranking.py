@@ -0,0 +1,165 @@
+"""
+Рейтинг пользователей по значению (баланс, чистый результат) с обновлением по одному пользователю
+"""
+
+import random
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Уровней списка с пропусками: log2 от числа пользователей, при котором поиск остается логарифмическим
+MAX_LEVELS = 24
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, height: int):
+        self.key = key
+        self.next: List[Optional['_Node']] = [None] * height
+        self.width: List[int] = [1] * height  # сколько позиций до следующего узла этого уровня
+
+
+class _IndexedSkiplist:
+    """
+    Упорядоченный список с пропусками, в котором каждая ссылка знает свою длину в позициях:
+    вставка, удаление и позиция ключа - O(log n) в среднем, первые k ключей - O(log n + k).
+    Позиции: голова - 0, ключи - с 1, конец списка - len + 1.
+    """
+
+    def __init__(self, keys: Iterable = ()):
+        self._random = random.Random()
+        self.build(keys)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _height(self) -> int:
+        # Высота узла h выпадает с вероятностью 2^-h: младший единичный бит случайного числа
+        bits = self._random.getrandbits(MAX_LEVELS)
+        return min((bits & -bits).bit_length(), MAX_LEVELS) if bits else MAX_LEVELS
+
+    def build(self, keys: Iterable):
+        """Заполнить список отсортированными ключами за один проход (без поиска места для каждого)"""
+        self._head = _Node(None, MAX_LEVELS)
+        last = [self._head] * MAX_LEVELS
+        last_position = [0] * MAX_LEVELS
+        position = 0
+        for position, key in enumerate(keys, 1):
+            node = _Node(key, self._height())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level], last_position[level] = node, position
+        for level in range(MAX_LEVELS):
+            last[level].width[level] = position + 1 - last_position[level]
+        self._size = position
+
+    def _find(self, key) -> Tuple[List[_Node], List[int]]:
+        """Последний узел с ключом меньше key на каждом уровне и его позиция"""
+        chain = [self._head] * MAX_LEVELS
+        positions = [0] * MAX_LEVELS
+        node, position = self._head, 0
+        for level in range(MAX_LEVELS - 1, -1, -1):
+            following = node.next[level]
+            while following is not None and following.key < key:
+                position += node.width[level]
+                node, following = following, following.next[level]
+            chain[level], positions[level] = node, position
+        return chain, positions
+
+    def count_less(self, key) -> int:
+        """Количество ключей меньше key"""
+        return self._find(key)[1][0]
+
+    def insert(self, key):
+        chain, positions = self._find(key)
+        node = _Node(key, self._height())
+        position = positions[0] + 1
+        for level in range(len(node.next)):
+            previous = chain[level]
+            node.next[level] = previous.next[level]
+            previous.next[level] = node
+            node.width[level] = previous.width[level] - (position - positions[level]) + 1
+            previous.width[level] = position - positions[level]
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain, _ = self._find(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def first(self, limit: int) -> Iterable:
+        """Первые limit ключей по порядку"""
+        node = self._head.next[0]
+        while node is not None and limit > 0:
+            yield node.key
+            node, limit = node.next[0], limit - 1
+
+
+class Ranking:
+    """
+    Ключи (-значение, telegram_id) в списке с пропусками и текущие значения пользователей.
+
+    Обновление значения, ранг пользователя - O(log n); первые N мест - O(log n + N).
+    Равные значения делят место: ранг - 1 + количество пользователей со значением строго больше.
+    """
+
+    def __init__(self):
+        self._keys = _IndexedSkiplist()
+        self._values: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def reset(self, values: Dict[int, float]):
+        """Заполнить рейтинг целиком: одна сортировка вместо вставки по одному"""
+        with self._lock:
+            self._values = dict(values)
+            self._keys.build(sorted((-value, telegram_id) for telegram_id, value in self._values.items()))
+
+    def update(self, telegram_id: int, value: float):
+        """Установить значение пользователя"""
+        with self._lock:
+            old = self._values.get(telegram_id)
+            if old == value:
+                return
+            if old is not None:
+                self._keys.remove((-old, telegram_id))
+            self._keys.insert((-value, telegram_id))
+            self._values[telegram_id] = value
+
+    def remove(self, telegram_id: int):
+        """Убрать пользователя из рейтинга"""
+        with self._lock:
+            old = self._values.pop(telegram_id, None)
+            if old is not None:
+                self._keys.remove((-old, telegram_id))
+
+    def top(self, limit: int) -> List[Tuple[int, int, float]]:
+        """Первые limit мест: (ранг, telegram_id, значение)"""
+        with self._lock:
+            result = []
+            for position, (negative, telegram_id) in enumerate(self._keys.first(limit)):
+                rank = result[-1][0] if result and result[-1][2] == -negative else position + 1
+                result.append((rank, telegram_id, -negative))
+            return result
+
+    def rank(self, telegram_id: int) -> Optional[Tuple[int, float]]:
+        """Ранг и значение пользователя или None, если его нет в рейтинге"""
+        with self._lock:
+            value = self._values.get(telegram_id)
+            if value is None:
+                return None
+            # (-value,) меньше всех ключей с этим значением: считаются только значения строго больше
+            return self._keys.count_less((-value,)) + 1, value
@@ -3,20 +3,22 @@
 Скрипт для запуска Telegram бота-тотализатора
 """
 
+import importlib.util
 import sys
 import os
-from main import TotalizerBot
+import time
 
 def check_requirements():
-    """Проверка наличия необходимых зависимостей"""
-    try:
-        import telegram
-        import dotenv
-        return True
-    except ImportError as e:
-        print(f"❌ Отсутствует зависимость: {e}")
-        print("🔧 Установите зависимости командой: pip install -r requirements.txt")
-        return False
+    """
+    Проверка наличия необходимых зависимостей - без импорта: стоимость импорта telegram
+    должна попасть в замер import_bot
+    """
+    for module in ('telegram', 'dotenv'):
+        if importlib.util.find_spec(module) is None:
+            print(f"❌ Отсутствует зависимость: {module}")
+            print("🔧 Установите зависимости командой: pip install -r requirements.txt")
+            return False
+    return True
 
 def check_config():
     """Проверка конфигурации"""
@@ -28,6 +30,35 @@ def check_config():
         print("🔧 Проверьте файл .env и убедитесь, что все переменные заданы")
         return False
 
+def import_bot(budget_ms: float):
+    """
+    Импорт модуля бота с замером времени: тяжелые зависимости (telegram) загружаются
+    только после проверок, а превышение бюджета на импорт видно сразу при запуске
+    """
+    started = time.perf_counter()
+    from main import TotalizerBot
+    elapsed = time.perf_counter() - started
+    
+    if elapsed * 1000 > budget_ms:
+        print(f"⚠️ Импорт модулей бота занял {elapsed * 1000:.0f} мс "
+              f"(бюджет {budget_ms:.0f} мс) - проверьте новые импорты: "
+              f"python -X importtime main.py")
+    return TotalizerBot, elapsed
+
+def print_startup_profile(import_time: float, bot):
+    """Отчет о времени этапов запуска"""
+    storage_phases = bot.data_manager.startup_profile
+    total = import_time + sum(bot.startup_profile.values())
+    
+    print("⏱ Профиль запуска:")
+    print(f"   импорт модулей: {import_time * 1000:.0f} мс")
+    for name, elapsed in bot.startup_profile.items():
+        print(f"   {name}: {elapsed * 1000:.0f} мс")
+        if name == 'storage':
+            for phase, phase_time in storage_phases.items():
+                print(f"      {phase}: {phase_time * 1000:.0f} мс")
+    print(f"   всего: {total * 1000:.0f} мс")
+
 def main():
     """Главная функция запуска"""
     print("🎲 Telegram Бот-Тотализатор")
@@ -41,9 +72,16 @@ def main():
     if not check_config():
         sys.exit(1)
     
+    import config
+    
     # Запускаем бота
     try:
+        TotalizerBot, import_time = import_bot(config.STARTUP_IMPORT_BUDGET_MS)
         bot = TotalizerBot()
+        
+        if config.STARTUP_PROFILE:
+            print_startup_profile(import_time, bot)
+        
         bot.run()
     except KeyboardInterrupt:
         print("\n🛑 Бот остановлен пользователем")
@@ -0,0 +1,102 @@
+"""
+Расчет выплат по событию над столбцами ставок (NumPy, если установлен)
+"""
+
+from array import array
+from typing import Dict
+
+from bet_store import BetStore, WON_FALSE, WON_TRUE
+
+# С какого количества ставок имеет смысл векторный расчет
+VECTORIZE_MIN_BETS = 1000
+
+# NumPy необязателен (без него считаем на чистом Python) и импортируется ~0.1 с,
+# поэтому загружается при первом крупном расчете, а не при запуске бота
+np = None
+_numpy_checked = False
+
+
+def _load_numpy():
+    """Модуль NumPy или None, если он не установлен"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_checked = True
+    return np
+
+
+def settle_event(store: BetStore, event_id: int, winning_option: int) -> dict:
+    """
+    Рассчитать результаты ставок на событие.
+
+    Возвращает строки ставок, флаги выигрыша по строкам, выплаты по пользователям
+    (telegram_id -> сумма) и общую статистику. Хранилище не изменяется.
+    """
+    return settle_rows(store, store.event_rows(event_id), winning_option)
+
+
+def settle_rows(store: BetStore, rows: array, winning_option: int) -> dict:
+    """То же для части ставок события (строки хранилища) - расчет события по частям"""
+    if len(rows) >= VECTORIZE_MIN_BETS and _load_numpy() is not None:
+        return _settle_numpy(store, rows, winning_option)
+    return _settle_python(store, rows, winning_option)
+
+
+def _settle_python(store: BetStore, rows: array, winning_option: int) -> dict:
+    """Построчный расчет"""
+    options, amounts, odds, telegram_ids = store.options, store.amounts, store.odds, store.telegram_ids
+    won = array('b')
+    payouts: Dict[int, float] = {}
+    winners = 0
+    total_payouts = 0.0
+
+    for row in rows:
+        if options[row] == winning_option:
+            payout = amounts[row] * odds[row]
+            telegram_id = telegram_ids[row]
+            payouts[telegram_id] = payouts.get(telegram_id, 0.0) + payout
+            winners += 1
+            total_payouts += payout
+            won.append(WON_TRUE)
+        else:
+            won.append(WON_FALSE)
+
+    return {
+        'rows': rows,
+        'won': won,
+        'payouts': payouts,
+        'total_bets': len(rows),
+        'winners': winners,
+        'total_payouts': total_payouts,
+    }
+
+
+def _settle_numpy(store: BetStore, rows: array, winning_option: int) -> dict:
+    """Векторный расчет: маска выигрышей, выплаты и группировка по пользователям"""
+    index = np.frombuffer(rows, dtype=np.uint32)
+    options = np.frombuffer(store.options, dtype=np.int8)[index]
+    amounts = np.frombuffer(store.amounts, dtype=np.float64)[index]
+    odds = np.frombuffer(store.odds, dtype=np.float64)[index]
+    telegram_ids = np.frombuffer(store.telegram_ids, dtype=np.int64)[index]
+
+    win_mask = options == winning_option
+    win_payouts = amounts[win_mask] * odds[win_mask]
+
+    # Группировка выплат по пользователям
+    users, inverse = np.unique(telegram_ids[win_mask], return_inverse=True)
+    user_payouts = np.bincount(inverse, weights=win_payouts, minlength=len(users))
+
+    won = array('b', np.where(win_mask, WON_TRUE, WON_FALSE).astype(np.int8).tobytes())
+
+    return {
+        'rows': rows,
+        'won': won,
+        'payouts': dict(zip(users.tolist(), user_payouts.tolist())),
+        'total_bets': len(rows),
+        'winners': int(win_mask.sum()),
+        'total_payouts': float(win_payouts.sum()),
+    }
@@ -0,0 +1,69 @@
+"""
+Объединение одинаковых одновременных чтений (single-flight)
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Одновременные вызовы do() с одним ключом выполняют загрузку один раз: первый вызов
+    загружает, остальные ждут его и получают тот же результат (или то же исключение).
+    Результат общий - менять его нельзя. После завершения загрузки ключ освобождается:
+    это не кеш, следующий вызов загружает заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Ключ -> [событие завершения, результат, исключение]
+        self._flights: Dict[Hashable, list] = {}
+        self.metrics = {'loads': 0, 'shared': 0}
+
+    def do(self, key: Hashable, load: Callable):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = [threading.Event(), None, None]
+                self.metrics['loads'] += 1
+            else:
+                self.metrics['shared'] += 1
+
+        if not leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+
+        try:
+            flight[1] = load()
+            return flight[1]
+        except BaseException as e:
+            flight[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight[0].set()
+
+
+class AsyncSingleFlight:
+    """То же для корутин одного цикла событий: ожидающие получают результат общей задачи"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.metrics = {'loads': 0, 'shared': 0}
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable]):
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.metrics['shared'] += 1
+            # shield: отмена одного ожидающего не отменяет загрузку для остальных
+            return await asyncio.shield(flight)
+
+        self.metrics['loads'] += 1
+        flight = self._flights[key] = asyncio.ensure_future(load())
+        flight.add_done_callback(lambda done: self._flights.pop(key) if self._flights.get(key) is done else None)
+        return await asyncio.shield(flight)
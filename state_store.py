@@ -0,0 +1,112 @@
+"""
+Состояние диалогов (user_data / chat_data) в одном файле: переживает перезапуск бота
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from storage import StorageError, atomic_write, detect_codec
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    Копии user_data и chat_data по ID пользователя/чата в памяти и их запись одним файлом.
+
+    set_user/set_chat только сравнивают данные с последней копией (шаги диалогов - это
+    несколько коротких значений) и помечают изменение; файл пишется не на каждое сообщение,
+    а один раз за пачку изменений (dumps + write). Пустые состояния в файл не попадают.
+    """
+
+    def __init__(self, path: str, codec):
+        self.path = path
+        self.codec = codec
+        self.users: Dict[int, dict] = {}
+        self.chats: Dict[int, dict] = {}
+        self.writes = 0
+        self._dirty = False
+        self._write_lock = threading.Lock()
+
+    def load(self):
+        """Прочитать состояние с диска (файла нет - состояние пустое)"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return
+
+        try:
+            data = detect_codec(raw).loads(raw)
+        except ValueError as e:
+            logger.error(f"Файл состояния диалогов поврежден: {self.path}: {e}")
+            raise StorageError(f"Файл состояния диалогов поврежден: {self.path}") from e
+
+        # Ключи JSON - строки, ID в PTB - числа
+        self.users = {int(key): value for key, value in data.get('users', {}).items()}
+        self.chats = {int(key): value for key, value in data.get('chats', {}).items()}
+        self._dirty = False
+
+    @staticmethod
+    def _set(states: Dict[int, dict], key: int, data: dict) -> bool:
+        """Запомнить копию состояния; True, если оно изменилось"""
+        if not data:
+            return states.pop(key, None) is not None
+        if states.get(key) == data:
+            return False
+        states[key] = dict(data)
+        return True
+
+    def set_user(self, user_id: int, data: dict):
+        """Текущее user_data пользователя"""
+        if self._set(self.users, user_id, data):
+            self._dirty = True
+
+    def set_chat(self, chat_id: int, data: dict):
+        """Текущее chat_data чата"""
+        if self._set(self.chats, chat_id, data):
+            self._dirty = True
+
+    def drop_user(self, user_id: int):
+        if self.users.pop(user_id, None) is not None:
+            self._dirty = True
+
+    def drop_chat(self, chat_id: int):
+        if self.chats.pop(chat_id, None) is not None:
+            self._dirty = True
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def dumps(self) -> Optional[bytes]:
+        """Закодировать состояние, если оно менялось после прошлой записи (иначе None)"""
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return self.codec.dumps({
+            'users': {str(key): value for key, value in self.users.items()},
+            'chats': {str(key): value for key, value in self.chats.items()},
+        })
+
+    def write(self, raw: bytes):
+        """Атомарно записать закодированное состояние (можно вызывать из другого потока)"""
+        with self._write_lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                atomic_write(self.path, raw)
+            except BaseException:
+                # Состояние не записано - запишем его со следующей пачкой изменений
+                self._dirty = True
+                raise
+            self.writes += 1
+
+    def flush(self):
+        """Записать состояние, если оно менялось"""
+        raw = self.dumps()
+        if raw is not None:
+            self.write(raw)
@@ -0,0 +1,566 @@
+"""
+Форматы хранения файлов данных (кодеки) и надежная запись файлов для DataManager
+"""
+
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами недоступны
+    fcntl = None
+
+TEMP_SUFFIX = '.tmp'
+
+logger = logging.getLogger(__name__)
+
+
+class StorageError(Exception):
+    """Файл данных поврежден или не может быть прочитан"""
+
+
+class JsonCodec:
+    """JSON: читаемый (с отступами) или компактный (без пробелов)"""
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+        self.name = 'compact' if compact else 'json'
+
+    def dumps(self, data) -> bytes:
+        if self.compact:
+            text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        else:
+            text = json.dumps(data, ensure_ascii=False, indent=2)
+        return text.encode('utf-8')
+
+    def loads(self, raw: bytes):
+        return json.loads(raw.decode('utf-8'))
+
+
+class BinaryCodec:
+    """
+    Компактный бинарный формат в духе msgpack.
+
+    Коллекции вида {id: запись} (пользователи, события, ставки) пишутся
+    таблицей по столбцам: имена полей один раз, числа - упакованными
+    массивами, строки - одним общим UTF-8 блоком. Остальные значения
+    кодируются тегированными элементами.
+    """
+
+    name = 'binary'
+    MAGIC = b'TTB\x01'
+
+    # Теги значений
+    T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_LIST, T_DICT, T_TABLE, T_BIGINT = range(10)
+
+    # Типы столбцов таблицы
+    C_INT, C_FLOAT, C_BOOL, C_STR, C_ANY = b'i', b'f', b'b', b's', b'g'
+
+    _INT = struct.Struct('<q')
+    _FLOAT = struct.Struct('<d')
+    _LEN = struct.Struct('<I')
+
+    _MISSING = object()
+
+    def dumps(self, data) -> bytes:
+        out = bytearray(self.MAGIC)
+        self._encode(data, out)
+        return bytes(out)
+
+    def loads(self, raw: bytes):
+        if not raw.startswith(self.MAGIC):
+            raise ValueError("Неизвестный бинарный формат")
+        value, _ = self._decode(memoryview(raw), len(self.MAGIC))
+        return value
+
+    # ---------- кодирование ----------
+
+    def _encode(self, value, out: bytearray):
+        if value is None:
+            out.append(self.T_NONE)
+        elif value is True:
+            out.append(self.T_TRUE)
+        elif value is False:
+            out.append(self.T_FALSE)
+        elif isinstance(value, int):
+            if -2 ** 63 <= value < 2 ** 63:
+                out.append(self.T_INT)
+                out += self._INT.pack(value)
+            else:
+                out.append(self.T_BIGINT)
+                self._encode_str(str(value), out)
+        elif isinstance(value, float):
+            out.append(self.T_FLOAT)
+            out += self._FLOAT.pack(value)
+        elif isinstance(value, str):
+            out.append(self.T_STR)
+            self._encode_str(value, out)
+        elif isinstance(value, (list, tuple)):
+            out.append(self.T_LIST)
+            out += self._LEN.pack(len(value))
+            for item in value:
+                self._encode(item, out)
+        elif isinstance(value, dict):
+            # Таблица - только при непустом наборе полей: строки без полей в ней не сохранить
+            if any(value.values()) and all(isinstance(v, dict) for v in value.values()):
+                out.append(self.T_TABLE)
+                self._encode_table(value, out)
+            else:
+                out.append(self.T_DICT)
+                out += self._LEN.pack(len(value))
+                for key, item in value.items():
+                    self._encode_str(str(key), out)
+                    self._encode(item, out)
+        else:
+            raise TypeError(f"Тип {type(value).__name__} не поддерживается бинарным форматом")
+
+    def _encode_str(self, text: str, out: bytearray):
+        data = text.encode('utf-8')
+        out += self._LEN.pack(len(data))
+        out += data
+
+    def _encode_table(self, table: Dict[str, dict], out: bytearray):
+        rows = list(table.values())
+
+        # Объединение полей всех записей в порядке появления
+        fields: Dict[str, None] = {}
+        for row in rows:
+            for field in row:
+                if field not in fields:
+                    fields[field] = None
+
+        out += self._LEN.pack(len(rows))
+        self._encode_column([str(key) for key in table], out)
+        out += self._LEN.pack(len(fields))
+        for field in fields:
+            self._encode_str(field, out)
+            column = [row.get(field, self._MISSING) for row in rows]
+            if any(v is self._MISSING for v in column):
+                out.append(1)
+                out += array('b', [v is self._MISSING for v in column]).tobytes()
+                column = [None if v is self._MISSING else v for v in column]
+            else:
+                out.append(0)
+            self._encode_column(column, out)
+
+    def _encode_column(self, column: List, out: bytearray):
+        types = {type(v) for v in column}
+
+        if types == {int} and all(-2 ** 63 <= v < 2 ** 63 for v in column):
+            out += self.C_INT
+            out += self._pack_array('q', column)
+        elif types == {float}:
+            out += self.C_FLOAT
+            out += self._pack_array('d', column)
+        elif types <= {bool, type(None)}:
+            out += self.C_BOOL
+            out += array('b', [-1 if v is None else int(v) for v in column]).tobytes()
+        elif types <= {str, type(None)} and not any(v and '\0' in v for v in column):
+            # Строки одним блоком через \0: при чтении разбираются одним split
+            out += self.C_STR
+            out += array('b', [v is None for v in column]).tobytes()
+            self._encode_str('\0'.join(v for v in column if v is not None), out)
+        else:
+            out += self.C_ANY
+            for value in column:
+                self._encode(value, out)
+
+    @staticmethod
+    def _pack_array(typecode: str, values: List) -> bytes:
+        packed = array(typecode, values)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return packed.tobytes()
+
+    # ---------- декодирование ----------
+
+    def _decode(self, buf: memoryview, pos: int):
+        tag = buf[pos]
+        pos += 1
+        if tag == self.T_NONE:
+            return None, pos
+        if tag == self.T_TRUE:
+            return True, pos
+        if tag == self.T_FALSE:
+            return False, pos
+        if tag == self.T_INT:
+            return self._INT.unpack_from(buf, pos)[0], pos + 8
+        if tag == self.T_FLOAT:
+            return self._FLOAT.unpack_from(buf, pos)[0], pos + 8
+        if tag == self.T_STR:
+            return self._decode_str(buf, pos)
+        if tag == self.T_BIGINT:
+            text, pos = self._decode_str(buf, pos)
+            return int(text), pos
+        if tag == self.T_LIST:
+            count = self._LEN.unpack_from(buf, pos)[0]
+            pos += 4
+            items = []
+            for _ in range(count):
+                item, pos = self._decode(buf, pos)
+                items.append(item)
+            return items, pos
+        if tag == self.T_DICT:
+            count = self._LEN.unpack_from(buf, pos)[0]
+            pos += 4
+            result = {}
+            for _ in range(count):
+                key, pos = self._decode_str(buf, pos)
+                result[key], pos = self._decode(buf, pos)
+            return result, pos
+        if tag == self.T_TABLE:
+            return self._decode_table(buf, pos)
+        raise ValueError(f"Неизвестный тег {tag} в бинарных данных")
+
+    def _decode_str(self, buf: memoryview, pos: int):
+        length = self._LEN.unpack_from(buf, pos)[0]
+        pos += 4
+        return str(buf[pos:pos + length], 'utf-8'), pos + length
+
+    def _decode_table(self, buf: memoryview, pos: int):
+        count = self._LEN.unpack_from(buf, pos)[0]
+        pos += 4
+        keys, pos = self._decode_column(buf, pos, count)
+        field_count = self._LEN.unpack_from(buf, pos)[0]
+        pos += 4
+
+        fields, columns, masks = [], [], []
+        for _ in range(field_count):
+            field, pos = self._decode_str(buf, pos)
+            has_missing = buf[pos]
+            pos += 1
+            mask = None
+            if has_missing:
+                mask = buf[pos:pos + count].tolist()
+                pos += count
+            column, pos = self._decode_column(buf, pos, count)
+            fields.append(field)
+            columns.append(column)
+            masks.append(mask)
+
+        if not any(masks):
+            rows = [dict(zip(fields, values)) for values in zip(*columns)]
+        else:
+            rows = []
+            for i, values in enumerate(zip(*columns)):
+                rows.append({
+                    field: value for field, value, mask in zip(fields, values, masks)
+                    if mask is None or not mask[i]
+                })
+        return dict(zip(keys, rows)), pos
+
+    def _decode_column(self, buf: memoryview, pos: int, count: int):
+        kind = bytes(buf[pos:pos + 1])
+        pos += 1
+        if kind == self.C_INT:
+            return self._unpack_array('q', buf, pos, count), pos + 8 * count
+        if kind == self.C_FLOAT:
+            return self._unpack_array('d', buf, pos, count), pos + 8 * count
+        if kind == self.C_BOOL:
+            raw = array('b', bytes(buf[pos:pos + count]))
+            return [None if v < 0 else bool(v) for v in raw], pos + count
+        if kind == self.C_STR:
+            nulls = bytes(buf[pos:pos + count])
+            blob, pos = self._decode_str(buf, pos + count)
+            present = count - nulls.count(1)
+            values = blob.split('\0') if present else []
+            if present == count:
+                return values, pos
+            present_values = iter(values)
+            return [None if is_null else next(present_values) for is_null in nulls], pos
+        if kind == self.C_ANY:
+            values = []
+            for _ in range(count):
+                value, pos = self._decode(buf, pos)
+                values.append(value)
+            return values, pos
+        raise ValueError(f"Неизвестный тип столбца {kind!r} в бинарных данных")
+
+    @staticmethod
+    def _unpack_array(typecode: str, buf: memoryview, pos: int, count: int) -> List:
+        values = array(typecode)
+        values.frombytes(bytes(buf[pos:pos + values.itemsize * count]))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values.tolist()
+
+
+CODECS = {
+    'json': JsonCodec(),
+    'compact': JsonCodec(compact=True),
+    'binary': BinaryCodec(),
+}
+
+
+def get_codec(name: str):
+    """Получить кодек по имени из настроек"""
+    if name not in CODECS:
+        raise ValueError(f"Неизвестный формат хранения: {name} (доступны: {', '.join(CODECS)})")
+    return CODECS[name]
+
+
+def detect_codec(raw: bytes):
+    """Определить кодек по содержимому файла"""
+    if raw.startswith(BinaryCodec.MAGIC):
+        return CODECS['binary']
+    return CODECS['json']
+
+
+# ========== НАДЕЖНАЯ ЗАПИСЬ ==========
+
+def _fsync_directory(directory: str):
+    """Сбросить на диск запись каталога (чтобы переименование пережило сбой)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return  # Windows: каталоги так не синхронизируются
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_signature(file_path: str):
+    """Подпись файла для проверки изменений: время изменения, размер, inode"""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _read_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# umask процесса (читается один раз: os.umask меняет его для всех потоков)
+_UMASK = _read_umask()
+
+
+def _file_mode(file_path: str) -> int:
+    """Права существующего файла или права нового файла по umask"""
+    try:
+        return os.stat(file_path).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write(file_path: str, raw: bytes):
+    """
+    Атомарная запись: временный файл рядом с целевым, fsync, переименование.
+    При сбое на любом шаге на диске остается либо старая, либо новая версия файла.
+    Возвращает подпись записанного файла.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(file_path)}.", suffix=TEMP_SUFFIX, dir=directory
+    )
+    try:
+        # mkstemp создает файл с правами 0600 - переносим права заменяемого файла
+        # (нового - по umask), чтобы файл данных оставался читаемым другим процессам
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, _file_mode(file_path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+    return file_signature(file_path)
+
+
+def remove_temp_files(directory: str) -> int:
+    """Удалить временные файлы, оставшиеся от прерванных записей"""
+    removed = 0
+    for name in os.listdir(directory):
+        if name.startswith('.') and name.endswith(TEMP_SUFFIX):
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+class FileLock:
+    """
+    Блокировка между процессами на служебном файле (fcntl.flock): общая - для чтения,
+    исключительная - для изменений. Каждый захват открывает свой дескриптор, поэтому
+    потоки одного процесса ждут друг друга так же, как разные процессы.
+    Без fcntl (Windows) блокировка ничего не делает - см. available.
+    """
+
+    available = fcntl is not None
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def acquire(self, exclusive: bool):
+        """Захватить блокировку на время блока with"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)  # закрытие дескриптора снимает блокировку
+
+
+class GroupCommitWriter:
+    """
+    Групповая фиксация: записи, пришедшие в течение окна window_ms, сливаются,
+    и каждый файл пишется на диск один раз последней версией.
+
+    submit() ставит запись в очередь и сразу возвращает номер группы,
+    wait() ждет, пока группа будет надежно записана. Пока запись не на диске,
+    её данные доступны через pending() - чтобы читатели видели свежую версию.
+    """
+
+    def __init__(self, window_ms: float):
+        self.window = window_ms / 1000
+        self._condition = threading.Condition()
+        self._pending: Dict[str, bytes] = {}
+        self._inflight: Dict[str, bytes] = {}
+        self._signatures: Dict[str, tuple] = {}
+        self._generation = 0        # номер последней группы, взятой в запись
+        self._committed = 0         # номер последней записанной группы
+        self._errors: Dict[int, BaseException] = {}
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, file_path: str, raw: bytes) -> int:
+        """Поставить запись в очередь; возвращает номер группы для wait()"""
+        with self._condition:
+            if self._closed:
+                raise StorageError("Запись после закрытия хранилища")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+            self._pending[file_path] = raw
+            self._condition.notify_all()
+            return self._generation + 1
+
+    def wait(self, generation: int):
+        """Дождаться надежной записи группы"""
+        with self._condition:
+            while self._committed < generation:
+                self._condition.wait()
+            error = self._errors.get(generation)
+        if error is not None:
+            raise StorageError(f"Ошибка записи данных: {error}") from error
+
+    def write(self, file_path: str, raw: bytes):
+        """Записать и дождаться фиксации"""
+        self.wait(self.submit(file_path, raw))
+
+    def pending(self, file_path: str) -> Optional[bytes]:
+        """Данные файла, еще не записанные на диск (или None)"""
+        with self._condition:
+            raw = self._pending.get(file_path)
+            if raw is None:
+                raw = self._inflight.get(file_path)
+            return raw
+
+    def signature(self, file_path: str):
+        """Подпись файла после последней записи этим писателем"""
+        with self._condition:
+            return self._signatures.get(file_path)
+
+    def close(self):
+        """Дописать оставшееся и остановить поток фиксации"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+
+            # Копим записи в течение окна
+            time.sleep(self.window)
+
+            with self._condition:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._generation += 1
+                generation = self._generation
+
+            error = None
+            signatures = {}
+            for file_path, raw in batch.items():
+                try:
+                    signatures[file_path] = atomic_write(file_path, raw)
+                except BaseException as e:  # ошибка передается ожидающим вызовам
+                    error = e
+
+            with self._condition:
+                self._signatures.update(signatures)
+                self._inflight = {}
+                if error is not None:
+                    self._errors[generation] = error
+                self._errors.pop(generation - 100, None)
+                self._committed = generation
+                self._condition.notify_all()
+
+
+class PeriodicFlusher:
+    """
+    Фоновый поток отложенной записи: вызывает flush() раз в interval_ms
+    или раньше - по wake() (например, когда накопилось много изменений).
+    """
+
+    def __init__(self, flush, interval_ms: float):
+        self._flush = flush
+        self.interval = interval_ms / 1000
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Сбросить изменения, не дожидаясь интервала"""
+        self._wake.set()
+
+    def close(self):
+        """Остановить поток (последний сброс выполняет владелец)"""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой записи данных: {e}")
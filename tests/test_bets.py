@@ -0,0 +1,90 @@
+"""
+Тесты ставок: журнал ставок шарда после архивации и перезапуска, атомарность приема ставки
+"""
+
+import os
+
+import pytest
+
+from data_manager import DataManager
+
+USERS = [101, 102]
+
+
+def make_manager(data_dir) -> tuple:
+    """Два пользователя (разные шарды) и два события"""
+    dm = DataManager(str(data_dir), shards=2)
+    for telegram_id in USERS:
+        dm.create_user(telegram_id, f"user{telegram_id}")
+    first = dm.create_event("Первый матч", "Да", "Нет", 2.0, 3.0)
+    second = dm.create_event("Второй матч", "Да", "Нет", 2.0, 3.0)
+    return dm, first['id'], second['id']
+
+
+def place(dm: DataManager, event_id: int, count: int, users: list = USERS) -> list:
+    """ID новых ставок; пользователи чередуются (ставка с номером i - пользователя users[i % len(users)])"""
+    return [dm.place_bet(users[i % len(users)], event_id, 1 + i % 2, 10.0)['bet']['id'] for i in range(count)]
+
+
+def test_tail_bets_survive_archive_and_restart(tmp_path):
+    dm, archived_id, event_id = make_manager(tmp_path)
+    kept = place(dm, event_id, 4)
+    # На архивное событие ставит только первый пользователь: шард второго ставок
+    # в архив не отдает, но его журнал ставок тоже должен пережить архивацию
+    archived = place(dm, archived_id, 4, users=USERS[:1])
+    dm.process_event_results(archived_id, 1)
+    assert dm.archive_closed_events(older_than_days=0)['bets'] == len(archived)
+
+    # Ставки после архивации уходят в журналы шардов, файлы ставок не переписываются
+    added = place(dm, event_id, 6)
+    assert any(dm._get_bet_tail(bets_file).count for bets_file in dm.bets_files)
+    dm.close()
+
+    dm = DataManager(str(tmp_path), shards=2)
+    working = kept + added
+    owner = {bet_id: USERS[i % len(USERS)] for bets in (kept, added) for i, bet_id in enumerate(bets)}
+    assert [bet['id'] for bet in dm.get_event_bets(event_id)] == sorted(working)
+    assert dm.get_event_bets(archived_id) == []
+    assert sorted(bet['id'] for bet in dm.get_all_bets()) == sorted(working)
+
+    for telegram_id in USERS:
+        own = [bet_id for bet_id in working if owner[bet_id] == telegram_id]
+        recent = dm.get_user_bets(telegram_id, limit=len(own))
+        assert sorted(bet['id'] for bet in recent) == sorted(own)
+        # С архивом: каждая ставка ровно один раз
+        everything = [bet['id'] for bet in dm.get_user_bets(telegram_id, limit=100)]
+        assert len(everything) == len(set(everything))
+        assert set(everything) - set(own) <= set(archived)
+    assert dm.reconcile_ledger()['ok']
+    dm.close()
+
+
+def _storage_state(dm: DataManager, event_id: int) -> tuple:
+    """Журнал балансов, журналы ставок и ставки события"""
+    tails = tuple(os.path.getsize(dm._get_bet_tail(bets_file).path) for bets_file in dm.bets_files)
+    return (os.path.getsize(dm.ledger_file), dm.ledger.seq, tails, dm.count_event_bets(event_id),
+            [dm.get_user(telegram_id)['balance'] for telegram_id in USERS])
+
+
+@pytest.mark.parametrize('case', ['closed', 'balance', 'option'])
+def test_rejected_bet_changes_nothing(tmp_path, case):
+    dm, closed_id, event_id = make_manager(tmp_path)
+    place(dm, event_id, 2)
+    dm.process_event_results(closed_id, 1)
+    target, amount, option = event_id, 10.0, 1
+    if case == 'closed':
+        target = closed_id
+    elif case == 'balance':
+        amount = 10 ** 6
+    else:
+        option = 3
+
+    before = _storage_state(dm, target)
+    with pytest.raises(ValueError):
+        dm.place_bet(USERS[0], target, option, amount)
+    assert _storage_state(dm, target) == before
+    dm.close()
+
+    dm = DataManager(str(tmp_path), shards=2)
+    assert _storage_state(dm, target) == before
+    dm.close()
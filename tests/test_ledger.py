@@ -0,0 +1,69 @@
+"""
+Тесты журнала балансов: сверка и балансы в выгрузке
+"""
+
+import json
+import os
+
+from data_manager import DataManager
+
+USERS = [101, 102, 103]
+
+
+def make_manager(data_dir, **kwargs) -> tuple:
+    """Пополнения, ставки и рассчитанное событие"""
+    dm = DataManager(str(data_dir), shards=2, **kwargs)
+    for telegram_id in USERS:
+        dm.create_user(telegram_id, f"user{telegram_id}")
+    dm.add_balances({telegram_id: 50.0 for telegram_id in USERS})
+    event_id = dm.create_event("Матч", "Да", "Нет", 2.0, 3.0)['id']
+    for number, telegram_id in enumerate(USERS):
+        dm.place_bet(telegram_id, event_id, 1 + number % 2, 20.0 + number)
+    dm.process_event_results(event_id, 1)
+    return dm, event_id
+
+
+def test_reconcile_ok_after_top_ups_bets_and_settlement(tmp_path):
+    dm, _ = make_manager(tmp_path, ledger_snapshot_every=2)
+    report = dm.reconcile_ledger()
+    assert report['ok'], report
+    # Стартовые балансы, пополнения, ставки и выплаты двум выигравшим (вариант 1)
+    assert report['entries'] == len(USERS) * 3 + 2
+    dm.close()
+
+
+def test_reconcile_reports_hand_edited_users_file(tmp_path):
+    dm, _ = make_manager(tmp_path, ledger_snapshot_every=1)
+    dm.close()
+
+    # Баланс в файле пользователей расходится со снимком журнала
+    telegram_id = USERS[0]
+    users_file = os.path.join(str(tmp_path), f"users.{telegram_id % 2}.json")
+    with open(users_file, encoding='utf-8') as f:
+        users = json.load(f)
+    for user in users.values():
+        if user['telegram_id'] == telegram_id:
+            user['balance'] += 500
+    with open(users_file, 'w', encoding='utf-8') as f:
+        json.dump(users, f)
+
+    dm = DataManager(str(tmp_path), shards=2)
+    report = dm.reconcile_ledger()
+    assert not report['ok']
+    assert report['stale_users'] == [telegram_id]
+    dm.close()
+
+
+def test_export_users_sees_other_process_balances(tmp_path):
+    dm, _ = make_manager(tmp_path)
+    before = {user['telegram_id']: user['balance'] for user in dm.export_rows('users')}
+
+    # Другой процесс на той же папке данных пополняет баланс
+    other = DataManager(str(tmp_path), shards=2)
+    other.add_balance(USERS[1], 7.0)
+    other.close()
+
+    exported = {user['telegram_id']: user['balance'] for user in dm.export_rows('users')}
+    before[USERS[1]] += 7.0
+    assert exported == before
+    dm.close()
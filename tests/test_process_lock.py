@@ -0,0 +1,52 @@
+"""
+Тест нескольких процессов на одной папке данных: блокировка между процессами
+и перечитывание файлов, измененных другим процессом
+"""
+
+import multiprocessing
+
+import pytest
+
+from data_manager import DataManager
+from storage import FileLock
+
+PROCESSES = 2
+OPS = 50
+SHARED = 100000000
+
+
+def worker(data_dir: str, number: int):
+    """Ставки своего пользователя и пополнения общего"""
+    dm = DataManager(data_dir, process_lock=True)
+    telegram_id = SHARED + 1 + number
+    for _ in range(OPS):
+        dm.create_bet(telegram_id, 1, 1.0, 1, 2.0)
+        dm.add_balance(SHARED, 1.0)
+        dm.get_user_bets(telegram_id)  # согласованное чтение ставок и архива
+    dm.close()
+
+
+@pytest.mark.skipif(not FileLock.available, reason="блокировка между процессами недоступна (нет fcntl)")
+def test_processes_do_not_lose_changes(tmp_path):
+    data_dir = str(tmp_path)
+    dm = DataManager(data_dir, process_lock=True)
+    dm.create_user(SHARED, 'shared')
+    for number in range(PROCESSES):
+        dm.create_user(SHARED + 1 + number, f'worker{number}')
+    event_id = dm.create_event("Матч", "Да", "Нет")['id']
+    dm.close()
+
+    processes = [multiprocessing.Process(target=worker, args=(data_dir, number)) for number in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    dm = DataManager(data_dir)
+    assert len(dm.get_event_bets(event_id)) == PROCESSES * OPS
+    assert dm.get_user(SHARED)['balance'] == 1000.0 + PROCESSES * OPS
+    for number in range(PROCESSES):
+        assert dm.get_user(SHARED + 1 + number)['balance'] == 1000.0 - OPS
+    assert dm.reconcile_ledger()['ok']
+    dm.close()
@@ -0,0 +1,57 @@
+"""
+Тесты рейтинга: места при равных значениях после обновлений и удалений
+"""
+
+import random
+
+from ranking import Ranking
+
+
+def naive_top(values: dict) -> list:
+    """Места по определению: 1 + количество пользователей со значением строго больше"""
+    ordered = sorted(values.items(), key=lambda item: (-item[1], item[0]))
+    return [(1 + sum(1 for other in values.values() if other > value), telegram_id, value)
+            for telegram_id, value in ordered]
+
+
+def test_ties_share_rank_after_updates_and_removals():
+    ranking = Ranking()
+    ranking.reset({1: 100.0, 2: 50.0, 3: 50.0, 4: 10.0})
+    ranking.update(4, 50.0)     # третий с равным значением
+    ranking.update(5, 200.0)    # новый лидер
+    ranking.remove(1)
+    ranking.update(2, 50.0)     # то же значение - ничего не меняется
+
+    assert ranking.top(10) == [(1, 5, 200.0), (2, 2, 50.0), (2, 3, 50.0), (2, 4, 50.0)]
+    assert [ranking.rank(telegram_id) for telegram_id in (5, 2, 3, 4)] == [(1, 200.0)] + [(2, 50.0)] * 3
+    assert ranking.rank(1) is None
+
+    ranking.update(3, 75.0)
+    ranking.remove(5)
+    assert ranking.top(2) == [(1, 3, 75.0), (2, 2, 50.0)]
+    assert ranking.rank(4) == (2, 50.0)
+    assert len(ranking) == 3
+
+
+def test_matches_naive_ranking():
+    generator = random.Random(36)
+    ranking = Ranking()
+    values = {telegram_id: float(generator.randint(0, 20)) for telegram_id in range(200)}
+    ranking.reset(values)
+
+    for _ in range(3000):
+        telegram_id = generator.randrange(250)
+        if generator.random() < 0.2:
+            ranking.remove(telegram_id)
+            values.pop(telegram_id, None)
+        else:
+            value = float(generator.randint(0, 20))
+            ranking.update(telegram_id, value)
+            values[telegram_id] = value
+
+    expected = naive_top(values)
+    assert len(ranking) == len(values)
+    assert ranking.top(len(values) + 5) == expected
+    assert ranking.top(7) == expected[:7]
+    for rank, telegram_id, value in expected:
+        assert ranking.rank(telegram_id) == (rank, value)
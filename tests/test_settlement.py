@@ -0,0 +1,186 @@
+"""
+Тесты расчета событий по частям: продолжение после сбоя, повторные вызовы, смена числа шардов
+"""
+
+import json
+import shutil
+from collections import Counter
+
+import pytest
+
+from data_manager import DataManager
+
+USERS = [101, 102, 103, 104, 105]
+CHUNK = 3
+
+# (telegram_id, сумма, вариант, коэффициент)
+BETS = [(USERS[i % len(USERS)], 10.0 + i, 1 + i % 2, 2.0 if i % 3 else 3.0) for i in range(20)]
+
+
+def make_manager(data_dir, **kwargs) -> tuple:
+    """Пользователи, событие и ставки на него"""
+    dm = DataManager(str(data_dir), **kwargs)
+    for telegram_id in USERS:
+        dm.create_user(telegram_id, f"user{telegram_id}")
+    event = dm.create_event("Матч", "Да", "Нет", 2.0, 3.0)
+    for telegram_id, amount, option, odds in BETS:
+        dm.create_bet(telegram_id, event['id'], amount, option, odds)
+    return dm, event['id']
+
+
+def expected_balances(result: int) -> dict:
+    """Балансы после расчета: стартовые 1000 минус ставки плюс выигрыши"""
+    balances = {telegram_id: 1000.0 for telegram_id in USERS}
+    for telegram_id, amount, option, odds in BETS:
+        balances[telegram_id] -= amount
+        if option == result:
+            balances[telegram_id] += amount * odds
+    return balances
+
+
+def balances(dm: DataManager) -> dict:
+    return {telegram_id: dm.get_user(telegram_id)['balance'] for telegram_id in USERS}
+
+
+def payouts(dm: DataManager) -> Counter:
+    """Выплаты журнала: (ссылка, счет) -> количество движений"""
+    return Counter((entry['ref'], entry['credit']) for entry in dm.ledger.entries() if entry['kind'] == 'payout')
+
+
+def assert_paid_once(dm: DataManager):
+    assert payouts(dm) and max(payouts(dm).values()) == 1
+
+
+def test_resume_after_restart(tmp_path):
+    dm, event_id = make_manager(tmp_path)
+    dm.close_event(event_id, 1)
+    plan = dm.start_settlement(event_id, CHUNK)
+    dm.settle_chunk(plan, 0)
+
+    # Перезапуск без close(): все, что записано синхронно, уже на диске
+    dm = DataManager(str(tmp_path))
+    assert [event['id'] for event in dm.get_unfinished_settlements()] == [event_id]
+    dm.process_event_results(event_id, 1, CHUNK)
+
+    assert balances(dm) == expected_balances(1)
+    assert_paid_once(dm)
+    assert dm.reconcile_ledger()['ok']
+    dm.close()
+
+
+@pytest.mark.parametrize('flushed', [True, False])
+def test_resume_after_write_behind_crash(tmp_path, flushed):
+    dm, event_id = make_manager(tmp_path / 'live', write_mode='behind', flush_interval_ms=10 ** 7)
+    dm.flush()
+    if not flushed:
+        # Сбой до сброса: закрытие события и план не дошли до диска, выплаты в журнале есть
+        dm.flush = dm.ledger.sync
+    dm.close_event(event_id, 1)
+    plan = dm.start_settlement(event_id, CHUNK)
+    dm.settle_chunk(plan, 0)
+    dm.settle_chunk(plan, 1)
+    dm.ledger.sync()
+
+    # Состояние диска в момент сбоя
+    shutil.copytree(tmp_path / 'live', tmp_path / 'crashed')
+    dm._flusher.close()
+
+    dm = DataManager(str(tmp_path / 'crashed'))
+    assert dm.get_event(event_id)['is_active'] == (not flushed)
+    dm.process_event_results(event_id, 1, CHUNK)
+
+    assert balances(dm) == expected_balances(1)
+    assert_paid_once(dm)
+    dm.close()
+
+
+def test_two_plans_pay_chunk_once(tmp_path):
+    dm, event_id = make_manager(tmp_path)
+    dm.close_event(event_id, 1)
+    first = dm.start_settlement(event_id, CHUNK)
+    second = dm.start_settlement(event_id, CHUNK)
+
+    dm.settle_chunk(first, 0)
+    paid = payouts(dm)
+    dm.settle_chunk(second, 0)
+    assert payouts(dm) == paid
+
+    for number in range(len(second['chunks'])):
+        dm.settle_chunk(second, number)
+        dm.settle_chunk(first, number)
+    dm.finish_settlement(event_id)
+    assert balances(dm) == expected_balances(1)
+    assert_paid_once(dm)
+    dm.close()
+
+
+def test_finish_settlement_twice(tmp_path):
+    dm, event_id = make_manager(tmp_path)
+    stats = dm.process_event_results(event_id, 2, CHUNK)
+
+    assert stats['total_bets'] == len(BETS)
+    assert stats['winners'] == sum(1 for bet in BETS if bet[2] == 2)
+    assert dm.finish_settlement(event_id) == stats
+    assert dm.process_event_results(event_id, 2, CHUNK) == stats
+    assert balances(dm) == expected_balances(2)
+    with pytest.raises(ValueError):
+        dm.close_event(event_id, 1)
+    dm.close()
+
+
+def test_resume_after_shard_count_change(tmp_path):
+    dm, event_id = make_manager(tmp_path, shards=2)
+    dm.close_event(event_id, 1)
+    plan = dm.start_settlement(event_id, CHUNK)
+    bounds = dm.get_event(event_id)['settlement_plan']
+    chunk_ids = [sorted(bet_id for _, bet_ids in chunk for bet_id in bet_ids) for chunk in plan['chunks']]
+    dm.settle_chunk(plan, 0)
+    dm.settle_chunk(plan, 1)
+    dm.close()
+
+    # Другое число шардов и другой размер части в настройках - план прежний
+    dm = DataManager(str(tmp_path), shards=3)
+    plan = dm.start_settlement(event_id, CHUNK + 4)
+    assert dm.get_event(event_id)['settlement_plan'] == bounds
+    assert [sorted(bet_id for _, bet_ids in chunk for bet_id in bet_ids) for chunk in plan['chunks']] == chunk_ids
+    assert plan['paid'] == {f"event:{event_id}:0", f"event:{event_id}:1"}
+
+    for number in range(len(plan['chunks'])):
+        dm.settle_chunk(plan, number)
+    dm.finish_settlement(event_id)
+    assert balances(dm) == expected_balances(1)
+    assert_paid_once(dm)
+    assert dm.reconcile_ledger()['ok']
+    dm.close()
+
+
+@pytest.mark.parametrize('old_snapshot', [False, True])
+def test_paid_chunks_kept_in_ledger_snapshot(tmp_path, old_snapshot):
+    dm, event_id = make_manager(tmp_path, ledger_snapshot_every=1, settlement_chunk=CHUNK)
+    dm.close_event(event_id, 1)
+    plan = dm.start_settlement(event_id)
+    dm.settle_chunk(plan, 0)
+    dm.close()
+
+    snapshot_file = tmp_path / 'ledger_snapshot.json'
+    snapshot = json.loads(snapshot_file.read_text(encoding='utf-8'))
+    assert snapshot['payouts'] == {f"event:{event_id}": [f"event:{event_id}:0"]}
+    if old_snapshot:
+        # Снимок без индекса выплат (до его появления) - журнал перечитывается с начала
+        del snapshot['payouts']
+        snapshot_file.write_text(json.dumps(snapshot), encoding='utf-8')
+
+    dm = DataManager(str(tmp_path))
+    assert dm.start_settlement(event_id)['paid'] == {f"event:{event_id}:0"}
+    dm.process_event_results(event_id, 1)
+    assert balances(dm) == expected_balances(1)
+    assert_paid_once(dm)
+    dm.close()
+
+
+def test_chunk_size_from_storage_settings(tmp_path):
+    dm, event_id = make_manager(tmp_path, settlement_chunk=CHUNK)
+    dm.close_event(event_id, 1)
+    plan = dm.start_settlement(event_id)
+    assert len(plan['chunks']) == len(dm.get_event(event_id)['settlement_plan']) == -(-len(BETS) // CHUNK)
+    dm.close()
@@ -0,0 +1,20 @@
+"""
+Тесты форматов хранения
+"""
+
+import pytest
+
+from storage import CODECS
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+@pytest.mark.parametrize('data', [
+    {'a': {}},
+    {'a': {}, 'b': {}},
+    {'a': {}, 'b': {'x': 1}},
+    {'1': {'id': 1, 'title': 'Матч', 'odds': 1.5, 'is_active': True}},
+    {},
+])
+def test_round_trip(name, data):
+    codec = CODECS[name]
+    assert codec.loads(codec.dumps(data)) == data
@@ -0,0 +1,82 @@
+"""
+Защита от флуда: ограничение частоты запросов пользователя (token bucket)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class Throttle:
+    """
+    У каждого пользователя «ведро» на burst запросов, которое пополняется на rate запросов
+    в секунду; запрос без свободного жетона отклоняется. Проверка - O(1): ведра лежат
+    в OrderedDict в порядке последнего обращения, и ведра, к которым не обращались
+    дольше idle секунд (они к этому времени уже полные), удаляются с начала словаря
+    при следующих проверках - память занимают только недавно активные пользователи.
+
+    rate = 0 отключает ограничение.
+    """
+
+    def __init__(self, rate: float, burst: int, idle: float = 600):
+        self.rate = rate
+        self.burst = max(1, burst)
+        # Удалять можно только полное ведро - иначе пользователь получит лишние жетоны
+        self.idle = max(idle, self.burst / rate) if rate > 0 else idle
+        # ID пользователя -> [жетоны, время последнего обращения, предупрежден ли]
+        self._buckets: OrderedDict = OrderedDict()
+        self.metrics: Dict[str, int] = {'passed': 0, 'throttled': 0, 'evicted': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def allow(self, user_id: int, now: Optional[float] = None) -> bool:
+        """Взять жетон для запроса пользователя; False - запрос нужно отбросить"""
+        if not self.enabled:
+            return True
+        if now is None:
+            now = time.monotonic()
+
+        self._evict(now)
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [float(self.burst), now, False]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(user_id)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            self.metrics['passed'] += 1
+            return True
+
+        self.metrics['throttled'] += 1
+        return False
+
+    def should_warn(self, user_id: int) -> bool:
+        """
+        Предупредить ли пользователя об отброшенном запросе: один раз за серию отброшенных
+        подряд - остальные отбрасываются молча, чтобы не отвечать на флуд флудом
+        """
+        bucket = self._buckets.get(user_id)
+        if bucket is None or bucket[2]:
+            return False
+        bucket[2] = True
+        return True
+
+    def _evict(self, now: float):
+        """Удалить ведра, к которым давно не обращались (самые старые - в начале словаря)"""
+        buckets = self._buckets
+        while buckets:
+            user_id, bucket = next(iter(buckets.items()))
+            if now - bucket[1] < self.idle:
+                break
+            del buckets[user_id]
+            self.metrics['evicted'] += 1
+
+    def stats(self) -> dict:
+        """Счетчики пропущенных, отброшенных запросов и удаленных ведер, число активных ведер"""
+        return dict(self.metrics, buckets=len(self._buckets))